@@ -1,98 +1,65 @@
-import os
+import time
+import contextlib
 import paramiko
-import tkinter as tk
-from PIL import Image, ImageTk
 
 import pandas as pd
 import numpy as np
 import cv2
 
-from utils import cv2_safe_read, cv2_safe_write
-
-class PopupWindow:
-    def __init__(self, img_array:np.array, stage: str, person_name:str):
-        '''
-        Show the window with an image and a question.
-
-        Args:
-        img_array (np.array): The image to show (please not in cv2 format)
-        stage (str): The stage the pop-up window occurs
-        person_name (str): The target person to classify
-
-        Returns:
-        decision (str): a decision based on the show up image
-        '''
-        self.result = None
-        cv2.namedWindow('img',cv2.WINDOW_NORMAL)
-        cv2.resizeWindow('img', 800, 600)
-        cv2.imshow('img',img_array)
-        # Create Window
-        self.master = tk.Tk() 
-        self.master.geometry("700x440")
-
-        # Load the image
-        #img_pil = Image.fromarray(cv2.cvtColor(img_array, cv2.COLOR_BGR2RGB))
-        #self.photo = ImageTk.PhotoImage(img_pil)
-
-        self.master.update_idletasks()
-        self.master.geometry(f'+{50}+{50}')
-
-        # Create the widgets
-        #self.label = tk.Label(self.master, image=self.photo)
-        #self.label.grid(row=0, column=0, columnspan=8)
-
-        self.stage_label = tk.Label(self.master, text=stage, fg='black', font=('TkDefaultFont', 10, 'bold'), anchor='w')
-        self.stage_label.grid(row=0, column=0)
-
-        self.message_label = tk.Label(self.master, text='Is this a head annotation on the', anchor='e')
-        self.message_label.grid(row=0, column=1)
-
-        self.person_label = tk.Label(self.master, text=person_name, fg='red', anchor='w')
-        self.person_label.grid(row=0, column=2)
-
-
-        self.yes_button = tk.Button(self.master, text='Yes', command=self.yes)
-        self.yes_button.grid(row=1, column=3)
-        
-        self.no_button = tk.Button(self.master, text='No', command=self.no)
-        self.no_button.grid(row=1, column=4)
-
-
-        self.skip_button = tk.Button(self.master, text='Skip', command=self.skip)
-        self.skip_button.grid(row=1, column=5)
-
-
-        self.terminate_button = tk.Button(self.master, text='Terminate and Drop', command=self.terminate)
-        self.terminate_button.grid(row=1, column=6)
-        cv2.waitKey(0)
-        self.master.mainloop()
-        
-    def yes(self):
-        self.result = 'Yes'
-        self.master.destroy()
-        cv2.destroyAllWindows()
-    def no(self):
-        self.result = 'No'
-        self.master.destroy()
-        cv2.destroyAllWindows()
-    def skip(self):
-        self.result = 'Skip'
-        self.master.destroy()
-        cv2.destroyAllWindows()
-    def terminate(self):
-        self.result = 'Terminate and Drop'
-        self.master.destroy()
-        cv2.destroyAllWindows()
-
-    def get_result(self):
-        return self.result
+from detections import DetectionStore, BOX_COLUMNS, load_detections
+from frame_provider import FrameProvider
+from frame_reader import FrameReader
+from frame_source import JpegDirSource, open_frame_source
+from remote_store import RemoteFrameStore, SFTPBackend
+from review import PopupWindow, PopupReviewer, ReviewQueue, ReviewRequest # PopupWindow is re-exported for 'from PersonTracker import PopupWindow'
+from telemetry import NullTelemetry
+from checkpoint import SessionCheckpoint, ReplayReviewer
+from interpolation import IntervalSet, interpolate_tracks
+from motion import make_motion_model
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:
+    linear_sum_assignment = None # fall back to greedy assignment
+
+def assign_boxes(overlaps:np.ndarray, min_overlap:float):
+    '''
+    Assign boxes to anchors by maximizing the total overlap (Hungarian if scipy is installed, greedy otherwise)
+
+    Args:
+    overlaps:       overlap of every box (column) with every anchor (row)
+    min_overlap:    pairs with overlap not above min_overlap are left unassigned
+
+    Returns:
+    assignment (dict): anchor row -> box column
+    '''
+    overlaps = np.nan_to_num(overlaps)
+    if linear_sum_assignment is not None:
+        rows, cols = linear_sum_assignment(overlaps, maximize=True)
+    else:
+        rows, cols = [], []
+        for flat_idx in np.argsort(overlaps, axis=None, kind='stable')[::-1]:
+            r, c = divmod(int(flat_idx), overlaps.shape[1])
+            if r not in rows and c not in cols:
+                rows.append(r)
+                cols.append(c)
+    return {int(r):int(c) for r, c in zip(rows, cols) if overlaps[r, c]>min_overlap}
 
 class PersonTracker:
     def __init__(self, 
                 skip_prev_f = 1,
                 skip_follow_f = 1,
                 overlap_upper =  0.60,
-                overlap_lower = 0.2):        
+                overlap_lower = 0.2,
+                frame_cache_mb = 256,
+                prefetch_workers = 4,
+                review_lookahead = 0,
+                preview_thumbnails = False,
+                telemetry = None,
+                max_gap = None,
+                smooth_window = 0,
+                motion_model = None,
+                grid_size = None):        
         '''
         Track and Identify Person
         Args:
@@ -100,28 +67,249 @@ class PersonTracker:
         skip_follow_f: when select skip, the number of frames to skipped after the pop-up frame
         overlap_upper: the upperbound of deciding a tracked person.
         overlap_lower: the lowerbound of deciding a tracked person.
+        frame_cache_mb: the memory bound (in MB) of decoded frames cached for pop-up windows.
+        prefetch_workers: the number of threads fetching and decoding frames ahead of pop-up windows.
+        review_lookahead: the number of frames the other people are tracked on while a decision is pending, before waiting for the reviewer
+                          (0 waits at every decision; a larger one gives the reviewer batches, but a pending person may lose its head to the others).
+        preview_thumbnails: keep the reduced frames of previews on disk (next to frame_dir), so that previews of the same frames are faster next time.
+        telemetry: a telemetry.Telemetry recording timers, counters and events of the sessions (see get_stats), None to record nothing.
+        max_gap: tracked heads are interpolated over gaps of at most max_gap frames (None for any gap), see reinterpolate.
+        smooth_window: the width (in frames) of a moving average smoothing the tracked heads (0 for no smoothing), see reinterpolate.
+        motion_model: 'velocity' (motion.ConstantVelocityModel) or 'kalman' (motion.KalmanBoxModel) to score candidates against the anchor
+                      moved to where the head is predicted at the frame, instead of the last tracked head (None), which saves
+                      anchor resets on fast movements; or a function returning a new model (see motion.make_motion_model).
+        grid_size: index the detections on a grid_size x grid_size grid of every frame when loaded (e.g. 16), so that only boxes
+                   in the cells around an anchor are scored against it (see spatial_index.GridIndex); None to score all boxes of the frame.
+                   The results are the same. Looking up the cells costs more than scoring a few boxes: on the candidates benchmark,
+                   the index is 2-5 us per query slower up to about 256 heads per frame, and only faster beyond (about 40% at 1024 heads).
         '''
 
         self.skip_prev_f = skip_prev_f
         self.skip_follow_f = skip_follow_f
         self.overlap_upper = overlap_upper
         self.overlap_lower = overlap_lower
+        self.frame_cache_mb = frame_cache_mb
+        self.prefetch_workers = prefetch_workers
+        self.review_lookahead = review_lookahead
+        self.preview_thumbnails = preview_thumbnails
+        self.telemetry = NullTelemetry() if telemetry is None else telemetry
+        self.max_gap = max_gap
+        self.smooth_window = smooth_window
+        self.motion_model = motion_model
+        self.grid_size = grid_size
 
         self.remote=False
+        self.remote_backend = None
+        self.remote_store = None
         self.tracked_dfs = {}
+        self.raw_tracks = {} # personID -> tracked heads (before interpolation) of every tracked dataframe, see interpolation.interpolate_tracks
         self.frame_dir = None
-        self.proposal_df = None
+        self.frame_provider = None
+        self.detections = None
         self.dropped_frames=[]
+        self.review_counts = {} # personID -> anchor resets and pop-ups of the loaded video
+        self.review_queue = ReviewQueue()
+        self.reviewer = PopupReviewer()
+        self.checkpoint = None
+        self.completed_runs = [] # [mode, personIDs, start_frame, end_frame] of every finished track_person/track_all call
+        self._restored_runs = [] # runs of the checkpoint not called again yet
+        self._journal_run = None # the last run of the checkpoint journal, replayed when it is called again
+
+    def set_reviewer(self, reviewer):
+        '''
+        Answer the decisions of the tracker with another front-end of review
+        (e.g. review.ContactSheetReviewer, or review.ScriptedReviewer to run without windows)
+        '''
+        self.reviewer = reviewer
+
+    def set_checkpoint(self, checkpoint_dir:str):
+        '''
+        Keep the session in checkpoint_dir (see checkpoint.SessionCheckpoint), and resume the session kept there if there is one:
+        the results of finished runs (track_person/track_all calls) are restored, and calling them again does nothing;
+        the decisions of the last run are replayed without the reviewer when it is called again (with the same arguments),
+        then the run goes on from its last decision.
+        '''
+        if self.checkpoint is not None:
+            self.checkpoint.close()
+        self.checkpoint = SessionCheckpoint(checkpoint_dir)
+        self.__restore_checkpoint()
+
+    def undo_decisions(self, n=1):
+        '''
+        Undo the last n decisions of the last run (e.g. a mis-clicked 'Terminate and Drop'), the session is restored to before the run,
+        which is replayed up to the undone decisions when it is called again
+        '''
+        if self.checkpoint is None:
+            print("[ERROR] There is no checkpoint to undo decisions from, please call set_checkpoint first!")
+            return
+        self.checkpoint.rewind(n)
+        self.__restore_checkpoint()
+
+    def __restore_checkpoint(self):
+        if self.checkpoint is None or self.detections is None:
+            return
+        state = self.checkpoint.load_snapshot()
+        if state is None:
+            return
+        if state['num_detections']!=len(self.detections):
+            print("[WARNING] The checkpoint %s is of other detections, it is not restored."%self.checkpoint.checkpoint_dir)
+            return
+        self.detections.owners[:] = state['owners']
+        self.detections.owner_ids = state['owner_ids']
+        self.raw_tracks = state['raw_tracks']
+        self.reinterpolate(self.max_gap, self.smooth_window)
+        self.dropped_frames = state['dropped_frames']
+        self.completed_runs = list(state['completed_runs'])
+        self._restored_runs = list(state['completed_runs'])
+        self._journal_run = self.checkpoint.load_journal()
+        print("[INFO] Restored %d runs from the checkpoint %s."%(len(self.completed_runs), self.checkpoint.checkpoint_dir))
+
+    def __checkpoint_state(self):
+        return {'owners': self.detections.owners, 'owner_ids': list(self.detections.owner_ids), 'num_detections': len(self.detections),
+                'completed_runs': self.completed_runs, 'raw_tracks': self.raw_tracks,
+                'dropped_frames': [[int(start_frame), int(end_frame)] for start_frame, end_frame in self.dropped_frames]}
+
+    def __restored_run(self, key:list):
+        '''
+        Whether the run is already finished in the checkpoint (and so restored)
+        '''
+        if not key in self._restored_runs:
+            return False
+        self._restored_runs.remove(key)
+        print("[INFO] %s of %s from frame %d to %d is restored from the checkpoint."%tuple(key))
+        return True
+
+    @contextlib.contextmanager
+    def __session_run(self, key:list):
+        '''
+        Run tracking as a run of the session: with a checkpoint, the run is journaled
+        (decisions of the journal for the same run are replayed first)
+        '''
+        if self.checkpoint is None:
+            yield
+            self.completed_runs.append(key)
+            return
+        run, self._journal_run = self._journal_run, None
+        if run is not None and run['run']==len(self.completed_runs) and run['key']==key:
+            print("[INFO] Replaying %d decisions from the checkpoint."%len(run['decisions']))
+            self.checkpoint.continue_run()
+            decisions = run['decisions']
+        else:
+            if run is not None and run['run']==len(self.completed_runs) and run['decisions']:
+                print("[WARNING] The %d decisions of the checkpoint are of another run, they are dropped."%len(run['decisions']))
+            self.checkpoint.save_snapshot(self.__checkpoint_state())
+            self.checkpoint.start_run(len(self.completed_runs), key)
+            decisions = []
+        reviewer = self.reviewer
+        self.reviewer = ReplayReviewer(reviewer, self.checkpoint, decisions)
+        try:
+            yield
+        finally:
+            self.reviewer = reviewer
+        self.completed_runs.append(key)
+        self.checkpoint.finish_run(self.__checkpoint_state())
+
+    def set_telemetry(self, telemetry):
+        '''
+        Record timers, counters and events with a telemetry.Telemetry (None to record nothing)
+        '''
+        self.telemetry = NullTelemetry() if telemetry is None else telemetry
+
+    def get_stats(self):
+        '''
+        Returns:
+        stats (dict):   'telemetry': timers and counters of the tracker (see telemetry.Telemetry.snapshot), e.g.
+                            timers 'load_detections', 'index' (see grid_size), 'track', 'review' (time at the reviewer, waiting for the annotator),
+                            'decision' (from a request to its answer), 'preview' (getting a preview image),
+                            'score' and 'assign' (overlaps of candidates), 'interpolate';
+                            counters 'frames_visited', 'case_2.1', 'case_2.2', 'case_2.4', 'case_2.5',
+                            'decisions/<stage>/<action>', 'resets'
+                        'frames': preview cache hits/misses and loads (see FrameProvider.get_stats)
+                        'source': decoded frames (see FrameSource.get_stats)
+                        'remote': downloaded bytes and cache hits of remote frames (see RemoteFrameStore.get_stats)
+                        'review': anchor resets and pop-ups of the loaded video (see get_review_counts)
+        '''
+        stats = {'telemetry': self.telemetry.snapshot(), 'review': self.get_review_counts()}
+        if self.frame_provider is not None:
+            stats['frames'] = self.frame_provider.get_stats()
+            stats['source'] = self.frame_provider.frame_source.get_stats()
+        if self.remote_store is not None:
+            stats['remote'] = self.remote_store.get_stats()
+        return stats
+
+    def get_review_counts(self):
+        '''
+        Count the round-trips to the annotator since the video is loaded (counted with or without telemetry)
+
+        Returns:
+        counts (dict):  'resets' (anchor resets by cases 2.2 and 2.4), 'popups' (decisions requested, including final checks)
+                        and 'people' (personID -> its own 'resets' and 'popups')
+        '''
+        people = {personID: dict(counts) for personID, counts in self.review_counts.items()}
+        return {'resets': sum(counts['resets'] for counts in people.values()),
+                'popups': sum(counts['popups'] for counts in people.values()), 'people': people}
+
+    def __count_review(self, personID:str, name:str):
+        counts = self.review_counts.setdefault(personID, {'resets': 0, 'popups': 0})
+        counts[name] += 1
 
     def release(self):
+        if self.frame_provider is not None:
+            self.frame_provider.close()
+        if self.remote_store is not None:
+            self.remote_store.close()
+            self.remote_store = None
+        if self.checkpoint is not None:
+            self.checkpoint.close()
         self.tracked_dfs = {}
+        self.raw_tracks = {}
+        self.review_counts = {}
         self.frame_dir = None
-        self.proposal_df = None
+        self.frame_provider = None
+        self.detections = None
+
+    @property
+    def proposal_df(self):
+        '''
+        Detections not used by any tracked person
+        '''
+        if self.detections is None:
+            return None
+        return self.detections.to_dataframe(self.detections.free_mask())
 
-    def set_remote_connection(self, remote_frame_dir:str, sftp:paramiko.SFTPClient):
+    def set_remote_connection(self, remote_frame_dir:str, sftp:paramiko.SFTPClient, num_channels=4, disk_quota_mb=None):
+        '''
+        Read frames from a remote directory, downloaded into frame_dir on demand
+        Args:
+        remote_frame_dir:   the remote directory holding frames
+        sftp:               a connected SFTP client, more channels are opened on its transport
+        num_channels:       the number of SFTP channels used to download frames concurrently
+        disk_quota_mb:      the disk quota of downloaded frames in frame_dir (None for no limit)
+        '''
         self.remote_frame_dir = remote_frame_dir
         self.sftp = sftp
+        self.set_remote_backend(SFTPBackend(sftp, remote_frame_dir, num_channels), disk_quota_mb)
+
+    def set_remote_backend(self, backend, disk_quota_mb=None):
+        '''
+        Read frames from a given backend of remote_store (e.g. LocalDirBackend to stand in for the remote host)
+        '''
+        self.remote_backend = backend
+        self.remote_disk_quota_mb = disk_quota_mb
         self.remote = True
+        self.__connect_remote_store()
+
+    def __connect_remote_store(self):
+        if self.remote_backend is None or self.frame_dir is None:
+            return
+        frame_source = self.frame_provider.frame_source
+        if not isinstance(frame_source, JpegDirSource):
+            print("[WARNING] Remote frames are only supported for frame directories, frames are read from %s."%self.frame_dir)
+            return
+        if self.remote_store is not None:
+            self.remote_store.close()
+        self.remote_store = RemoteFrameStore(self.remote_backend, frame_source.frame_dir, self.remote_disk_quota_mb, self.prefetch_workers)
+        self.frame_provider.set_remote(self.remote_store)
 
     def get_person_df(self, personID):
         if not personID in self.tracked_dfs:
@@ -143,18 +331,29 @@ class PersonTracker:
         
     def load_from_files(self,
                         raw_detection_file: str,
-                        frame_dir):
+                        frame_dir,
+                        use_cache=True):
         '''
         Args:
         raw_detection_file: the csv file with raw_annotation_detection
-        frame_dir:          the path to read in frames
+        frame_dir:          the path to read in frames (a directory of %06d.jpg frames), a video to decode frames from,
+                            or a frame_source.FrameSource
+        use_cache:          whether or not to keep a typed, memory-mapped copy of the detections next to raw_detection_file
         '''
 
         self.frame_dir = frame_dir
-        columns = ['frameID', 'label', 'xmin', 'ymin', 'xmax', 'ymax']
-        raw_df = pd.read_csv(raw_detection_file, names = columns)
-        raw_df = raw_df[['frameID', 'xmin', 'ymin', 'xmax', 'ymax']].sort_values(by=['frameID', 'xmin']).reset_index(drop=True)
-        self.proposal_df = raw_df
+        if self.frame_provider is not None:
+            self.frame_provider.close()
+        frame_source = open_frame_source(frame_dir, frame_reader=FrameReader(thumbnails=self.preview_thumbnails))
+        self.frame_provider = FrameProvider(frame_source, max_cache_mb=self.frame_cache_mb, num_workers=self.prefetch_workers)
+        self.__connect_remote_store()
+        with self.telemetry.timer('load_detections'):
+            self.detections = load_detections(raw_detection_file, use_cache)
+        if self.grid_size:
+            with self.telemetry.timer('index'):
+                self.detections.build_index(self.grid_size)
+        self.review_counts = {}
+        self.__restore_checkpoint()
 
     def track_person(self, personID, start_frame=1, end_frame = -1):
         '''
@@ -169,40 +368,105 @@ class PersonTracker:
             return None
         
         else:
-            end_frame = self.proposal_df.frameID.max() if end_frame<0 else end_frame
-            tracked_df = self.__track_person(
-                self.proposal_df,
-                personID,
-                start_frame,
-                end_frame
-            )
-            if not tracked_df is None:
-                if not (personID in self.tracked_dfs.keys()):
-                    self.tracked_dfs[personID] = []
-
-                self.tracked_dfs[personID].append(tracked_df)
-
-                new_proposal = pd.merge(self.proposal_df, tracked_df, how = 'left', indicator = True)# Remove used annotations
-                new_proposal = new_proposal[new_proposal['_merge']=='left_only']
-                del new_proposal['_merge']
-                self.proposal_df = new_proposal
-
-            else:
-                print("[ERROR] Tracking Failed.")    
+            end_frame = self.detections.max_frame if end_frame<0 else end_frame
+            key = ['track_person', [personID], int(start_frame), int(end_frame)]
+            if self.__restored_run(key):
+                return None
+            start = time.time()
+            with self.telemetry.timer('track'), self.__session_run(key):
+                tracked = self.__track_person(
+                    self.detections,
+                    personID,
+                    start_frame,
+                    end_frame
+                )
+                # stored within the run, so that the checkpoint of the finished run has it
+                if not tracked is None:
+                    self.__add_tracked_df(personID, *tracked)
+
+                else:
+                    print("[ERROR] Tracking Failed.")    
+            self.__log_track('track_person', [personID], start_frame, end_frame, time.time()-start)
 
     
-    def track_all(self, start_frame=1, end_frame=-1):
+    def track_all(self, start_frame=1, end_frame=-1, personIDs=None, reset_on_movement=False):
         '''
-        Args:
-        Track all people in the proposal df
+        Track all people in the proposal df, in one pass over the frames.
+        At each frame, boxes are assigned to all tracked people at once by maximizing the overlaps with their anchors,
+        and only the ambiguous matches are shown to the annotator.
 
-        personIDs:          the perople to track in the proprosal df, if not specified, will track all people present in the video, by naming 'p1', 'p2', ...
+        Args:
         start_frame:        the frame to start running head selection
         end_frame:          the frame to end running head selection (-1 for according to the end of given dataframe)
+        personIDs:          the perople to track in the proprosal df, if not specified, will track all people present in the video, by naming 'p1', 'p2', ...
+                            (then every head at the first frame is taken as the anchor of a person, without Pop_up Windows)
+        reset_on_movement:  also reset the anchor (case 2.4) when the best head overlaps less than overlap_upper with it and there are other heads
+                            at the frame, as it is without other heads; by default the best head is taken then, as track_person does
+        '''
 
+        if self.frame_dir is None:
+            print("[ERROR] No information stored. Please call the load_from_files function first!")
+            return None
+
+        end_frame = self.detections.max_frame if end_frame<0 else end_frame
+        key = ['track_all', None if personIDs is None else list(personIDs), int(start_frame), int(end_frame)]
+        if reset_on_movement:
+            key.append('reset_on_movement')
+        if self.__restored_run(key):
+            return None
+        start = time.time()
+        with self.telemetry.timer('track'), self.__session_run(key):
+            tracked_dfs = self.__track_all(
+                self.detections,
+                personIDs,
+                start_frame,
+                end_frame,
+                reset_on_movement
+            )
+            # stored within the run, so that the checkpoint of the finished run has them
+            for personID, tracked in tracked_dfs.items():
+                if not tracked is None:
+                    self.__add_tracked_df(personID, *tracked)
+                else:
+                    print("[ERROR] Tracking Failed on person %s."%personID)
+        self.__log_track('track_all', list(tracked_dfs.keys()), start_frame, end_frame, time.time()-start)
+
+    def __log_track(self, mode:str, personIDs:list, start_frame:int, end_frame:int, seconds:float):
+        if self.telemetry.enabled:
+            self.telemetry.event('track', mode=mode, personIDs=personIDs, start_frame=start_frame, end_frame=end_frame,
+                                 seconds=seconds, stats=self.get_stats())
+
+    def __add_tracked_df(self, personID, tracked_df:pd.DataFrame, raw_track:dict):
+        '''
+        Store a tracked dataframe (used annotations are already claimed in self.detections), and the tracked heads it is interpolated from
         '''
-    # TODO
-        return None
+        if not (personID in self.tracked_dfs.keys()):
+            self.tracked_dfs[personID] = []
+            self.raw_tracks[personID] = []
+
+        self.tracked_dfs[personID].append(tracked_df)
+        self.raw_tracks[personID].append(raw_track)
+
+    def reinterpolate(self, max_gap=None, smooth_window=0):
+        '''
+        Interpolate (and smooth) all tracked people again with other thresholds, without tracking them again
+        Args:
+        max_gap:        tracked heads are interpolated over gaps of at most max_gap frames (None for any gap), longer gaps are left NaN
+        smooth_window:  the width (in frames) of a centered moving average over the interpolated heads (0 for no smoothing)
+        '''
+        self.max_gap = max_gap
+        self.smooth_window = smooth_window
+        personIDs = [personID for personID, raw_tracks in self.raw_tracks.items() for _ in raw_tracks]
+        raw_tracks = [raw_track for raw_tracks in self.raw_tracks.values() for raw_track in raw_tracks]
+        self.tracked_dfs = {}
+        for personID, track in zip(personIDs, interpolate_tracks(raw_tracks, max_gap, smooth_window)):
+            self.tracked_dfs.setdefault(personID, []).append(self.__track_df(personID, *track))
+
+    def __track_df(self, personID, frame_ids:np.ndarray, boxes:np.ndarray):
+        track_df = pd.DataFrame(boxes, columns=BOX_COLUMNS)
+        track_df.insert(0, 'frameID', frame_ids)
+        track_df['personID'] = personID
+        return track_df
 
     
     def __get_head_img(
@@ -212,179 +476,432 @@ class PersonTracker:
             show_width=640):
         '''
         Get an head image with head annotations to show in the Pop_up Window
+        The frame comes (already downloaded, decoded and resized) from the frame provider
         '''
-        if self.remote:
-            # Download frame to local
-            remote_frame_path = '%s/%06d.jpg'%(self.remote_frame_dir, info_dict['frameID'])
-            print("Downloading %s"%remote_frame_path)
-            self.sftp.get(remote_frame_path, '%s/%06d.jpg'%(self.frame_dir, info_dict['frameID']))
-        
-        frame = cv2_safe_read('%s/%06d.jpg'%(self.frame_dir, info_dict['frameID']))
-        h, w, _ = frame.shape
+        with self.telemetry.timer('preview'):
+            frame, (h, w) = self.frame_provider.get(info_dict['frameID'])
+        if frame.shape[:2]!=(show_height, show_width):
+            frame = cv2.resize(frame, (show_width, show_height))
         xmin, ymin, xmax, ymax = map(int, [info_dict['xmin']*w, info_dict['ymin']*h, info_dict['xmax']*w, info_dict['ymax']*h])
         xmin = max(0, xmin-10)
         ymin = max(0, ymin-10)
         xmax = min(w, xmax+10)
         ymax = min(h, ymax+10)
+        # Box is computed on the original frame size, then scaled to the preview size
+        scale_x, scale_y = show_width/w, show_height/h
+        xmin, xmax = int(xmin*scale_x), int(xmax*scale_x)
+        ymin, ymax = int(ymin*scale_y), int(ymax*scale_y)
         head_img = cv2.rectangle(frame, (xmin, ymin), (xmax, ymax), (0,255,0), 2)
-        head_img = cv2.resize(head_img, (show_width, show_height))
         
         return head_img
+
+    def __prefetch_frames(self, frameIDs:list, end_frame:int):
+        '''
+        Ask the frame provider to prepare frames that are likely to show up in the next Pop_up Windows
+        '''
+        self.frame_provider.prefetch([f for f in frameIDs if 0<f<=end_frame and self.detections.has_frame(f)])
     
-    def __intersection_ratio(self, box1:list, box2:list):
+    def __intersection_ratio(self, boxes:np.ndarray, box2:list):
         '''
-        Find the intersection area of box1 and box2 over box2
+        Find the intersection area of every box in boxes (shape: N x 4) over box2
         '''
-        # Calculate the intersection area
-        x1 = max(box1[0], box2[0])
-        y1 = max(box1[1], box2[1])
-        x2 = min(box1[2], box2[2])
-        y2 = min(box1[3], box2[3])
-        intersection_area = max(0, x2 - x1) * max(0, y2 - y1)
+        # Calculate the intersection areas of all boxes at once
+        x1 = np.maximum(boxes[:, 0], box2[0])
+        y1 = np.maximum(boxes[:, 1], box2[1])
+        x2 = np.minimum(boxes[:, 2], box2[2])
+        y2 = np.minimum(boxes[:, 3], box2[3])
+        intersection_area = np.maximum(0, x2 - x1) * np.maximum(0, y2 - y1)
         box2_area = max(0, box2[2]-box2[0])*max(0, box2[3]-box2[1])
         ratio = intersection_area/box2_area
         return ratio
-    
+
+    def __score_candidates(self, boxes:np.ndarray, overlappings:np.ndarray, confusing_anchor):
+        '''
+        Score all candidate boxes of a frame against the anchor (their overlaps, see __anchor_overlaps) and the confusing anchor
+
+        Returns:
+        sorted_overlappings (np.array): overlaps with the anchor in ascending order
+        sorted_idxes (np.array):        positions (in boxes) of the sorted overlaps
+        confusion (np.array):           overlaps with the confusing anchor, in the original order
+        '''
+        confusion = self.__intersection_ratio(boxes, confusing_anchor) if confusing_anchor else np.zeros(len(boxes))
+        # a stable sort keeps ties in their original order, as sorted() does
+        sorted_idxes = np.argsort(overlappings, kind='stable')
+        sorted_overlappings = overlappings[sorted_idxes]
+        return sorted_overlappings, sorted_idxes, confusion
+
+    def __match_case(self, sorted_overlappings:np.ndarray, sorted_idxes:np.ndarray, confusion:np.ndarray, num_candidates:int, reset_on_movement=False):
+        '''
+        Decide how the anchor matches the candidate boxes of a frame (scored by __score_candidates)
+        num_candidates is the number of candidate boxes of the frame, including the ones far from the anchor which are not scored
+
+        Returns:
+        case (str): '2.1' the target head is not found, '2.2' or '2.4' the anchor needs to be reset,
+                    '2.5' the best candidate is the target head
+        '''
+        # Case 2.1: No detected head is close to the anchor
+        # -> the target head is not found
+        if sorted_overlappings[-1]<=self.overlap_lower:
+            return '2.1'
+
+        # Case 2.2: there are more than 1 head boxes very close to the given anchor
+        # -> the target head may be overlapping with other heads
+        elif  (num_candidates>1):
+            # boxes not scored are far from the anchor, the second best overlap is then 0
+            if (len(sorted_overlappings)>1) and (sorted_overlappings[-2] >=self.overlap_lower) and (confusion[sorted_idxes[-2]]<self.overlap_lower): 
+                return '2.2'
+            # with other heads, a big movement only resets the anchor if asked for (see track_all)
+            if reset_on_movement and sorted_overlappings[-1]<self.overlap_upper:
+                return '2.4'
+
+        # Case 2.4: There seems to be a big movement of head
+        elif sorted_overlappings[-1]<self.overlap_upper:
+            return '2.4'
+
+        # Case 2.5: No other cases
+        return '2.5'
+
     def __track_person(
             self,
-            proposal_df:pd.DataFrame,
+            detections:DetectionStore,
             personID: str,
             start_frame:int,
             end_frame:int,
         ):
-    
-        proposal_df['personID'] = None
-        skipped_frames = []
+        '''
+        Track one person, which is the multi-person tracking with a single person
+        '''
+        return self.__track_all(detections, [personID], start_frame, end_frame)[personID]
 
-        grouped_df = proposal_df.groupby('frameID')
-        frame_ls = proposal_df.frameID.unique()
-        
-        select_new_anchor = True
-        confusing_anchor = False
-        Terminated = False
+    def __track_all(
+            self,
+            detections:DetectionStore,
+            personIDs:list,
+            start_frame:int,
+            end_frame:int,
+            reset_on_movement=False,
+        ):
+        '''
+        Track several people in one pass over the frames (see track_all for reset_on_movement).
+        At each frame, the boxes are jointly assigned to people with anchors, the boxes assigned to the other people
+        are not candidates of a person. Decisions are requested through self.review_queue without waiting for them:
+        a person waiting for a decision falls behind and catches up alone once it is answered,
+        while the other people keep being tracked.
 
+        Returns:
+        tracked_dfs (dict): personID -> (tracked dataframe, tracked heads it is interpolated from), None if dropped
+        '''
         f = start_frame
+        while f<end_frame and len(detections.free_idxes(f))==0:
+            f+=1
+        if personIDs is None:
+            # Every head at the first frame is the anchor of a new person
+            first_idxes = detections.free_idxes(f)
+            personIDs = []
+            n = 1
+            while len(personIDs)<len(first_idxes):
+                if not 'p%d'%n in self.tracked_dfs:
+                    personIDs.append('p%d'%n)
+                n+=1
+        else:
+            first_idxes = []
+
+        people = {}
+        for personID in personIDs:
+            people[personID] = {
+                'personID': personID,
+                'anchor_coord': None,
+                'confusing_anchor': False,
+                'select_new_anchor': True,
+                'terminated': False,
+                'f': f,             # the next frame to track for this person
+                'pending': None,    # the ReviewRequest waiting for a decision
+                'pending_idxes': None,  # positions in detections of the candidates of the pending request
+                'tracked_idxes': [],
+                'skipped_frames': IntervalSet(),
+                'motion': make_motion_model(self.motion_model), # predicts the anchor at the next frames, None without a motion model
+                'reset_on_movement': reset_on_movement,
+            }
+        for personID, i in zip(personIDs, first_idxes):
+            self.__accept(detections, people[personID], i)
+        if len(first_idxes)>0:
+            f+=1
 
-        while (not Terminated) and (f<end_frame):
-            if f not in frame_ls:
-                # If encounter missing frames in the dataframe, just increment and ignore
-                f+=1 
+        # The first anchor setup and the final check are known in advance
+        self.__prefetch_frames([f, end_frame-1], end_frame)
+
+        while True:
+            self.__apply_decisions(detections, people, start_frame, end_frame)
+            if all(person['terminated'] for person in people.values()):
+                break
+            for person in people.values():
+                # People whose decisions came after the tracking went on
+                if not (person['terminated'] or person['pending']) and person['f']<f:
+                    self.__catch_up(detections, person, f, end_frame)
+
+            pending = [person['pending'].frameID for person in people.values() if person['pending']]
+            waiting = [person for person in people.values() if not (person['terminated'] or person['pending'])]
+            if f>=end_frame or len(waiting)==0 or (pending and f-min(pending)>=self.review_lookahead):
+                # Nothing can be done without the pending decisions
+                if len(pending)==0:
+                    break
+                with self.telemetry.timer('review'):
+                    self.reviewer.serve(self.review_queue)
                 continue
-            # Case 1: a new anchor needs to be set.
-            while select_new_anchor and ((not Terminated) and (f<end_frame)):
-                if f not in frame_ls:
-                    # If encounter missing frames in the dataframe, just increment and ignore
-                    f+=1 
-                    continue
-                bboxes = grouped_df.get_group(f) # annotations of heads at current frame
-                show_window = True
-                for i, entry in bboxes.iterrows():
-                    bbox = entry['frameID':'ymax'].to_dict()
-                    if show_window:
-                        anchor_head_img = self.__get_head_img(bbox)
-                        window = PopupWindow(anchor_head_img, "[Anchor Setup]" , personID)
-                        decision = window.get_result()
-                        if decision=='Yes': 
-                            anchor_coord = entry['xmin':'ymax'].to_list()
-                            proposal_df.at[i, 'personID'] = personID
-                            select_new_anchor = False
-                            f+=1
-                            show_window = False
-                        elif decision=='No':
-                            confusing_anchor = entry['xmin':'ymax'].to_list()
-                        elif decision=='Skip':
-                            show_window = False
-                        elif decision =='Terminate and Drop':
-                            Terminated = True
-                            select_new_anchor = False
-                            show_window = False
-                    else:
-                        confusing_anchor = entry['xmin':'ymax'].to_list()
-                    
-                if select_new_anchor:
-                # After seeing all posible annotations at frame f, 
-                # no annotation can be set as the anchor
-                # A skip automatically happens
-                    skip_start = max(1, f-self.skip_prev_f)
-                    skip_end = min(f+self.skip_follow_f, end_frame)
-                    skipped_frames = skipped_frames+list(range(skip_start, skip_end+1))
-                    f = skip_end
-            
-            # Case 2: the given anthor can be used
-            if f not in frame_ls:
-                # If encounter missing frames in the dataframe, just increment and ignore
-                f+=1 
-                continue
-            bboxes = grouped_df.get_group(f) # annotations of heads at current frame
-            overlappings = {}
-            confusion = {}
-            for i, entry in bboxes.iterrows():
-                bbox = entry['xmin':'ymax'].to_list()
-                intersect = self.__intersection_ratio(bbox, anchor_coord)
-                confusing_intersect = self.__intersection_ratio(bbox, confusing_anchor) if  confusing_anchor else 0
-                overlappings[i] = intersect  
-                confusion[i] = confusing_intersect
-
-            sorted_items = sorted(overlappings.items(), key=lambda x:x[1])
-            sorted_idxes = [item[0] for item in sorted_items]
-            sorted_overlappings = [item[1] for item in sorted_items]
-
-            # Case 2.1: No detected head is close to the anchor
-            # -> the target head is not found
-            if sorted_overlappings[-1]<=self.overlap_lower:
-                f+=1
+
+            ready = [person for person in waiting if person['f']==f]
+            if ready:
+                # People waiting for a decision keep the boxes close to their last anchors from the others
+                reserved = [person for person in people.values() 
+                            if person['pending'] and person['anchor_coord'] is not None]
+                self.__track_frame(detections, ready, reserved, f, end_frame)
+            f+=1
+
+        # Final check of all people at once
+        raw_tracks = {}
+        interpolated_dfs = {}
+        with self.telemetry.timer('interpolate'):
+            for personID, person in people.items():
+                if not person['terminated']:
+                    raw_tracks[personID] = self.__raw_track(
+                        detections, personID, person['tracked_idxes'], person['skipped_frames'], start_frame, end_frame)
+            tracked_people = [personID for personID, raw_track in raw_tracks.items() if raw_track is not None]
+            interpolated = interpolate_tracks([raw_tracks[personID] for personID in tracked_people], self.max_gap, self.smooth_window)
+            for personID in raw_tracks:
+                interpolated_dfs[personID] = None
+            for personID, track in zip(tracked_people, interpolated):
+                interpolated_dfs[personID] = self.__track_df(personID, *track)
+        final_checks = {}
+        for personID, interpolated in interpolated_dfs.items():
+            if interpolated is not None:
+                # the last head of the track (heads after a gap longer than max_gap are not filled)
+                head_at_end = interpolated.dropna(subset=BOX_COLUMNS).iloc[-1].to_dict()
+                final_checks[personID] = self.__request(detections, "[Final Check]", personID, int(head_at_end['frameID']), [head_at_end], end_frame)
+        with self.telemetry.timer('review'):
+            self.reviewer.serve(self.review_queue)
+
+        tracked_dfs = {}
+        for personID, person in people.items():
+            tracked_dfs[personID] = None
+            if person['terminated'] or interpolated_dfs[personID] is None:
                 continue
+            decision = final_checks[personID].future.result()
+            if decision.action in ['No', 'Terminate and Drop']:
+                detections.release(person['tracked_idxes'])
+                print("[WARNING] Something went wrong in the middle! Unwanted head in the final. Tracked data is dropped")
+                print("[WARNING] From Interval %d to %d, On person %s, annotations are dropped"%(start_frame, end_frame, personID))
+                self.dropped_frames.append([start_frame, end_frame])
+            else:
+                tracked_dfs[personID] = (interpolated_dfs[personID], raw_tracks[personID])
+        return tracked_dfs
 
-            # Case 2.2: there are more than 1 head boxes very close to the given anchor
-            # -> the target head may be overlapping with other heads
-            elif  (len(sorted_overlappings)>1):
-                if (sorted_overlappings[-2] >=self.overlap_lower) and (confusion[sorted_idxes[-2]]<self.overlap_lower): 
-                    select_new_anchor = True
-                    print("Reset Anchor at frame : %d by case 2.2"%f)
-                    continue
-
-            # Case 2.4: There seems to be a big movement of head
-            elif sorted_overlappings[-1]<self.overlap_upper:
-                select_new_anchor=True
-                print("Reset Anchor at frame : %d by case 2.4"%f)
+    def __track_frame(self, detections:DetectionStore, ready:list, reserved:list, f:int, end_frame:int):
+        '''
+        Track the given people (who are all at frame f) at frame f,
+        the boxes assigned to the reserved people are not candidates of them (but not claimed)
+        '''
+        self.telemetry.count('frames_visited', len(ready))
+        idxes = detections.free_idxes(f) # unused annotations of heads at current frame
+        if len(idxes)==0:
+            # If encounter missing frames in the dataframe, just increment and ignore
+            for person in ready:
+                person['f'] = f+1
+            return
+
+        # Case 2: people with anchors, boxes are assigned to all of them at once
+        active = [person for person in ready if not person['select_new_anchor']]
+        assignment = {}
+        if len(active)>1 or (active and reserved):
+            with self.telemetry.timer('assign'):
+                # boxes far from all anchors are not assigned to anyone
+                idxes = detections.free_idxes_near(f, [region for person in active+reserved for region in self.__anchor_regions(person, f)])
+                if len(idxes)>0:
+                    boxes = detections.boxes[idxes]
+                    overlaps = np.stack([self.__anchor_overlaps(boxes, person, f) for person in active+reserved])
+                    assignment = {row:idxes[col] for row, col in assign_boxes(overlaps, self.overlap_lower).items()}
+        for row, person in enumerate(active):
+            # boxes assigned to the other people are not candidates
+            others = [i for r, i in assignment.items() if r!=row]
+            self.__step(detections, person, f, others)
+
+        # Case 1: people who need a new anchor
+        for person in ready:
+            if person['select_new_anchor']:
+                self.__request_anchor(detections, person, f, end_frame)
+
+    def __catch_up(self, detections:DetectionStore, person:dict, until_frame:int, end_frame:int):
+        '''
+        Track a person alone from its own frame until until_frame, or until it needs a decision
+        '''
+        while person['f']<min(until_frame, end_frame) and not person['pending']:
+            f = person['f']
+            self.telemetry.count('frames_visited')
+            if len(detections.free_idxes(f))==0:
+                person['f'] = f+1
+            elif person['select_new_anchor']:
+                self.__request_anchor(detections, person, f, end_frame)
+            else:
+                self.__step(detections, person, f, [])
+                if person['select_new_anchor']:
+                    self.__request_anchor(detections, person, f, end_frame)
+
+    def __step(self, detections:DetectionStore, person:dict, f:int, excluded:list):
+        '''
+        Match the anchor of a person at frame f, with free boxes except the excluded ones as candidates
+        '''
+        with self.telemetry.timer('score'):
+            # boxes far from the anchor can not overlap with it
+            candidate_idxes = np.setdiff1d(detections.free_idxes_near(f, self.__anchor_regions(person, f)), excluded)
+            # the excluded boxes are free boxes at frame f
+            num_candidates = len(detections.free_idxes(f))-len(excluded)
+            if len(candidate_idxes)>0:
+                boxes = detections.boxes[candidate_idxes]
+                sorted_overlappings, sorted_idxes, confusion = self.__score_candidates(
+                    boxes, self.__anchor_overlaps(boxes, person, f), person['confusing_anchor'])
+                case = self.__match_case(sorted_overlappings, sorted_idxes, confusion, num_candidates, person['reset_on_movement'])
+            elif num_candidates>0:
+                # Only boxes far from the anchor
+                case = '2.1'
+            else:
+                case = None
+        if case is None:
+            person['f'] = f+1
+            return
+        self.telemetry.count('case_'+case)
+
+        if case=='2.1':
+            person['f'] = f+1
+
+        elif case in ['2.2', '2.4']:
+            person['select_new_anchor'] = True
+            print("Reset Anchor of %s at frame : %d by case %s"%(person['personID'], f, case))
+            self.telemetry.count('resets')
+            self.__count_review(person['personID'], 'resets')
+            self.telemetry.event('reset', personID=person['personID'], frameID=f, case=case)
+
+        else:
+            # Case 2.5: the best candidate is the target head
+            self.__accept(detections, person, candidate_idxes[sorted_idxes[-1]])
+
+    def __accept(self, detections:DetectionStore, person:dict, i:int):
+        '''
+        Take detection i as the head of a person, and move the person to the next frame
+        '''
+        detections.claim(i, person['personID'])
+        person['tracked_idxes'].append(i)
+        # update the dictionary of bounding box locations
+        person['anchor_coord'] = detections.boxes[i].tolist()
+        person['select_new_anchor'] = False
+        person['f'] = int(detections.frame_ids[i])+1
+        if person['motion'] is not None:
+            person['motion'].update(int(detections.frame_ids[i]), person['anchor_coord'])
+
+    def __anchor_regions(self, person:dict, f:int):
+        '''
+        The boxes a candidate of a person at frame f overlaps with, to overlap with its anchor (see __anchor_overlaps)
+        '''
+        if person['motion'] is None:
+            return [person['anchor_coord']]
+        return [person['anchor_coord'], person['motion'].predict(f)]
+
+    def __anchor_overlaps(self, boxes:np.ndarray, person:dict, f:int):
+        '''
+        The overlaps of boxes at frame f with the anchor of a person. With a motion model, a box overlaps with the anchor
+        as much as it does with the last tracked head or with the head predicted at frame f, whichever is more
+        (the head may as well stop or turn back)
+        '''
+        return np.max([self.__intersection_ratio(boxes, region) for region in self.__anchor_regions(person, f)], axis=0)
+
+    def __request(self, detections:DetectionStore, stage:str, personID:str, f:int, candidates:list, end_frame:int):
+        '''
+        Put a decision on the review queue, and prefetch the frames it may lead to
+        '''
+        request = ReviewRequest(stage, personID, f, candidates, lambda i: self.__get_head_img(candidates[i]))
+        self.__count_review(personID, 'popups')
+        if self.telemetry.enabled:
+            submitted = time.time()
+            request.future.add_done_callback(lambda future: self.__log_decision(request, future.result(), time.time()-submitted))
+        self.review_queue.submit(request)
+        self.__prefetch_frames([f, f+1, f+self.skip_follow_f], end_frame)
+        return request
+
+    def __log_decision(self, request:ReviewRequest, decision, seconds:float):
+        self.telemetry.count('decisions/%s/%s'%(request.stage, decision.action))
+        self.telemetry.add_time('decision', seconds)
+        self.telemetry.event('decision', stage=request.stage, personID=request.personID, frameID=request.frameID,
+                             candidates=len(request.candidates), action=decision.action, index=decision.index, seconds=seconds)
+
+    def __request_anchor(self, detections:DetectionStore, person:dict, f:int, end_frame:int):
+        '''
+        Ask which free head at frame f is the person
+        '''
+        idxes = detections.free_idxes(f)
+        person['pending'] = self.__request(detections, "[Anchor Setup]", person['personID'], f,
+                                           [detections.get_info(i) for i in idxes], end_frame)
+        person['pending_idxes'] = idxes
+
+    def __apply_decisions(self, detections:DetectionStore, people:dict, start_frame:int, end_frame:int):
+        '''
+        Update people whose anchor setup is decided
+        '''
+        for person in people.values():
+            request = person['pending']
+            if request is None or not request.future.done():
                 continue
+            person['pending'] = None
+            decision = request.future.result()
+            f = request.frameID
+            idxes = person['pending_idxes']
+            # Candidates before the decided one are rejected, the last other candidate is the confusing anchor
+            others = [i for k, i in enumerate(idxes) if k!=decision.index]
+            if others:
+                person['confusing_anchor'] = detections.boxes[others[-1]].tolist()
+
+            if decision.action=='Yes':
+                i = idxes[decision.index]
+                if detections.owners[i]>=0:
+                    # Taken by another person in the meantime, ask again
+                    self.__request_anchor(detections, person, f, end_frame)
+                else:
+                    self.__accept(detections, person, i)
+            elif decision.action=='Terminate and Drop':
+                person['terminated'] = True
+                detections.release(person['tracked_idxes'])
+                print("[WARNING] The tracking process is Terminated. Tracked data is dropped.")
+                print("[WARNING] From Interval %d to %d, On person %s, annotations are dropped"%(start_frame, end_frame, person['personID']))
+                self.dropped_frames.append([start_frame, end_frame])
+            else:
+                # No annotation can be set as the anchor, a skip automatically happens
+                skip_start = max(1, f-self.skip_prev_f)
+                skip_end = min(f+self.skip_follow_f, end_frame)
+                person['skipped_frames'].add(skip_start, skip_end)
+                person['f'] = skip_end
 
-            # Case 2.5: No other cases:
-            target_idx = sorted_idxes[-1]
-            proposal_df.at[target_idx, 'personID'] = personID
-            # update the dictionary of bounding box locations
-            anchor_coord  = proposal_df.loc[target_idx, 'xmin':'ymax'].to_list()
-            # increment f
-            f+=1
+    def __raw_track(
+            self,
+            detections:DetectionStore,
+            personID:str,
+            tracked_idxes:list,
+            skipped_frames:IntervalSet,
+            start_frame:int,
+            end_frame:int,
+        ):
+        '''
+        Get the tracked heads of a person over [start_frame, end_frame), to be interpolated by interpolation.interpolate_tracks
 
-        if Terminated:
-            print("[WARNING] The tracking process is Terminated. Tracked data is dropped.")
-            print("[WARNING] From Interval %d to %d, On person %s, annotations are dropped"%(start_frame, end_frame, personID))
-            self.dropped_frames.append([start_frame, end_frame])
-            return None
-        
-        proposal_df = proposal_df[proposal_df.personID==personID]
-        proposal_df = proposal_df[['frameID', 'xmin', 'ymin', 'xmax', 'ymax', 'personID']]
-        # Interpolate and Fill NA values
-        interpolated = pd.DataFrame()
-        interpolated['frameID'] = range(start_frame, end_frame)
-
-        interpolated = pd.merge(interpolated, proposal_df, on='frameID', how='left')
-        interpolated['personID'] = personID
-        interpolated = interpolated[~interpolated.frameID.isin(skipped_frames)].apply(lambda x: x.interpolate(method='linear'))
-
-        # Show final confirmation
-        head_at_end = self.__get_head_img(interpolated.iloc[-1].to_dict())
-        window = PopupWindow(head_at_end, "[Final Check]", personID)
-        decision = window.get_result()
-
-        if decision=='No' or 'Terminate and Drop':
-            print("[WARNING] Something went wrong in the middle! Unwanted head in the final. Tracked data is dropped")
-            print("[WARNING] From Interval %d to %d, On person %s, annotations are dropped"%(start_frame, end_frame, personID))
-            self.dropped_frames.append([start_frame, end_frame])
+        Returns:
+        raw_track (dict): 'frame_ids', 'boxes', 'start_frame', 'end_frame' and 'skipped', None if no head is tracked
+        '''
+        tracked_idxes = np.array(tracked_idxes, dtype=int)
+        # heads at skipped frames are not kept, give them back
+        in_skipped = skipped_frames.contains(detections.frame_ids[tracked_idxes])
+        detections.release(tracked_idxes[in_skipped])
+        tracked_idxes = tracked_idxes[~in_skipped]
+        if len(tracked_idxes)==0:
+            print("[WARNING] No head is tracked on person %s from Interval %d to %d."%(personID, start_frame, end_frame))
             return None
+        return {'frame_ids': detections.frame_ids[tracked_idxes].astype(int), 'boxes': detections.boxes[tracked_idxes].astype(float),
+                'start_frame': int(start_frame), 'end_frame': int(end_frame), 'skipped': skipped_frames}
 
-        return interpolated
-    
     def get_dropped_frames(self):
         return self.dropped_frames
@@ -5,9 +5,85 @@ import cv2
 import numpy as np
 import os
 import json
+import threading
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+
+from render_pipeline import RenderPipeline
+from frame_reader import FrameReader
+from frame_source import open_frame_source
+
+class DrawOps:
+    RECT, CIRCLE, LINE, TEXT, ILLUSTR = range(5)
+    COLUMNS = ['pos', 'layer', 'kind', 'x1', 'y1', 'x2', 'y2', 'color', 'arg']
+
+    def __init__(self, capacity=1024):
+        """
+        Draw operations recorded on frames, one int32 row per operation (see COLUMNS), in a growing array
+        @pos: position of the frame in the frame list
+        @layer: the number of timelines drawn before the operation
+        @x1, y1, x2, y2: points of the operation in pixels (x1, y1 only for circles, texts and illustrations (the right edge))
+        @color: index in self.colors, the keys of color_dict
+        @arg: index in self.args, the texts and illustrations
+        """
+        self._data = np.zeros((capacity, len(self.COLUMNS)), dtype=np.int32)
+        self._n = 0
+        self.colors = []
+        self.args = []
+        self._arg_idxes = {} # text (or id of illustration) -> index in self.args
+
+    def __len__(self):
+        return self._n
+
+    def add(self, kind:int, positions:np.ndarray, points:np.ndarray, color_name:str, layer:int, args=None):
+        """
+        record operations of one kind on frames at given positions
+        @points: N x 4 (or less) points in pixels
+        @args: a text/illustration for all operations, or a list of them (one for each operation)
+        """
+        n = len(positions)
+        if n==0:
+            return
+        if self._n+n>len(self._data):
+            data = np.zeros((max(2*len(self._data), self._n+n), len(self.COLUMNS)), dtype=np.int32)
+            data[:self._n] = self._data[:self._n]
+            self._data = data
+        if not color_name in self.colors:
+            self.colors.append(color_name)
+        rows = self._data[self._n:self._n+n]
+        rows[:] = 0
+        rows[:, 0] = positions
+        rows[:, 1] = layer
+        rows[:, 2] = kind
+        rows[:, 3:3+points.shape[1]] = points
+        rows[:, 7] = self.colors.index(color_name)
+        if args is None:
+            rows[:, 8] = -1
+        elif isinstance(args, list):
+            rows[:, 8] = [self._arg_idx(arg) for arg in args]
+        else:
+            rows[:, 8] = self._arg_idx(args)
+        self._n += n
+
+    def _arg_idx(self, arg):
+        key = arg if isinstance(arg, str) else id(arg)
+        if not key in self._arg_idxes:
+            self._arg_idxes[key] = len(self.args)
+            self.args.append(arg)
+        return self._arg_idxes[key]
+
+    def by_frame(self, n_frames:int):
+        """
+        get the operations sorted by frame (in the recorded order within a frame) 
+        and offsets, where offsets[pos]:offsets[pos+1] holds the operations of the frame at pos
+        """
+        ops = self._data[:self._n]
+        ops = ops[np.argsort(ops[:, 0], kind='stable')]
+        offsets = np.searchsorted(ops[:, 0], np.arange(n_frames+1), side='left')
+        return ops, offsets
 
 class Visualizer:
-    def __init__(self):
+    def __init__(self, num_decoders=4, num_drawers=2, reduced_decode=True, thumbnails=False, thumbnail_dir=None):
         """
         A basic tool to visualize videos based on given dataframes
         @functionalities:
@@ -17,8 +93,22 @@ class Visualizer:
         4. draw_gaze_heatmaps 
         5. draw_emotion_curve
         6. draw_focus_curve
+        @num_decoders: the number of threads reading frames in generate_output_vid (and load_frames_*)
+        @num_drawers: the number of threads drawing on frames in generate_output_vid
+        @reduced_decode: decode JPEGs at 1/2, 1/4 or 1/8 of their size when compressed frames are still smaller
+        @thumbnails: keep the reduced frames on disk (in thumbnail_dir, or next to the frame directory), see FrameReader
         """
+        self.num_decoders = num_decoders
+        self.num_drawers = num_drawers
+        self.render_stats = None # stats of the last generate_output_vid, see RenderPipeline.get_stats
+        self.frame_reader = FrameReader(reduced_decode, thumbnails, thumbnail_dir)
         self._frame_list = {}
+        self._stream = False
+        self._parallel_reads = True # False when frames come from a source read by one thread (a video)
+        self._ops = DrawOps() # boxes, gazes and texts to draw, recorded by draw_* calls
+        self._layers = [] # timelines (draw_*_curve calls) drawn over the operations recorded before them
+        self._timelines = {} # (layer, width) -> full-length strip of the timeline
+        self._timeline_lock = threading.Lock()
         self.fourcc = cv2.VideoWriter_fourcc(*'mp4v') # set the codec
         self.font = cv2.FONT_HERSHEY_SIMPLEX
         self.circle_thickness = 5
@@ -34,6 +124,7 @@ class Visualizer:
         self.h = -1
 
     def update_colors(self, new_color_dict:dict):
+        # colors are looked up when the video is generated, so this also recolors boxes and gazes drawn before
         self.color_dict = new_color_dict
 
     def set_output_width_height(self, width: int, height:int):
@@ -43,7 +134,7 @@ class Visualizer:
         self.w = width
         self.h = height
 
-    def load_frames_from_dir(self, frame_dir:str, compression=0.5):
+    def load_frames_from_dir(self, frame_dir:str, compression=0.5, stream=False):
         """
         load all frames from a given directory
         """
@@ -51,12 +142,14 @@ class Visualizer:
         framels = ['%s/%s'%(frame_dir, f) for f in os.listdir(frame_dir) if f[-4:]=='.jpg']
         framels.sort()
 
-        self.load_frames_from_list(framels, compression)
+        self.load_frames_from_list(framels, compression, stream)
 
-    def load_frames_from_list(self, frame_ls:enumerate, compression=0.5):
+    def load_frames_from_list(self, frame_ls:enumerate, compression=0.5, stream=False):
         """
         load frames by a given list
         @ self._frame_list: keys are path to the frames, values are frames
+        @stream: if True, only the paths are kept, frames are decoded one at a time in generate_output_vid,
+                 so that the memory does not grow with the length of the video
         """
         initial_frame = cv2_safe_read(frame_ls[0])
 
@@ -67,58 +160,114 @@ class Visualizer:
             self.h = h 
             self.w = w
 
-        for f in range(len(frame_ls)):
-            frame_path = frame_ls[f]
-            frame = cv2_safe_read('%s\\%06d.jpg'%(frame_path))
-            self._frame_list[f] = cv2.resize(frame, (w,h)) if compression<1 else frame
+        self._load_frames(None, frame_ls, compression, stream)
+
+    def load_frames_from_source(self, frames, compression=0.5, stream=False, frame_ids=None):
+        """
+        load frames from a video (decoded directly, without extracting frames), a directory of %06d.jpg frames, or a FrameSource
+        @frame_ids: frameIDs to load, all frames of the source if None (keys of self._frame_list are positions, as in load_frames_from_list)
+        @stream: see load_frames_from_list
+        """
+        source = open_frame_source(frames, self.frame_reader)
+        frame_ids = source.frame_ids() if frame_ids is None else list(frame_ids)
+
+        if self.w<0:
+            # update values by the given frames
+            h, w = source.frame_size()
+            h, w = map(int, [h*compression, w*compression])
+            self.h = h 
+            self.w = w
+
+        self._load_frames(source, frame_ids, compression, stream)
+
+    def _load_frames(self, source, frame_keys:list, compression:float, stream:bool):
+        """
+        load frames of a source (paths read by self.frame_reader if source is None) by their keys
+        """
+        self._stream = stream
+        self._parallel_reads = source is None or source.parallel_reads
+        size = (self.w, self.h) if compression<1 else None
+        if stream:
+            for f in range(len(frame_keys)):
+                self._frame_list[f] = (source, frame_keys[f], size)
+            return
+        # frames are decoded by threads (one for a video), in the order of frame_keys
+        with ThreadPoolExecutor(max_workers=self.num_decoders if self._parallel_reads else 1) as pool:
+            for f, frame in enumerate(pool.map(partial(self._decode, source, size=size), frame_keys)):
+                self._frame_list[f] = frame
+
+    def _read_frame(self, key):
+        """
+        get the frame of key, as loaded (no draw operation applied)
+        """
+        if not self._stream:
+            return self._frame_list[key]
+        source, frame_key, size = self._frame_list[key]
+        return self._decode(source, frame_key, size)
+
+    def _decode(self, source, frame_key, size=None):
+        if source is None:
+            frame, _ = self.frame_reader.read(frame_key, size)
+        else:
+            frame, _ = source.read(frame_key, size)
+        return frame
+
+    def _frame_positions(self, annotations:dict):
+        """
+        get positions (in self._frame_list) of the annotated frames, frames not loaded are reported and left out
+        """
+        positions = {key:pos for pos, key in enumerate(self._frame_list.keys())}
+        keys = []
+        for img_path in annotations.keys():
+            if not img_path in positions:
+                print("[ERROR] The image %s is not loaded in the frame list, please recheck!"%img_path)
+                continue
+            keys.append(img_path)
+        return keys, np.array([positions[key] for key in keys], dtype=np.int64)
+
+    def _color_name(self, color_by_id):
+        """
+        get the key of color_dict to draw with, colors are looked up when the video is generated
+        """
+        if color_by_id:
+            if not color_by_id in self.color_dict.keys():
+                print("[ERROR] The chosen color id is not in color_dict of this Visualizer, will use general color to draw.")
+                print("Please update the color_dict.")
+                return "general"
+            return color_by_id
+        return "general"
 
     def draw_bboxes(self, annotations:dict, color_by_id=None, write_id=False):
         """
         draw bboxes on all frames in self._frame_list by given annotations
+        (the boxes are recorded, and drawn with the colors and thickness at the time of generate_output_vid)
         inputs:
         @annotations: dictionary[image_path] = [xmin, ymin, xmax, ymax], values normalized in 0-1
         @color_by_id: the ID (specific color) of the box, if None, will use general_color
         @write_id: write the given id of on the left top of the bounding box
         """
-        if color_by_id:
-            if not color_by_id in self.color_dict.keys():
-                print("[ERROR] The chosen color id is not in color_dict of this Visualizer, will use general color to draw.")
-                print("Please update the color_dict.")
-                draw_color = self.color_dict["general"]
-            else:
-                draw_color = self.color_dict[color_by_id]
-        else:
+        color_name = self._color_name(color_by_id)
+        if not color_by_id:
             write_id = False
-            draw_color = self.color_dict["general"]
 
-        for img_path in annotations.keys():
-            xmin, ymin, xmax, ymax = annotations[img_path]
-            xmin, ymin, xmax, ymax = map(int, [xmin*self.w, ymin*self.h, xmax*self.w, ymax*self.h])   
-            try:
-                frame = self._frame_list[img_path]   
-            except Exception as e:
-                print("[ERROR] The image %s is not loaded in the frame list, please recheck!"%img_path)
-                continue
-            frame = self._draw_individual_bbox(img_path, (xmin,ymin, xmax, ymax), draw_color) # Draw head box
-            if write_id:
-                frame = cv2.putText(frame, str(color_by_id), (xmin+5, ymax+20), self.font, self.font_size, color_by_id, self.line_thickness)
-            
-            self._frame_list[img_path] = frame
+        keys, positions = self._frame_positions(annotations)
+        bboxes = np.array([annotations[key] for key in keys], dtype=float).reshape(-1, 4)
+        bboxes = (bboxes*[self.w, self.h, self.w, self.h]).astype(int)
+        self._draw_individual_bbox(positions, bboxes, color_name) # Draw head box
+        if write_id:
+            self._ops.add(DrawOps.TEXT, positions, np.c_[bboxes[:, 0]+5, bboxes[:, 3]+20], color_name, len(self._layers), str(color_by_id))
 
-    def _draw_individual_bbox(self, img_path:str, bbox:tuple, color:tuple):
+    def _draw_individual_bbox(self, positions:np.ndarray, bboxes:np.ndarray, color_name:str):
         """
-        draw bounding boxes on given img_path
+        draw bounding boxes (in pixels) on frames at given positions
         """
-        xmin, ymin, xmax, ymax = bbox
-        frame = self._frame_list[img_path]
-        frame  = cv2.rectangle(frame, (xmin,ymin), (xmax, ymax), color, self.line_thickness) 
-        self._frame_list[img_path] = frame
-        return frame
+        self._ops.add(DrawOps.RECT, positions, bboxes, color_name, len(self._layers))
     
     def draw_gaze_general(self, annotations:dict, color_by_id=None, write_pattern=False, draw_pattern_illustr=False,
                           illustr_path=r'D:\ShanghaiASD_project\ShanghaiASD\Misc'):
         """
         draw gaze line point on all frames in self._frame_list by given annotations
+        (the gazes are recorded, and drawn with the colors and thickness at the time of generate_output_vid)
         inputs:
         @annotations: dictionary[image_path] = [xmin, ymin, xmax, ymax, gaze_x, gaze_y, patterns], values normalized in 0-1
         @color_by_id: the ID (specific color) of the box, if None, will use general_color
@@ -127,44 +276,34 @@ class Visualizer:
         @draw_pattern_illustr: draw the gaze pattern illustration on the right top corner of the video
         @illustr_path: path to gaze pattern illustration figures.
         """
-
-        if color_by_id:
-            if not color_by_id in self.color_dict.keys():
-                print("[ERROR] The chosen color id is not in color_dict of this Visualizer, will use general color to draw.")
-                print("Please update the color_dict.")
-                draw_color = self.color_dict["general"]
-            else:
-                draw_color = self.color_dict[color_by_id]
-        else:
-            draw_color = self.color_dict["general"]
+        color_name = self._color_name(color_by_id)
 
         if draw_pattern_illustr:
             illustr_path = illustr_path
             assert os.path.exists(illustr_path)
             
-        for img_path in annotations.keys():
-            xmin, ymin, xmax, ymax, gaze_x, gaze_y, pattern = annotations[img_path]
-            xmin, ymin, xmax, ymax, gaze_x, gaze_y = map(int, [xmin*self.w, ymin*self.h, xmax*self.w, ymax*self.h, \
-                                                               gaze_x*self.w, gaze_y*self.h])   
-            try:
-                frame = self._frame_list[img_path]   
-            except Exception as e:
-                print("[ERROR] The image %s is not loaded in the frame list, please recheck!"%img_path)
-                continue
-            frame = self._draw_individual_bbox(img_path, (xmin,ymin, xmax, ymax), draw_color) # Draw head box
-            center_x, center_y = map(int,[(xmax+xmin)/2, (ymin+ymax)/2])
-            frame = cv2.circle(frame, (gaze_x, gaze_y), self.circle_thickness, draw_color, -1) # Draw gaze point
-            frame = cv2.line(frame, (center_x, center_y), (gaze_x, gaze_y), draw_color, self.line_thickness) # Draw line from head center to gaze point
-            
-            if write_pattern: # Write Gaze Pattern
-                frame  = cv2.putText(frame, str(pattern), (xmin+5, ymax+20), self.font, self.font_size, draw_color, self.line_thickness)
-            
-            if (draw_pattern_illustr): # Draw based on the given gaze pattern
-                fig = cv2_safe_read('%s/%s_figure.png'%(illustr_path, pattern.lower()))
-                fig_h, fig_w, _ = fig.shape
-                frame[:fig_h, -fig_w:, :] = fig
-                frame = cv2.rectangle(frame, (self.w-fig_w, 0), (self.w, fig_h), draw_color, self.line_thickness)
-            self._frame_list[img_path] = frame
+        keys, positions = self._frame_positions(annotations)
+        gazes = np.array([annotations[key][:6] for key in keys], dtype=float).reshape(-1, 6)
+        gazes = (gazes*[self.w, self.h, self.w, self.h, self.w, self.h]).astype(int)
+        patterns = [annotations[key][6] for key in keys]
+        bboxes, gaze_points = gazes[:, :4], gazes[:, 4:]
+        centers = np.c_[(bboxes[:, 2]+bboxes[:, 0])/2, (bboxes[:, 1]+bboxes[:, 3])/2].astype(int)
+
+        self._draw_individual_bbox(positions, bboxes, color_name) # Draw head box
+        self._ops.add(DrawOps.CIRCLE, positions, gaze_points, color_name, len(self._layers)) # Draw gaze point
+        self._ops.add(DrawOps.LINE, positions, np.c_[centers, gaze_points], color_name, len(self._layers)) # Draw line from head center to gaze point
+        
+        if write_pattern: # Write Gaze Pattern
+            self._ops.add(DrawOps.TEXT, positions, np.c_[bboxes[:, 0]+5, bboxes[:, 3]+20], color_name, len(self._layers), 
+                          [str(pattern) for pattern in patterns])
+        
+        if (draw_pattern_illustr): # Draw based on the given gaze pattern
+            figs = {} # pattern -> illustration, read once for all frames
+            for pattern in patterns:
+                if not pattern.lower() in figs:
+                    figs[pattern.lower()] = cv2_safe_read('%s/%s_figure.png'%(illustr_path, pattern.lower()))
+            self._ops.add(DrawOps.ILLUSTR, positions, np.full((len(keys), 1), self.w), color_name, len(self._layers),
+                          [figs[pattern.lower()] for pattern in patterns])
     
     def load_emotion(self, emotion_dir):
         self.label_list = pd.read_csv(emotion_dir,sep=',',header=None).values
@@ -191,106 +330,150 @@ class Visualizer:
                 last_item = item
 
     def draw_emotion_curve(self,bar_height=90,font=cv2.FONT_HERSHEY_SIMPLEX,font_scale=0.5):
+        #draw curve
+        n_frames = len(self._frame_list.keys())
+        self._layers.append(partial(self._draw_emotion_frame, n_frames=n_frames, layer=len(self._layers), 
+                                    bar_height=bar_height, font=font, font_scale=font_scale))
+        if n_frames>0:
+            self.h += bar_height+10
+
+    def _draw_emotion_frame(self, img, frame_num:int, n_frames:int, layer:int, bar_height:int, font:int, font_scale:float):
         color_list=[(255,0,0),(255,165,0),(128,128,0),(0,255,0),(0,191,243),(0,0,255),(233,0,233)]
+        emotion_lists = [self.neutral_list, self.angry_list, self.disgust_list, self.fear_list, self.happy_list, self.sad_list, self.surprise_list]
+        i = frame_num-1
+
+        #curve param
+        curve_h = bar_height
+        curve_thick = 2
+
+        #padding
+        img = cv2.copyMakeBorder(img,0,curve_h+10,0,0,cv2.BORDER_CONSTANT,value=[255,255,255])
+        im_h = img.shape[0]
+        im_w = img.shape[1]
+
         #draw curve
-        for frame_num in self._frame_list.keys():
-            i = frame_num-1
-            img = self._frame_list[frame_num]
-
-            #curve param
-            curve_h = bar_height
-            curve_thick = 2
-
-            #padding
-            img = cv2.copyMakeBorder(img,0,curve_h+10,0,0,cv2.BORDER_CONSTANT,value=[255,255,255])
-            im_h = img.shape[0]
-            im_w = img.shape[1]
-            self.h = im_h
-            self.w = im_w
-
-            #draw curve
-            word_w = 140
-            space = (im_w-word_w)/len(self._frame_list.keys())
-
-            for j in range(i):
-                cv2.line(img,(int(j*space)+word_w,im_h-int(self.neutral_list[j]*curve_h)-5),(int((j+1)*space)+word_w,im_h-int(self.neutral_list[j+1]*curve_h)-5),color_list[0],curve_thick)
-                cv2.line(img,(int(j*space)+word_w,im_h-int(self.angry_list[j]*curve_h)-5),(int((j+1)*space)+word_w,im_h-int(self.angry_list[j+1]*curve_h)-5),color_list[1],curve_thick)
-                cv2.line(img,(int(j*space)+word_w,im_h-int(self.disgust_list[j]*curve_h)-5),(int((j+1)*space)+word_w,im_h-int(self.disgust_list[j+1]*curve_h)-5),color_list[2],curve_thick)
-                cv2.line(img,(int(j*space)+word_w,im_h-int(self.fear_list[j]*curve_h)-5),(int((j+1)*space)+word_w,im_h-int(self.fear_list[j+1]*curve_h)-5),color_list[3],curve_thick)
-                cv2.line(img,(int(j*space)+word_w,im_h-int(self.happy_list[j]*curve_h)-5),(int((j+1)*space)+word_w,im_h-int(self.happy_list[j+1]*curve_h)-5),color_list[4],curve_thick)
-                cv2.line(img,(int(j*space)+word_w,im_h-int(self.sad_list[j]*curve_h)-5),(int((j+1)*space)+word_w,im_h-int(self.sad_list[j+1]*curve_h)-5),color_list[5],curve_thick)
-                cv2.line(img,(int(j*space)+word_w,im_h-int(self.surprise_list[j]*curve_h)-5),(int((j+1)*space)+word_w,im_h-int(self.surprise_list[j+1]*curve_h)-5),color_list[6],curve_thick)
-            
-            #为了不让字出格子，使其逐渐往左偏移的宽度（像素数），最大70
-            all_num=len(self.neutral_list) #所有帧的数量
-            shift_wid = int(70.0*(frame_num-all_num*0.8)/(all_num*0.2)) if frame_num > all_num*0.8 else 0
-
-            cv2.putText(img,'neutral',(int((i)*space)+word_w-shift_wid,im_h-int(self.neutral_list[i]*curve_h)-5),font,font_scale,color_list[0],2)
-            cv2.putText(img,'angry',(int((i)*space)+word_w-shift_wid,im_h-int(self.angry_list[i]*curve_h)-5),font,font_scale,color_list[1],2)
-            cv2.putText(img,'disgust',(int((i)*space)+word_w-shift_wid,im_h-int(self.disgust_list[i]*curve_h)-5),font,font_scale,color_list[2],2)
-            cv2.putText(img,'fear',(int((i)*space)+word_w-shift_wid,im_h-int(self.fear_list[i]*curve_h)-5),font,font_scale,color_list[3],2)
-            cv2.putText(img,'happy',(int((i)*space)+word_w-shift_wid,im_h-int(self.happy_list[i]*curve_h)-5),font,font_scale,color_list[4],2)
-            cv2.putText(img,'sad',(int((i)*space)+word_w-shift_wid,im_h-int(self.sad_list[i]*curve_h)-5),font,font_scale,color_list[5],2)
-            cv2.putText(img,'surprise',(int((i)*space)+word_w-shift_wid,im_h-int(self.surprise_list[i]*curve_h)-5),font,font_scale,color_list[6],2)
-
-            cv2.putText(img,'Emotion',(30,im_h-int(curve_h/2)),font,font_scale,(0,0,0),2)
-            self._frame_list[frame_num] = img
+        word_w = 140
+        space = (im_w-word_w)/n_frames
+
+        def draw_segments(canvas, bottom, start, stop):
+            for j in range(start, stop):
+                for emotion_list, color in zip(emotion_lists, color_list):
+                    cv2.line(canvas,(int(j*space)+word_w,bottom-int(emotion_list[j]*curve_h)-5),(int((j+1)*space)+word_w,bottom-int(emotion_list[j+1]*curve_h)-5),color,curve_thick)
+        self._draw_timeline(img, (layer, im_w), curve_h+10, len(self.neutral_list)-1, i, space, word_w, 2*curve_thick+1, draw_segments)
+        
+        #为了不让字出格子，使其逐渐往左偏移的宽度（像素数），最大70
+        all_num=len(self.neutral_list) #所有帧的数量
+        shift_wid = int(70.0*(frame_num-all_num*0.8)/(all_num*0.2)) if frame_num > all_num*0.8 else 0
+
+        cv2.putText(img,'neutral',(int((i)*space)+word_w-shift_wid,im_h-int(self.neutral_list[i]*curve_h)-5),font,font_scale,color_list[0],2)
+        cv2.putText(img,'angry',(int((i)*space)+word_w-shift_wid,im_h-int(self.angry_list[i]*curve_h)-5),font,font_scale,color_list[1],2)
+        cv2.putText(img,'disgust',(int((i)*space)+word_w-shift_wid,im_h-int(self.disgust_list[i]*curve_h)-5),font,font_scale,color_list[2],2)
+        cv2.putText(img,'fear',(int((i)*space)+word_w-shift_wid,im_h-int(self.fear_list[i]*curve_h)-5),font,font_scale,color_list[3],2)
+        cv2.putText(img,'happy',(int((i)*space)+word_w-shift_wid,im_h-int(self.happy_list[i]*curve_h)-5),font,font_scale,color_list[4],2)
+        cv2.putText(img,'sad',(int((i)*space)+word_w-shift_wid,im_h-int(self.sad_list[i]*curve_h)-5),font,font_scale,color_list[5],2)
+        cv2.putText(img,'surprise',(int((i)*space)+word_w-shift_wid,im_h-int(self.surprise_list[i]*curve_h)-5),font,font_scale,color_list[6],2)
+
+        cv2.putText(img,'Emotion',(30,im_h-int(curve_h/2)),font,font_scale,(0,0,0),2)
+        return img
     
     def draw_focus_curve(self,bar_height=90,teacher_curve_color=(0,255,0),student_curve_color=(0,0,255),font=cv2.FONT_HERSHEY_SIMPLEX,font_scale=0.5):
         #draw curve
-        for frame_num in self._frame_list.keys():
-            i = frame_num-1
-            img = self._frame_list[frame_num]
-
-            #curve param
-            curve_h = bar_height
-            curve_thick = 2
-
-            #padding
-            img = cv2.copyMakeBorder(img,0,curve_h*2+10,0,0,cv2.BORDER_CONSTANT,value=[255,255,255])
-            im_h = img.shape[0]
-            im_w = img.shape[1]
-            self.h = im_h
-            self.w = im_w
-
-            #draw curve
-            word_w = 140
-            space = (im_w-word_w)/len(self._frame_list.keys())
-
-            for j in range(i):
+        n_frames = len(self._frame_list.keys())
+        self._layers.append(partial(self._draw_focus_frame, n_frames=n_frames, layer=len(self._layers), bar_height=bar_height, 
+                                    teacher_curve_color=teacher_curve_color, student_curve_color=student_curve_color, font=font, font_scale=font_scale))
+        if n_frames>0:
+            self.h += bar_height*2+10
+
+    def _draw_focus_frame(self, img, frame_num:int, n_frames:int, layer:int, bar_height:int, teacher_curve_color:tuple, student_curve_color:tuple, font:int, font_scale:float):
+        i = frame_num-1
+
+        #curve param
+        curve_h = bar_height
+        curve_thick = 2
+
+        #padding
+        img = cv2.copyMakeBorder(img,0,curve_h*2+10,0,0,cv2.BORDER_CONSTANT,value=[255,255,255])
+        im_h = img.shape[0]
+        im_w = img.shape[1]
+
+        #draw curve
+        word_w = 140
+        space = (im_w-word_w)/n_frames
+
+        def draw_segments(canvas, bottom, start, stop):
+            for j in range(start, stop):
                 #mark if the student is looking at the camera
                 if self.prob_list_student[j]>0.5 and self.prob_list_student[j+1]>0.5:
-                    cv2.fillConvexPoly(img,
-                    np.array([[int(j*space)+word_w,im_h-curve_h-5],[int(j*space)+word_w,im_h-5],[int((j+1)*space)+word_w,im_h-5],[int((j+1)*space)+word_w,im_h-curve_h-5]]),
+                    cv2.fillConvexPoly(canvas,
+                    np.array([[int(j*space)+word_w,bottom-curve_h-5],[int(j*space)+word_w,bottom-5],[int((j+1)*space)+word_w,bottom-5],[int((j+1)*space)+word_w,bottom-curve_h-5]]),
                     (200,200,255))
 
                 #student curve
                 if self.prob_list_student[j]>0 and self.prob_list_student[j+1]>0:
-                    cv2.line(img,(int(j*space)+word_w,im_h-int(self.prob_list_student[j]*curve_h)-5),(int((j+1)*space)+word_w,im_h-int(self.prob_list_student[j+1]*curve_h)-5),student_curve_color,curve_thick)
+                    cv2.line(canvas,(int(j*space)+word_w,bottom-int(self.prob_list_student[j]*curve_h)-5),(int((j+1)*space)+word_w,bottom-int(self.prob_list_student[j+1]*curve_h)-5),student_curve_color,curve_thick)
 
                 #mark if the teacher is looking at the camera
                 if self.prob_list_teacher[j]>0.5 and self.prob_list_teacher[j+1]>0.5:
-                    cv2.fillConvexPoly(img,
-                    np.array([[int(j*space)+word_w,im_h-curve_h*2-10],[int(j*space)+word_w,im_h-curve_h-10],[int((j+1)*space)+word_w,im_h-curve_h-10],[int((j+1)*space)+word_w,im_h-curve_h*2-10]]),
+                    cv2.fillConvexPoly(canvas,
+                    np.array([[int(j*space)+word_w,bottom-curve_h*2-10],[int(j*space)+word_w,bottom-curve_h-10],[int((j+1)*space)+word_w,bottom-curve_h-10],[int((j+1)*space)+word_w,bottom-curve_h*2-10]]),
                     (200,255,200))
 
                 #teacher curve
                 if self.prob_list_teacher[j]>0 and self.prob_list_teacher[j+1]>0:
-                    cv2.line(img,(int(j*space)+word_w,im_h-int(self.prob_list_teacher[j]*curve_h)-curve_h-10),(int((j+1)*space)+word_w,im_h-int(self.prob_list_teacher[j+1]*curve_h)-curve_h-10),teacher_curve_color,curve_thick)
+                    cv2.line(canvas,(int(j*space)+word_w,bottom-int(self.prob_list_teacher[j]*curve_h)-curve_h-10),(int((j+1)*space)+word_w,bottom-int(self.prob_list_teacher[j+1]*curve_h)-curve_h-10),teacher_curve_color,curve_thick)
+        self._draw_timeline(img, (layer, im_w), curve_h*2+10, min(len(self.prob_list_student), len(self.prob_list_teacher))-1, 
+                            i, space, word_w, 2*curve_thick+1, draw_segments)
+
+        #the probability=0.5 line
+        cv2.line(img,(word_w,im_h-int(curve_h/2)),(int(i*space)+word_w,im_h-int(curve_h/2)),student_curve_color,1)
+        cv2.line(img,(word_w,im_h-int(curve_h/2)-curve_h-5),(int(i*space)+word_w,im_h-int(curve_h/2)-curve_h-5),teacher_curve_color,1)
 
-            #the probability=0.5 line
-            cv2.line(img,(word_w,im_h-int(curve_h/2)),(int(i*space)+word_w,im_h-int(curve_h/2)),student_curve_color,1)
-            cv2.line(img,(word_w,im_h-int(curve_h/2)-curve_h-5),(int(i*space)+word_w,im_h-int(curve_h/2)-curve_h-5),teacher_curve_color,1)
+        #text
+        cv2.putText(img,'probability=0.5',(word_w,im_h-int(curve_h/2)-15),font,font_scale,student_curve_color,1)
+        cv2.putText(img,'probability=0.5',(word_w,im_h-int(curve_h/2)-curve_h-15),font,font_scale,teacher_curve_color,1)
+        cv2.putText(img,'teacher looking',(0,im_h-int(curve_h/2)-curve_h-15),font,font_scale,teacher_curve_color,2)
+        cv2.putText(img,'at the camera',(0,im_h-int(curve_h/2)-curve_h+15),font,font_scale,teacher_curve_color,2)
+        cv2.putText(img,'student looking',(0,im_h-int(curve_h/2)-15),font,font_scale,student_curve_color,2)
+        cv2.putText(img,'at the camera',(0,im_h-int(curve_h/2)+15),font,font_scale,student_curve_color,2)
 
-            #text
-            cv2.putText(img,'probability=0.5',(word_w,im_h-int(curve_h/2)-15),font,font_scale,student_curve_color,1)
-            cv2.putText(img,'probability=0.5',(word_w,im_h-int(curve_h/2)-curve_h-15),font,font_scale,teacher_curve_color,1)
-            cv2.putText(img,'teacher looking',(0,im_h-int(curve_h/2)-curve_h-15),font,font_scale,teacher_curve_color,2)
-            cv2.putText(img,'at the camera',(0,im_h-int(curve_h/2)-curve_h+15),font,font_scale,teacher_curve_color,2)
-            cv2.putText(img,'student looking',(0,im_h-int(curve_h/2)-15),font,font_scale,student_curve_color,2)
-            cv2.putText(img,'at the camera',(0,im_h-int(curve_h/2)+15),font,font_scale,student_curve_color,2)
+        return img
 
-            self._frame_list[frame_num] = img
+    def _draw_timeline(self, img, key:tuple, pad_h:int, n_segments:int, i:int, space:float, word_w:int, margin:int, draw_segments):
+        """
+        draw segments 0 ... i-1 of a timeline in the bottom pad_h rows of img (white padding).
+        All segments are drawn once on a full-length strip, a frame copies the columns left of segment i from it,
+        and only draws the few segments that reach these columns again. Per frame cost does not grow with the length of the video.
+        Thick lines at the top of the padding reach over it, into the rows above: the strip has margin more rows on top,
+        and only the pixels drawn in these rows are copied.
+        @key: the strip of the timeline to use (the layer and the width of frames)
+        @margin: the number of pixels a segment may reach over its ends
+        @draw_segments: function(canvas, bottom, start, stop) drawing segments start ... stop-1 with bottom as the bottom row
+        """
+        with self._timeline_lock:
+            if not key in self._timelines:
+                strip = np.full((pad_h+margin, img.shape[1], img.shape[2]), 255, dtype=img.dtype)
+                draw_segments(strip, pad_h+margin, 0, n_segments)
+                # the drawn pixels of the rows above the padding are the ones drawn the same on a black strip
+                black = np.zeros((pad_h+margin, img.shape[1], img.shape[2]), dtype=img.dtype)
+                draw_segments(black, pad_h+margin, 0, n_segments)
+                drawn = np.all(strip[:margin]==black[:margin], axis=2)
+                self._timelines[key] = (strip, drawn)
+        strip, drawn = self._timelines[key]
+
+        stop = min(i, n_segments)
+        if stop<=0:
+            return
+        # segments from i on do not reach the columns left of the cut
+        cut = max(0, int(stop*space)+word_w-margin)
+        img[-pad_h:, :cut] = strip[margin:, :cut]
+        above = min(margin, img.shape[0]-pad_h)
+        if above>0:
+            rows = slice(img.shape[0]-pad_h-above, img.shape[0]-pad_h)
+            np.copyto(img[rows, :cut], strip[margin-above:margin, :cut], where=drawn[margin-above:, :cut, None])
+        # segments reaching the cut are drawn again on the frame, in their order
+        segment_ends = (np.arange(1, stop+1)*space).astype(int)+word_w
+        start = int(np.searchsorted(segment_ends+margin, cut, side='left'))
+        draw_segments(img, img.shape[0], start, stop)
     
     def _dict2list(self,in_dict):
         out_list = []
@@ -311,17 +494,68 @@ class Visualizer:
             prob_dict = json.load(f)
         self.prob_list_teacher = self._dict2list(prob_dict)
 
-    def generate_output_vid(self, output_vid_path:str, fps = 30):
+    def generate_output_vid(self, output_vid_path:str, fps = 30, variants=None):
         """
-        generate output video
+        generate output video, all recorded draw operations are drawn on each frame here
         @output_vid_path: path to output video
+        @variants: more videos drawn from the same decoded frames, dictionary[output_vid_path] = style,
+                   style is a dictionary that overrides any of 'color_dict', 'line_thickness', 'circle_thickness', 'font_size'
+        """
+        styles = {output_vid_path: {}}
+        styles.update(variants if variants else {})
+        outs = {path: cv2.VideoWriter(path, self.fourcc, fps, (self.w, self.h)) for path in styles.keys()}
+        ops, offsets = self._ops.by_frame(len(self._frame_list))
+
+        def draw(item, frame):
+            pos, img_path = item
+            return [self._render(frame.copy(), img_path, ops[offsets[pos]:offsets[pos+1]], style) for style in styles.values()]
+
+        def write(item, frames):
+            for out, frame in zip(outs.values(), frames):
+                # output to video
+                out.write(frame) 
+
+        # Frames are read and drawn by threads, and written in order
+        num_decoders = self.num_decoders if self._parallel_reads else 1
+        pipeline = RenderPipeline(lambda item: self._read_frame(item[1]), draw, write, num_decoders, self.num_drawers)
+        self.render_stats = pipeline.run(enumerate(self._frame_list.keys()))
+        for out in outs.values():
+            out.release()
+
+    def _render(self, frame, img_path, ops:np.ndarray, style:dict):
         """
-        out = cv2.VideoWriter(output_vid_path, self.fourcc, fps, (self.w, self.h))
-        for img_path in self._frame_list.keys():
-            frame = self._frame_list[img_path] 
-            # output to video
-            out.write(frame) 
-        out.release()
+        draw the operations of a frame (rows of DrawOps) and the timelines on the frame
+        """
+        color_dict = style.get('color_dict', self.color_dict)
+        line_thickness = style.get('line_thickness', self.line_thickness)
+        circle_thickness = style.get('circle_thickness', self.circle_thickness)
+        font_size = style.get('font_size', self.font_size)
+        layer = 0
+        for pos, op_layer, kind, x1, y1, x2, y2, color, arg in ops.tolist():
+            while layer<op_layer:
+                frame = self._layers[layer](frame, frame_num=img_path)
+                layer += 1
+            color = color_dict[self._ops.colors[color]]
+            if kind==DrawOps.RECT:
+                frame = cv2.rectangle(frame, (x1,y1), (x2, y2), color, line_thickness)
+            elif kind==DrawOps.CIRCLE:
+                frame = cv2.circle(frame, (x1, y1), circle_thickness, color, -1)
+            elif kind==DrawOps.LINE:
+                frame = cv2.line(frame, (x1, y1), (x2, y2), color, line_thickness)
+            elif kind==DrawOps.TEXT:
+                frame = cv2.putText(frame, self._ops.args[arg], (x1, y1), self.font, font_size, color, line_thickness)
+            elif kind==DrawOps.ILLUSTR:
+                fig = self._ops.args[arg]
+                fig_h, fig_w, _ = fig.shape
+                frame[:fig_h, -fig_w:, :] = fig
+                frame = cv2.rectangle(frame, (x1-fig_w, 0), (x1, fig_h), color, line_thickness)
+        while layer<len(self._layers):
+            frame = self._layers[layer](frame, frame_num=img_path)
+            layer += 1
+        return frame
 
     def empty_frames(self):
-        self._frame_list = {}
\ No newline at end of file
+        self._frame_list = {}
+        self._ops = DrawOps()
+        self._layers = []
+        self._timelines = {}
\ No newline at end of file
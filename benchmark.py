@@ -0,0 +1,354 @@
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import cv2
+
+try:
+    import resource
+except ImportError:
+    resource = None # not on Windows, peak RSS is then read by psutil if it is installed
+
+from tests.helpers import make_detections, make_frames, make_cvat, HeadTruth, ScriptedPopupReviewer
+
+RESULT_VERSION = 1
+
+def peak_rss_mb():
+    '''
+    Get the peak resident memory (in MB) of the current process, None if it can not be measured
+    '''
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS, in KB elsewhere
+        return peak/2**20 if sys.platform=='darwin' else peak/2**10
+    try:
+        import psutil
+        return psutil.Process().memory_info().peak_wset/2**20
+    except (ImportError, AttributeError):
+        return None
+
+def latency_stats(seconds:list):
+    '''
+    Summarize latencies (in seconds) as count, mean, p50, p95 and max in milliseconds
+    '''
+    if len(seconds)==0:
+        return {'count': 0}
+    ms = np.asarray(seconds)*1000
+    return {'count': len(ms), 'mean_ms': float(ms.mean()), 'p50_ms': float(np.percentile(ms, 50)),
+            'p95_ms': float(np.percentile(ms, 95)), 'max_ms': float(ms.max())}
+
+########################################################################################################
+# Benchmarks, each run in a process of its own so that its peak RSS is its own
+
+def bench_tracker(work_dir:str, mode='all', n_frames=1000, heads_per_frame=8, n_people=4, jitter=0.004, occlusion=0.01,
+                  speed=None, motion_model=None, grid_size=None, resolution=(1280, 720), review_lookahead=0, seed=0):
+    '''
+    Track n_people of the synthetic heads with PersonTracker, answered by a ScriptedPopupReviewer
+
+    Args:
+    mode:           'all' for track_all, 'person' for track_person on every person in turn
+    motion_model:   the motion model of PersonTracker (None, 'velocity' or 'kalman')
+    grid_size:      the grid of the spatial index of PersonTracker (None for no index)
+    '''
+    from detections import load_detections
+    from PersonTracker import PersonTracker
+    from telemetry import Telemetry
+
+    frame_dir = os.path.join(work_dir, 'frames_%dx%d_%d'%(resolution+(n_frames,)))
+    if not os.path.isdir(frame_dir):
+        make_frames(frame_dir, n_frames, *resolution, seed=seed)
+    detection_file = os.path.join(work_dir, 'raw_detections_%d.txt'%seed)
+    heads = make_detections(detection_file, n_frames, heads_per_frame, jitter, occlusion, speed=speed, seed=seed)
+    raw = np.loadtxt(detection_file, delimiter=',', ndmin=2)
+    truth = HeadTruth(raw[:, 0].astype(int), raw[:, 2], heads)
+
+    stages = {}
+    start = time.time()
+    load_detections(detection_file)
+    stages['load_detections_cold_seconds'] = time.time()-start
+    start = time.time()
+    load_detections(detection_file)
+    stages['load_detections_cached_seconds'] = time.time()-start
+
+    tracker = PersonTracker(review_lookahead=review_lookahead, telemetry=Telemetry(), motion_model=motion_model,
+                            grid_size=grid_size)
+    reviewer = ScriptedPopupReviewer(truth)
+    tracker.set_reviewer(reviewer)
+    start = time.time()
+    tracker.load_from_files(detection_file, frame_dir)
+    stages['load_seconds'] = time.time()-start
+
+    personIDs = ['h%d'%k for k in range(n_people)]
+    start = time.time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if mode=='all':
+            tracker.track_all(personIDs=personIDs)
+        else:
+            for personID in personIDs:
+                tracker.track_person(personID)
+    stages['track_seconds'] = time.time()-start
+
+    # the fraction of tracked (not interpolated) boxes given to the right person
+    correct, total = 0, 0
+    for personID in tracker.get_tracked_person():
+        for frameID, xmin in tracker.get_person_df(personID)[['frameID', 'xmin']].itertuples(index=False):
+            head = truth.head(frameID, xmin)
+            if head is not None:
+                total += 1
+                correct += head==int(personID[1:])
+    tracked_people = len(tracker.get_tracked_person())
+    tracker_stats = tracker.get_stats()
+    tracker.release()
+    return {
+        'fps': n_frames/stages['track_seconds'],
+        'stages': stages,
+        'review_image': latency_stats(reviewer.image_seconds),
+        'requests': reviewer.requests,
+        'resets': tracker_stats['review']['resets'],
+        'popups': tracker_stats['review']['popups'],
+        'windows': len(reviewer.image_seconds),
+        'tracked_people': tracked_people,
+        'accuracy': correct/total if total else None,
+        'tracker': tracker_stats,
+    }
+
+def bench_visualizer(work_dir:str, resolution=(1920, 1080), n_frames=300, compression=0.5, stream=True, seed=0):
+    '''
+    Load, draw and render synthetic frames with Visualizer, then with utils.visualize
+    '''
+    from Visualizer import Visualizer
+    from utils import visualize
+
+    frame_dir = os.path.join(work_dir, 'frames_%dx%d_%d'%(resolution+(n_frames,)))
+    if not os.path.isdir(frame_dir):
+        make_frames(frame_dir, n_frames, *resolution, seed=seed)
+    # a teacher (head 0) looking at a student (head 1), and the other way round
+    detection_file = os.path.join(work_dir, 'raw_detections_vis_%d.txt'%seed)
+    heads = make_detections(detection_file, n_frames, 2, occlusion=0.0, seed=seed)
+    raw = np.loadtxt(detection_file, delimiter=',', ndmin=2)
+    teacher, student = raw[heads==0], raw[heads==1]
+    centers = lambda rows: np.c_[(rows[:, 2]+rows[:, 4])/2, (rows[:, 3]+rows[:, 5])/2]
+
+    stages = {}
+    visualizer = Visualizer()
+    start = time.time()
+    visualizer.load_frames_from_dir(frame_dir, compression, stream)
+    stages['load_seconds'] = time.time()-start
+    # keys of frames loaded from a directory are their positions
+    start = time.time()
+    visualizer.draw_bboxes({int(row[0])-1: row[2:].tolist() for row in teacher}, 'teacher', write_id=True)
+    visualizer.draw_gaze_general({int(row[0])-1: row[2:].tolist()+gaze.tolist()+['joint attention']
+                                  for row, gaze in zip(student, centers(teacher))}, 'student', write_pattern=True)
+    stages['draw_seconds'] = time.time()-start
+    start = time.time()
+    visualizer.generate_output_vid(os.path.join(work_dir, 'visualizer.mp4'))
+    stages['render_seconds'] = time.time()-start
+
+    annotation_file = os.path.join(work_dir, 'annotations_vis_%d.csv'%seed)
+    df = pd.DataFrame(np.r_[teacher, student][:, [0, 2, 3, 4, 5]], columns=['frameID', 'xmin', 'ymin', 'xmax', 'ymax'])
+    df['frameID'] = df['frameID'].astype(int)
+    df['personID'] = ['teacher']*len(teacher)+['student']*len(student)
+    df[['gaze_x', 'gaze_y']] = np.r_[centers(student), centers(teacher)]
+    df['pattern'] = ''
+    df.to_csv(annotation_file, index=False)
+    start = time.time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        visualize_stats = visualize(os.path.join(work_dir, 'visualize.mp4'), frame_dir, annotation_file,
+                                    gaze_heatmaps=False, compression=compression)
+    stages['visualize_seconds'] = time.time()-start
+    return {
+        'fps': visualizer.render_stats['fps'],
+        'stages': stages,
+        'render': visualizer.render_stats,
+        'visualize': visualize_stats,
+    }
+
+def bench_cvat(work_dir:str, n_tasks=3, n_tracks=8, n_frames=1000, seed=0):
+    '''
+    Convert a synthetic CVAT export with cvat2dict and cvat2columns
+    '''
+    from cvat_utils import cvat2dict, cvat2columns
+
+    cvat_file = os.path.join(work_dir, 'cvat_%d_%d_%d.xml'%(n_tasks, n_tracks, n_frames))
+    make_cvat(cvat_file, n_tasks, n_tracks, n_frames, seed=seed)
+    size_mb = os.path.getsize(cvat_file)/2**20
+
+    stages = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.time()
+        cvat2dict(cvat_file)
+        stages['cvat2dict_seconds'] = time.time()-start
+        start = time.time()
+        df = cvat2columns(cvat_file)
+        stages['cvat2columns_seconds'] = time.time()-start
+    return {
+        'fps': n_tasks*n_frames/stages['cvat2dict_seconds'],
+        'stages': stages,
+        'xml_mb': size_mb,
+        'annotations': len(df),
+        'cvat2dict_mb_per_second': size_mb/stages['cvat2dict_seconds'],
+        'cvat2columns_mb_per_second': size_mb/stages['cvat2columns_seconds'],
+    }
+
+def bench_candidates(work_dir:str, heads_per_frame=32, n_frames=1000, n_people=4, grid_size=None, jitter=0.004, occlusion=0.01, seed=0):
+    '''
+    Score the candidates of n_people anchors at every frame (the heads of the frame before) as PersonTracker does,
+    with the candidates looked up in the spatial index of the detections (or all free boxes of the frame if grid_size is None)
+    '''
+    from detections import load_detections
+
+    detection_file = os.path.join(work_dir, 'raw_detections_%d_%d.txt'%(heads_per_frame, seed))
+    make_detections(detection_file, n_frames, heads_per_frame, jitter, occlusion, seed=seed)
+    detections = load_detections(detection_file, use_cache=False)
+    stages = {}
+    start = time.time()
+    if grid_size:
+        detections.build_index(grid_size)
+    stages['index_seconds'] = time.time()-start
+
+    queries, candidates, found = 0, 0, 0
+    start = time.time()
+    for f in range(2, n_frames+1):
+        for anchor in detections.frame_boxes(f-1)[:n_people].tolist():
+            idxes = detections.free_idxes_near(f, [anchor])
+            boxes = detections.boxes[idxes]
+            # the intersection over the anchor, sorted, as PersonTracker scores candidates
+            intersection = np.maximum(0, np.minimum(boxes[:, 2], anchor[2])-np.maximum(boxes[:, 0], anchor[0])) \
+                         * np.maximum(0, np.minimum(boxes[:, 3], anchor[3])-np.maximum(boxes[:, 1], anchor[1]))
+            overlaps = intersection/((anchor[2]-anchor[0])*(anchor[3]-anchor[1]))
+            sorted_idxes = np.argsort(overlaps, kind='stable')
+            queries += 1
+            candidates += len(idxes)
+            found += int(len(idxes)>0 and overlaps[sorted_idxes[-1]]>0.2)
+    stages['score_seconds'] = time.time()-start
+    return {
+        'fps': n_frames/stages['score_seconds'],
+        'stages': stages,
+        'queries': queries,
+        'score_us_per_query': stages['score_seconds']/max(queries, 1)*1e6,
+        'candidates_per_query': candidates/max(queries, 1),
+        'found': found, # queries with a candidate above overlap_lower, the same with or without the index
+    }
+
+BENCHMARKS = {'tracker': bench_tracker, 'visualizer': bench_visualizer, 'cvat': bench_cvat, 'candidates': bench_candidates}
+
+def _run(name:str, params:dict):
+    result = BENCHMARKS[name](**params)
+    result['peak_rss_mb'] = peak_rss_mb()
+    return result
+
+def run_benchmark(name:str, **params):
+    '''
+    Run a benchmark of BENCHMARKS in a new process, so that the peak RSS is measured on the benchmark alone
+
+    Returns:
+    result (dict): the name and parameters of the benchmark, with frames per second (fps), seconds of each stage and peak RSS (in MB)
+    '''
+    start = time.time()
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        result = pool.submit(_run, name, params).result()
+    result['wall_seconds'] = time.time()-start
+    return dict({'benchmark': name, 'params': params}, **result)
+
+def run_suite(work_dir:str, n_frames=1000, heads_per_frame=8, n_people=4, jitter=0.004, occlusion=0.01,
+              fast_speed=0.02, motion_models=(None, 'velocity', 'kalman'), crowd_sizes=(8, 32, 128, 512, 2048),
+              resolutions=((640, 360), (1280, 720), (1920, 1080)), n_vis_frames=300, cvat_tasks=(1, 4, 16), cvat_tracks=8, seed=0):
+    '''
+    Run all benchmarks on synthetic workloads written in work_dir
+
+    Args:
+    n_frames, heads_per_frame, jitter, occlusion:   the detections of the tracker benchmarks (see make_detections),
+                                                    n_frames is also the length of the CVAT tasks
+    n_people:                                       the number of heads tracked
+    fast_speed, motion_models:                      track_all is also run on heads drifting at fast_speed (see make_detections),
+                                                    with each of the motion models, to compare their anchor resets and pop-ups
+    crowd_sizes:                                    heads per frame of the candidate scoring benchmarks, with and without the spatial index
+    resolutions:                                    the frame sizes (w, h) of the visualizer benchmarks, of n_vis_frames frames each
+    cvat_tasks, cvat_tracks:                        the numbers of tasks of the CVAT benchmarks, with cvat_tracks head and gaze tracks per task
+
+    Returns:
+    report (dict): the environment and commit of the run, and the results of run_benchmark
+    '''
+    tracker_params = dict(n_frames=n_frames, heads_per_frame=heads_per_frame, n_people=n_people, jitter=jitter, occlusion=occlusion, seed=seed)
+    runs = [('tracker', dict(tracker_params, mode=mode)) for mode in ['all', 'person']]
+    runs += [('tracker', dict(tracker_params, mode='all', speed=fast_speed, motion_model=motion_model)) for motion_model in motion_models]
+    runs += [('candidates', dict(heads_per_frame=heads, n_frames=n_frames, n_people=n_people, grid_size=grid_size, seed=seed))
+             for heads in crowd_sizes for grid_size in [None, 16]]
+    runs += [('visualizer', dict(resolution=tuple(resolution), n_frames=n_vis_frames, seed=seed)) for resolution in resolutions]
+    runs += [('cvat', dict(n_tasks=n_tasks, n_tracks=cvat_tracks, n_frames=n_frames, seed=seed)) for n_tasks in cvat_tasks]
+
+    results = []
+    for name, params in runs:
+        print("Running %s %s"%(name, params))
+        result = run_benchmark(name, work_dir=work_dir, **params)
+        del result['params']['work_dir']
+        print("  %.1f fps, %.1fs, peak RSS %s MB"%(result['fps'], result['wall_seconds'],
+                                                  '?' if result['peak_rss_mb'] is None else '%.0f'%result['peak_rss_mb']))
+        if name=='tracker':
+            print("  %d anchor resets, %d pop-ups, accuracy %.3f"%(result['resets'], result['popups'], result['accuracy'] or 0))
+        elif name=='candidates':
+            print("  %.1f us per query, %.1f candidates per query"%(result['score_us_per_query'], result['candidates_per_query']))
+        results.append(result)
+    return {'version': RESULT_VERSION, 'environment': environment(), 'results': results}
+
+def environment():
+    '''
+    Get the commit (with a '+' if the tree has uncommitted changes) and the machine of the run
+    '''
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=repo_dir, capture_output=True, text=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=repo_dir, capture_output=True, text=True).stdout.strip()
+        commit = (commit+'+' if dirty else commit) or None
+    except OSError:
+        commit = None
+    return {'commit': commit, 'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+            'platform': platform.platform(), 'cpus': os.cpu_count(), 'numpy': np.__version__, 'opencv': cv2.__version__}
+
+if __name__=='__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the tracker, the visualizer and the CVAT converter on synthetic workloads')
+    parser.add_argument('--output', default=None, help='the JSON report to write (printed if not given)')
+    parser.add_argument('--work-dir', default=None, help='where to write the workloads (a temporary directory, removed at the end, if not given)')
+    parser.add_argument('--quick', action='store_true', help='small workloads (200 frames, 60 frames per resolution, 1 and 3 CVAT tasks), to check the suite runs')
+    parser.add_argument('--frames', type=int, default=1000, help='the number of frames of the tracker and CVAT workloads')
+    parser.add_argument('--heads', type=int, default=8, help='heads per frame')
+    parser.add_argument('--people', type=int, default=4, help='the number of heads tracked')
+    parser.add_argument('--jitter', type=float, default=0.004, help='the standard deviation of the per-frame movement of heads (0-1 scale)')
+    parser.add_argument('--occlusion', type=float, default=0.01, help='the probability that a head gets occluded at a frame')
+    parser.add_argument('--fast-speed', type=float, default=0.02, help='the drift of heads (0-1 scale per frame) of the motion model comparison')
+    parser.add_argument('--motion-models', nargs='*', default=['none', 'velocity', 'kalman'], help="the motion models to compare ('none' for no model)")
+    parser.add_argument('--crowds', type=int, nargs='*', default=[8, 32, 128, 512, 2048], help='heads per frame of the candidate scoring benchmarks')
+    parser.add_argument('--resolutions', nargs='*', default=['640x360', '1280x720', '1920x1080'], help='frame sizes of the visualizer benchmarks, as WxH')
+    parser.add_argument('--vis-frames', type=int, default=300, help='the number of frames of the visualizer workloads')
+    parser.add_argument('--cvat-tasks', type=int, nargs='*', default=[1, 4, 16], help='the numbers of tasks of the CVAT exports')
+    parser.add_argument('--cvat-tracks', type=int, default=8, help='head (and gaze) tracks per CVAT task')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    work_dir = args.work_dir if args.work_dir else tempfile.mkdtemp(prefix='benchmark_')
+    os.makedirs(work_dir, exist_ok=True)
+    try:
+        if args.quick:
+            args.frames, args.vis_frames, args.cvat_tasks = 200, 60, [1, 3]
+        motion_models = [None if motion_model=='none' else motion_model for motion_model in args.motion_models]
+        report = run_suite(work_dir, args.frames, args.heads, args.people, args.jitter, args.occlusion, args.fast_speed, motion_models, args.crowds,
+                           [tuple(map(int, r.split('x'))) for r in args.resolutions], args.vis_frames, args.cvat_tasks, args.cvat_tracks, args.seed)
+    finally:
+        if args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
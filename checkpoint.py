@@ -0,0 +1,217 @@
+import os
+import json
+
+import numpy as np
+
+from review import ReviewQueue, ReviewDecision
+from interpolation import IntervalSet
+
+CHECKPOINT_VERSION = 2
+
+class SessionCheckpoint:
+    def __init__(self, checkpoint_dir:str):
+        '''
+        Keep a tracking session on disk, so that it can be resumed after a crash.
+        The session is a sequence of runs (calls of track_person or track_all). The checkpoint is
+        snapshot.npz:   the state before the last run (tracked heads before interpolation, dropped frames, claimed detections, completed runs),
+                        written when a run starts, which compacts the journal
+        finished.npz:   the state after the last run, written when it finishes (before its end is journaled)
+        journal.jsonl:  an append-only journal of the last run, its decisions (synced to disk one by one) and its end
+        A resumed session restores the state after the last run if it is finished; otherwise it restores the state before it,
+        and replays the decisions of the journal without asking the reviewer, which brings the tracking back to the frame
+        and anchors of the last decision.
+
+        Args:
+        checkpoint_dir: the directory of the checkpoint (created if it does not exist)
+        '''
+        self.checkpoint_dir = checkpoint_dir
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        self.snapshot_path = os.path.join(checkpoint_dir, 'snapshot.npz')
+        self.finished_path = os.path.join(checkpoint_dir, 'finished.npz')
+        self.journal_path = os.path.join(checkpoint_dir, 'journal.jsonl')
+        self._journal = None
+
+    def load_snapshot(self):
+        '''
+        Returns:
+        state (dict): the state after the last run if it is finished, else before it (as saved by save_snapshot);
+                      None if there is no snapshot
+        '''
+        run = self.load_journal()
+        if run is not None and run['done']:
+            state = self.__load(self.finished_path)
+            # written by the last run (and not by a run before it)
+            if state is not None and len(state['completed_runs'])==run['run']+1:
+                return state
+        return self.__load(self.snapshot_path)
+
+    def __load(self, path:str):
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as arrays:
+            meta = json.loads(str(arrays['meta']))
+            if meta['version']!=CHECKPOINT_VERSION:
+                print("[WARNING] The checkpoint %s is of another version, it is not restored."%self.checkpoint_dir)
+                return None
+            state = {'owners': arrays['owners'], 'owner_ids': meta['owner_ids'], 'num_detections': meta['num_detections'],
+                     'completed_runs': meta['completed_runs'], 'dropped_frames': meta['dropped_frames'], 'raw_tracks': {}}
+            bounds = np.cumsum([0]+[track['n'] for track in meta['tracks']])
+            for k, track in enumerate(meta['tracks']):
+                state['raw_tracks'].setdefault(track['personID'], []).append({
+                    'frame_ids': arrays['raw_frameID'][bounds[k]:bounds[k+1]], 'boxes': arrays['raw_boxes'][bounds[k]:bounds[k+1]],
+                    'start_frame': track['start_frame'], 'end_frame': track['end_frame'], 'skipped': IntervalSet(track['skipped'])})
+        return state
+
+    def save_snapshot(self, state:dict, finished=False):
+        '''
+        Save the state of a session (as from load_snapshot), written through a temporary file and an atomic rename
+
+        Args:
+        finished:   whether it is the state after the last run (see finish_run), or before it
+        '''
+        tracks = [(personID, track) for personID, raw_tracks in state['raw_tracks'].items() for track in raw_tracks]
+        meta = {'version': CHECKPOINT_VERSION, 'owner_ids': state['owner_ids'], 'num_detections': state['num_detections'],
+                'completed_runs': state['completed_runs'], 'dropped_frames': state['dropped_frames'],
+                'tracks': [{'personID': personID, 'n': len(track['frame_ids']), 'start_frame': int(track['start_frame']),
+                            'end_frame': int(track['end_frame']), 'skipped': track['skipped'].to_list()} for personID, track in tracks]}
+        arrays = {'meta': np.array(json.dumps(meta)), 'owners': np.asarray(state['owners'])}
+        arrays['raw_frameID'] = np.concatenate([np.asarray(track['frame_ids'], dtype=np.int64) for _, track in tracks]+[np.zeros(0, np.int64)])
+        arrays['raw_boxes'] = np.concatenate([np.asarray(track['boxes'], dtype=float).reshape(-1, 4) for _, track in tracks]+[np.zeros((0, 4))])
+        path = self.finished_path if finished else self.snapshot_path
+        tmp_path = path+'.tmp.npz'
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    def load_journal(self):
+        '''
+        Returns:
+        run (dict): the last run of the journal, with 'run' (its position in the session), 'key' (see start_run),
+                    'decisions' (dictionaries of record) and 'done'; None if the journal is empty
+        '''
+        if not os.path.exists(self.journal_path):
+            return None
+        run = None
+        with open(self.journal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break # the last line was cut by a crash
+                if entry['event']=='run':
+                    run = {'run': entry['run'], 'key': entry['key'], 'decisions': [], 'done': False}
+                elif run is not None and entry['event']=='decision':
+                    run['decisions'].append(entry)
+                elif run is not None and entry['event']=='done':
+                    run['done'] = True
+        return run
+
+    def start_run(self, run:int, key:list):
+        '''
+        Start the journal of a new run (the decisions of the run before are dropped, they are in the snapshot)
+
+        Args:
+        run:    the position of the run in the session
+        key:    what the run does, [mode, personIDs, start_frame, end_frame]
+        '''
+        self.__rewrite([{'event': 'run', 'run': run, 'key': key}])
+        self._journal = open(self.journal_path, 'a', encoding='utf-8')
+
+    def continue_run(self):
+        '''
+        Append to the journal of the last run (after it is replayed)
+        '''
+        self.rewind(0) # a line cut by a crash is dropped before appending
+        self._journal = open(self.journal_path, 'a', encoding='utf-8')
+
+    def record(self, request, decision:ReviewDecision):
+        '''
+        Append a decision to the journal, synced to disk before returning
+        '''
+        self.__append({'event': 'decision', 'stage': request.stage, 'personID': request.personID, 'frameID': int(request.frameID),
+                       'candidates': len(request.candidates), 'action': decision.action, 'index': decision.index})
+
+    def finish_run(self, state:dict):
+        '''
+        End the journal of the last run, with the state of the session after it (see save_snapshot)
+        '''
+        self.save_snapshot(state, finished=True)
+        self.__append({'event': 'done'})
+        self._journal.close()
+        self._journal = None
+
+    def rewind(self, n=1):
+        '''
+        Drop the last n decisions of the journal (e.g. a mis-clicked 'Terminate and Drop'), they are asked again when the run is resumed
+
+        Returns:
+        run (dict): the last run of the journal after rewinding, see load_journal
+        '''
+        run = self.load_journal()
+        if run is None:
+            return None
+        n = min(n, len(run['decisions']))
+        run['decisions'] = run['decisions'][:len(run['decisions'])-n]
+        run['done'] = run['done'] and n==0
+        entries = [{'event': 'run', 'run': run['run'], 'key': run['key']}]+run['decisions']
+        self.__rewrite(entries+([{'event': 'done'}] if run['done'] else []))
+        return run
+
+    def close(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def __append(self, entry:dict):
+        self._journal.write(json.dumps(entry)+'\n')
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+
+    def __rewrite(self, entries:list):
+        reopen = self._journal is not None
+        self.close()
+        tmp_path = self.journal_path+'.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.writelines(json.dumps(entry)+'\n' for entry in entries)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.journal_path)
+        if reopen:
+            self._journal = open(self.journal_path, 'a', encoding='utf-8')
+
+class ReplayReviewer:
+    def __init__(self, reviewer, checkpoint:SessionCheckpoint, decisions:list):
+        '''
+        Answer requests with the decisions of a journal while they match (same stage, person, frame and number of candidates),
+        then with the given reviewer; every decision of the reviewer is recorded in the checkpoint
+
+        Args:
+        reviewer:   the front-end answering requests not in the journal
+        checkpoint: the SessionCheckpoint recording the decisions
+        decisions:  decisions of the journal to replay, in order (see SessionCheckpoint.load_journal)
+        '''
+        self.reviewer = reviewer
+        self.checkpoint = checkpoint
+        self.decisions = list(decisions)
+        self.replayed = 0
+
+    def serve(self, review_queue:ReviewQueue):
+        request = review_queue.pop()
+        while request is not None:
+            if self.decisions:
+                decision = self.decisions.pop(0)
+                if [decision['stage'], decision['personID'], decision['frameID'], decision['candidates']]== \
+                        [request.stage, request.personID, int(request.frameID), len(request.candidates)]:
+                    self.replayed += 1
+                    request.decide(ReviewDecision(decision['action'], decision['index']))
+                    request = review_queue.pop()
+                    continue
+                print("[WARNING] The session differs from the journal at %s of %s at frame %d, the rest of the journal is dropped."
+                      %(request.stage, request.personID, request.frameID))
+                self.checkpoint.rewind(len(self.decisions)+1)
+                self.decisions = []
+            # Decisions are recorded one by one, as soon as the reviewer makes them
+            pending = ReviewQueue()
+            pending.submit(request)
+            request.future.add_done_callback(lambda future, request=request: self.checkpoint.record(request, future.result()))
+            self.reviewer.serve(pending)
+            request = review_queue.pop()
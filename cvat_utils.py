@@ -1,9 +1,22 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+from array import array
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 import xml.etree.ElementTree as ET
 import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+ANNOTATION_COLUMNS = ['task', 'frameID', 'label', 'xmin', 'ymin', 'xmax', 'ymax', 'gaze_x', 'gaze_y', 'outside', 'occluded']
+CACHE_VERSION = 1
 
 def cvat2dict(cvat_file_path, box_label='head', point_label='gaze'):
     '''
     Convert the CVAT task annotation file to a dictionary.
+    The file is parsed in one streaming pass (elements are dropped once converted), so the memory does not grow with the file.
     Args:
     cvat_file_path: The path to exported cvat annotation file xml.
     box_label:      A string contained in all box annotations. Used as an identifier to get bounding box annotations.
@@ -14,37 +27,371 @@ def cvat2dict(cvat_file_path, box_label='head', point_label='gaze'):
     '''
 
     info_dict = {}
+    tasks = {} # task_id -> (task_name, width, height)
+    pending = [] # annotations of tracks coming before their task: (task_id, frame, label, 'box' or 'points', values in pixels)
+
+    for item in _iter_cvat(cvat_file_path, box_label, point_label):
+        if item[0]=='task':
+            _, task_id, task_name, width, height = item
+            info_dict[task_name] = {}
+            tasks[task_id] = (task_name, width, height)
+            continue
+        kind, task_id, frame, label, values, _, _ = item
+        if task_id in tasks:
+            _add_annotation(info_dict, tasks[task_id], frame, label, kind, values)
+        else:
+            pending.append((task_id, frame, label, kind, values))
+
+    for task_id, frame, label, kind, values in pending:
+        if task_id in tasks:
+            _add_annotation(info_dict, tasks[task_id], frame, label, kind, values)
 
-    tree = ET.parse(cvat_file_path)
-    # get the root element
-    root = tree.getroot()
-
-    for task in root.iter(tag='task'): # Iterate over task
-        task_name = task.find('name').text
-        print("[INFO] Converting Format for Task %s"%(task_name))
-        task_vid_name = task.find('source').text
-        print('[INFO] The original video is %s'%task_vid_name)
-        task_id = task.find('id').text
-        info_dict[task_name] = {}
-        width = int(task.find('original_size').find('width').text)
-        height = int(task.find('original_size').find('height').text)
-
-        for tr in root.iterfind(".//track[@task_id='%s']"%task_id):
-            label = tr.get('label')
-            if box_label in label: # the annotation is a head bounding box
-                for head in tr.iter(tag='box'):
-                    frame = int(head.get('frame'))
-                    if not frame in info_dict:
-                        info_dict[task_name][frame] = {}
-                    xmin, ymin, xmax, ymax = map(float, [head.get('xtl'), head.get('ytl'), head.get('xbr'), head.get('ybr')])
-                    info_dict[task_name][frame][label] = [xmin/width, ymin/height, xmax/width, ymax/height] # Normalize box coordinates to scale 0-1
-                    
-            elif point_label in label: # the annotation is a gaze point
-                for point in tr.iter(tag='points'):
-                    frame = int(point.get('frame'))
-                    if not frame in info_dict:
-                        info_dict[task_name][frame] = {}
-                    gaze_x, gaze_y = np.array(point.get('points').split(",")).astype(float)
-                    info_dict[task_name][frame][label] = [gaze_x/width, gaze_y/height] # Normalize gaze to scale 0-1
-    
     return info_dict
+
+def cvat2columns(cvat_file_path, box_label='head', point_label='gaze'):
+    '''
+    Convert the CVAT task annotation file to a dataframe, one row per box or point, built from typed arrays
+    (no list or dictionary per annotation).
+    Args:
+    cvat_file_path: The path to exported cvat annotation file xml.
+    box_label:      A string contained in all box annotations. Used as an identifier to get bounding box annotations.
+    point_label:    A string contained in all point annotations. Used as an identifier to get point-like annotations.
+
+    Returns:
+    df:             A dataframe with ANNOTATION_COLUMNS, task and label are categorical, values are normalized in 0-1
+                    (xmin, ymin, xmax, ymax are NaN for points, gaze_x, gaze_y are NaN for boxes).
+    '''
+    task_codes = {} # task_id -> code
+    label_codes = {} # label -> code
+    sizes = {} # task_id -> (task_name, width, height)
+    task_col, frame_col, label_col = array('i'), array('i'), array('i')
+    coords = array('d') # 4 values (in pixels) per annotation, points fill the first 2
+    flags = array('b') # outside, occluded per annotation
+    is_box = array('b')
+
+    for item in _iter_cvat(cvat_file_path, box_label, point_label):
+        if item[0]=='task':
+            _, task_id, task_name, width, height = item
+            sizes[task_id] = (task_name, width, height)
+            task_codes.setdefault(task_id, len(task_codes))
+            continue
+        kind, task_id, frame, label, values, outside, occluded = item
+        task_col.append(task_codes.setdefault(task_id, len(task_codes)))
+        frame_col.append(frame)
+        label_col.append(label_codes.setdefault(label, len(label_codes)))
+        if kind=='box':
+            coords.extend(values)
+        else:
+            gaze_x, gaze_y = values
+            coords.extend((gaze_x, gaze_y, 0.0, 0.0))
+        is_box.append(kind=='box')
+        flags.extend((outside, occluded))
+
+    # Normalize all annotations at once, by the size of their tasks (annotations of unknown tasks are dropped)
+    task_names, widths, heights = [], np.full(len(task_codes), np.nan), np.full(len(task_codes), np.nan)
+    for task_id, code in task_codes.items():
+        task_name, widths[code], heights[code] = sizes.get(task_id, (None, np.nan, np.nan))
+        task_names.append(task_name)
+    task_col = np.frombuffer(task_col, dtype=np.int32)
+    coords = np.frombuffer(coords, dtype=np.float64).reshape(-1, 4)/np.c_[widths, heights, widths, heights][task_col]
+    is_box = np.frombuffer(is_box, dtype=np.int8).astype(bool)
+    flags = np.frombuffer(flags, dtype=np.int8).reshape(-1, 2).astype(bool)
+    known = ~np.isnan(widths[task_col])
+
+    boxes = np.where(is_box[:, None], coords, np.nan).astype(np.float32)
+    gazes = np.where(is_box[:, None], np.nan, coords[:, :2]).astype(np.float32)
+    # categories of tasks in the order of the file, the codes of unknown tasks (NaN names) become -1
+    task_dtype = pd.CategoricalDtype(list(dict.fromkeys(name for name in task_names if name is not None)))
+    task_map = np.array([task_dtype.categories.get_loc(name) if name is not None else -1 for name in task_names], dtype=np.int32)
+    columns = {
+        'task': pd.Categorical.from_codes(task_map[task_col][known], dtype=task_dtype),
+        'frameID': np.frombuffer(frame_col, dtype=np.int32)[known],
+        'label': pd.Categorical.from_codes(np.frombuffer(label_col, dtype=np.int32)[known], categories=list(label_codes)),
+    }
+    for i, column in enumerate(['xmin', 'ymin', 'xmax', 'ymax']):
+        columns[column] = boxes[known, i]
+    columns['gaze_x'], columns['gaze_y'] = gazes[known, 0], gazes[known, 1]
+    columns['outside'], columns['occluded'] = flags[known, 0], flags[known, 1]
+    return pd.DataFrame(columns)
+
+def save_columns(df:pd.DataFrame, path:str):
+    '''
+    Save converted annotations (see cvat2columns) as a .parquet file (needs pyarrow), a .npz file,
+    or a directory of .npy files (any other path), which load_columns memory-maps
+    '''
+    if path.endswith('.parquet'):
+        df.to_parquet(path, index=False)
+        return
+    # categorical columns are saved as codes, with their categories in <column>_names
+    arrays = {'columns': np.array(df.columns, dtype=str)}
+    for column in df.columns:
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            arrays[column] = df[column].cat.codes.to_numpy()
+            arrays[column+'_names'] = np.array(df[column].cat.categories, dtype=str)
+        else:
+            arrays[column] = df[column].to_numpy()
+    if path.endswith('.npz'):
+        np.savez(path, **arrays)
+        return
+    os.makedirs(path, exist_ok=True)
+    for name, values in arrays.items():
+        np.save(os.path.join(path, name+'.npy'), values)
+
+def load_columns(path:str):
+    '''
+    Load annotations saved by save_columns. The columns of a directory of .npy files are memory-mapped
+    and the DataFrame is built on the mapped arrays without copying them (copy-on-write: writing to the DataFrame
+    never changes the files), a .npz or .parquet file is read into memory
+    '''
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path, memory_map=True)
+    if path.endswith('.npz'):
+        # read every array into memory, so that the archive is closed before returning
+        with np.load(path) as npz:
+            arrays = {name: npz[name] for name in npz.files}
+    else:
+        arrays = {name[:-4]: np.load(os.path.join(path, name), mmap_mode='c') for name in os.listdir(path) if name.endswith('.npy')}
+    columns = {}
+    for column in arrays['columns'].tolist():
+        if column+'_names' in arrays:
+            columns[column] = pd.Categorical.from_codes(arrays[column], categories=arrays[column+'_names'].tolist())
+        else:
+            # a plain array viewing the mapped file
+            columns[column] = arrays[column].view(np.ndarray)
+    return pd.DataFrame(columns, copy=False)
+
+def load_cvat(cvat_file_path, box_label='head', point_label='gaze', use_cache=True):
+    '''
+    Load the CVAT task annotation file as a dataframe (see cvat2columns).
+    On the first load, the converted columns are saved as <cvat_file_path>.columns/ next to the file,
+    later loads memory-map them instead of parsing the xml. They are converted again when the size or mtime of the file changes.
+    '''
+    cache_dir = cvat_file_path+'.columns'
+    st = os.stat(cvat_file_path)
+    meta = {'version': CACHE_VERSION, 'source_size': st.st_size, 'source_mtime': st.st_mtime,
+            'box_label': box_label, 'point_label': point_label}
+
+    if use_cache:
+        try:
+            with open(os.path.join(cache_dir, 'meta.json'), 'r') as f:
+                cached_meta = json.load(f)
+            if cached_meta==meta:
+                return load_columns(cache_dir)
+        except (OSError, ValueError, KeyError):
+            pass
+
+    df = cvat2columns(cvat_file_path, box_label, point_label)
+
+    if use_cache:
+        try:
+            # Write into a temporary directory first, so that an interrupted write leaves no broken cache
+            tmp_dir = cache_dir+'.tmp'
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            save_columns(df, tmp_dir)
+            with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+                json.dump(meta, f)
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            os.replace(tmp_dir, cache_dir)
+        except OSError as e:
+            print("[WARNING] Can not write the annotation cache %s (%s), the xml will be parsed again next time."%(cache_dir, e))
+
+    return df
+
+def convert_cvat_dir(cvat_dir:str, output_dir:str, box_label='head', point_label='gaze', num_workers=4):
+    '''
+    Convert all CVAT exports (*.xml) under cvat_dir by a process pool, and merge them into one dataset-level store.
+    Every export is converted into <output_dir>/files/<content hash>.npz (see cvat2columns),
+    exports with the same content as in the manifest (<output_dir>/manifest.json) of an earlier run are not converted again.
+    All of them are merged into <output_dir>/annotations (read it by load_columns), with a categorical column 'source'
+    holding the path of the export relative to cvat_dir.
+    Args:
+    cvat_dir:       The directory of exported cvat annotation files, searched recursively.
+    output_dir:     The directory to keep converted files, the manifest and the merged annotations.
+    box_label:      A string contained in all box annotations, see cvat2columns.
+    point_label:    A string contained in all point annotations, see cvat2columns.
+    num_workers:    The number of processes converting exports.
+
+    Returns:
+    stats (dict):   exports found, converted, skipped and failed, merged annotations, time spent, and seconds of every converted export
+    '''
+    start = time.time()
+    files_dir = os.path.join(output_dir, 'files')
+    os.makedirs(files_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, 'manifest.json')
+    labels = [box_label, point_label]
+    try:
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+        if manifest['version']!=CACHE_VERSION or manifest['labels']!=labels:
+            raise ValueError
+    except (OSError, ValueError, KeyError):
+        manifest = {'version': CACHE_VERSION, 'labels': labels, 'files': {}}
+
+    xml_paths = sorted(os.path.relpath(os.path.join(root, name), cvat_dir)
+                       for root, _, names in os.walk(cvat_dir) for name in names if name.lower().endswith('.xml'))
+    # hashing reads every export, which threads do concurrently (hashlib releases the GIL)
+    with ThreadPoolExecutor(max_workers=num_workers) as pool:
+        hashes = dict(zip(xml_paths, pool.map(_file_hash, [os.path.join(cvat_dir, xml_path) for xml_path in xml_paths])))
+
+    stats = {'files': len(xml_paths), 'converted': 0, 'skipped': 0, 'failed': 0, 'annotations': 0,
+             'seconds': 0.0, 'wall_seconds': 0.0, 'file_seconds': {}}
+    files = {} # xml_path -> entry of the manifest
+    todo = []
+    for xml_path in xml_paths:
+        entry = manifest['files'].get(xml_path)
+        if entry is not None and entry['hash']==hashes[xml_path] and os.path.exists(os.path.join(files_dir, entry['hash']+'.npz')):
+            files[xml_path] = entry
+            stats['skipped'] += 1
+        else:
+            todo.append(xml_path)
+    changed = len(todo)>0 or set(files)!=set(manifest['files'])
+
+    # exports with the same content are converted once, into the same file
+    same_content = {}
+    for xml_path in todo:
+        same_content.setdefault(hashes[xml_path], []).append(xml_path)
+
+    with ProcessPoolExecutor(max_workers=num_workers) as pool:
+        futures = {pool.submit(_convert_file, os.path.join(cvat_dir, xml_paths_of_hash[0]), os.path.join(files_dir, content_hash+'.npz'),
+                               box_label, point_label): xml_paths_of_hash for content_hash, xml_paths_of_hash in same_content.items()}
+        for future in as_completed(futures):
+            xml_paths_of_hash = futures[future]
+            try:
+                rows, seconds = future.result()
+            except Exception as e:
+                for xml_path in xml_paths_of_hash:
+                    print("[ERROR] Can not convert %s (%s), it is left out."%(xml_path, e))
+                stats['failed'] += len(xml_paths_of_hash)
+                continue
+            for xml_path in xml_paths_of_hash:
+                print("[INFO] Converted %s: %d annotations in %.2fs"%(xml_path, rows, seconds))
+                files[xml_path] = {'hash': hashes[xml_path], 'annotations': rows, 'seconds': seconds}
+                stats['converted'] += 1
+                stats['file_seconds'][xml_path] = seconds
+            stats['seconds'] += seconds
+            # the manifest is saved after every export, so that an interrupted run keeps what is converted
+            manifest['files'] = {path: files[path] for path in xml_paths if path in files}
+            _save_json(manifest, manifest_path)
+    manifest['files'] = {path: files[path] for path in xml_paths if path in files}
+    _save_json(manifest, manifest_path)
+
+    annotations_dir = os.path.join(output_dir, 'annotations')
+    if changed or not os.path.exists(annotations_dir):
+        sources = list(manifest['files'])
+        dfs = [load_columns(os.path.join(files_dir, manifest['files'][source]['hash']+'.npz')) for source in sources]
+        tmp_dir = annotations_dir+'.tmp'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        save_columns(_merge_columns(dfs, sources), tmp_dir)
+        shutil.rmtree(annotations_dir, ignore_errors=True)
+        os.replace(tmp_dir, annotations_dir)
+    # remove converted files no export refers to any more
+    kept = set(entry['hash']+'.npz' for entry in manifest['files'].values())
+    for name in os.listdir(files_dir):
+        if not name in kept:
+            os.remove(os.path.join(files_dir, name))
+
+    stats['annotations'] = sum(entry['annotations'] for entry in manifest['files'].values())
+    stats['wall_seconds'] = time.time()-start
+    return stats
+
+def _file_hash(path:str):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1<<20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _save_json(obj, path:str):
+    tmp_path = path+'.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(obj, f)
+    os.replace(tmp_path, path)
+
+def _convert_file(xml_path:str, output_path:str, box_label:str, point_label:str):
+    '''
+    Convert one export into output_path (.npz), run in the worker processes of convert_cvat_dir
+    '''
+    start = time.time()
+    df = cvat2columns(xml_path, box_label, point_label)
+    # a temporary name of its own, no other process writes into it
+    tmp_path = '%s.%d.tmp.npz'%(output_path[:-4], os.getpid())
+    save_columns(df, tmp_path)
+    os.replace(tmp_path, output_path)
+    return len(df), time.time()-start
+
+def _merge_columns(dfs:list, sources:list):
+    '''
+    Concatenate converted exports, with their categories merged and a categorical column 'source'
+    '''
+    columns = {'source': pd.Categorical.from_codes(np.repeat(np.arange(len(dfs)), [len(df) for df in dfs]).astype(np.int32),
+                                                   categories=sources)}
+    for column in (dfs[0].columns if dfs else ANNOTATION_COLUMNS):
+        if not dfs:
+            columns[column] = []
+        elif isinstance(dfs[0][column].dtype, pd.CategoricalDtype):
+            columns[column] = union_categoricals([df[column] for df in dfs])
+        else:
+            columns[column] = np.concatenate([df[column].to_numpy() for df in dfs])
+    return pd.DataFrame(columns)
+
+def _iter_cvat(cvat_file_path, box_label:str, point_label:str):
+    '''
+    Parse the CVAT file in one streaming pass, yielding
+    ('task', task_id, task_name, width, height) for every task, and
+    ('box' or 'points', task_id, frame, label, values in pixels, outside, occluded) for every annotation of box_label/point_label tracks
+    '''
+    tasks = set()
+    track = None # (label, task_id) of the track being parsed
+
+    context = ET.iterparse(cvat_file_path, events=('start', 'end'))
+    _, root = next(context) # get the root element
+    for event, elem in context:
+        if event=='start':
+            if elem.tag=='track':
+                track = (elem.get('label'), elem.get('task_id'))
+            continue
+
+        if elem.tag=='task': # a task in meta
+            task_name = elem.find('name').text
+            print("[INFO] Converting Format for Task %s"%(task_name))
+            task_vid_name = elem.find('source').text
+            print('[INFO] The original video is %s'%task_vid_name)
+            task_id = elem.find('id').text
+            width = int(elem.find('original_size').find('width').text)
+            height = int(elem.find('original_size').find('height').text)
+            tasks.add(task_id)
+            elem.clear()
+            yield 'task', task_id, task_name, width, height
+
+        elif elem.tag in ('box', 'points') and track is not None:
+            label, task_id = track
+            kind = elem.tag
+            if kind=='box' and box_label in label: # the annotation is a head bounding box
+                values = tuple(map(float, [elem.get('xtl'), elem.get('ytl'), elem.get('xbr'), elem.get('ybr')]))
+            elif kind=='points' and not box_label in label and point_label in label: # the annotation is a gaze point
+                values = tuple(map(float, elem.get('points').split(",")))
+            else:
+                elem.clear()
+                continue
+            if task_id is None and len(tasks)==1: # exported from a single task, tracks have no task_id
+                task_id = next(iter(tasks))
+            outside, occluded = elem.get('outside')=='1', elem.get('occluded')=='1'
+            frame = int(elem.get('frame'))
+            elem.clear()
+            yield kind, task_id, frame, label, values, outside, occluded
+
+        elif elem.tag=='track':
+            track = None
+            elem.clear()
+            root.clear() # drop converted tracks (and meta) from the tree
+
+def _add_annotation(info_dict:dict, task:tuple, frame:int, label:str, kind:str, values:list):
+    task_name, width, height = task
+    if not frame in info_dict[task_name]:
+        info_dict[task_name][frame] = {}
+    if kind=='box':
+        xmin, ymin, xmax, ymax = values
+        info_dict[task_name][frame][label] = [xmin/width, ymin/height, xmax/width, ymax/height] # Normalize box coordinates to scale 0-1
+    else:
+        gaze_x, gaze_y = values
+        info_dict[task_name][frame][label] = [gaze_x/width, gaze_y/height] # Normalize gaze to scale 0-1
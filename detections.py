@@ -0,0 +1,202 @@
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+
+from spatial_index import GridIndex
+
+BOX_COLUMNS = ['xmin', 'ymin', 'xmax', 'ymax']
+RAW_COLUMNS = ['frameID', 'label', 'xmin', 'ymin', 'xmax', 'ymax']
+CACHE_VERSION = 1
+
+class DetectionStore:
+    def __init__(self, frame_ids:np.ndarray, boxes:np.ndarray, row_labels:np.ndarray=None):
+        '''
+        Keep head detections as contiguous arrays sorted by frameID, with a frame-offset table
+        so that the boxes of a frame are a zero-copy slice.
+        Positions of detections never change, a detection is claimed by a person through the owners array.
+
+        Args:
+        frame_ids:  frameID of every detection (shape: N), sorted in ascending order
+        boxes:      [xmin, ymin, xmax, ymax] of every detection (shape: N x 4), values normalized in 0-1
+        row_labels: index labels of the detections in the source dataframe (None for 0 ... N-1)
+        '''
+        self.frame_ids = np.asarray(frame_ids)
+        self.boxes = np.asarray(boxes)
+        self.row_labels = None if row_labels is None else np.asarray(row_labels)
+        assert len(self.frame_ids)==len(self.boxes)
+        assert self.row_labels is None or len(self.row_labels)==len(self.frame_ids)
+        assert len(self.frame_ids)==0 or (self.frame_ids[0]>=0 and np.all(np.diff(self.frame_ids)>=0)), \
+            "frameIDs should be non-negative and sorted"
+
+        # offsets[f]:offsets[f+1] holds the detections of frame f
+        self.max_frame = int(self.frame_ids[-1]) if len(self.frame_ids) else -1
+        self.offsets = np.searchsorted(self.frame_ids, np.arange(self.max_frame+2), side='left')
+
+        # owners[i] is the code of the person claiming detection i (-1 if it is free)
+        self.owners = np.full(len(self.frame_ids), -1, dtype=np.int32)
+        self.owner_ids = [] # code -> personID
+        self.index = None # a GridIndex of the boxes, see build_index
+
+    @classmethod
+    def from_dataframe(cls, df:pd.DataFrame):
+        '''
+        Build the store from a dataframe with columns ['frameID', 'xmin', 'ymin', 'xmax', 'ymax']
+        '''
+        df = df.sort_values('frameID', kind='stable')
+        return cls(df['frameID'].to_numpy(dtype=np.int64),
+                   df[BOX_COLUMNS].to_numpy(dtype=float),
+                   df.index.to_numpy())
+
+    def __len__(self):
+        return len(self.frame_ids)
+
+    def has_frame(self, f:int):
+        '''
+        Whether there is any detection at frame f
+        '''
+        return 0<=f<=self.max_frame and self.offsets[f+1]>self.offsets[f]
+
+    def frame_slice(self, f:int):
+        '''
+        The slice of the detections at frame f (an empty slice if there is none)
+        '''
+        if not 0<=f<=self.max_frame:
+            return slice(0, 0)
+        return slice(self.offsets[f], self.offsets[f+1])
+
+    def frame_boxes(self, f:int):
+        '''
+        The boxes at frame f (a view, not a copy)
+        '''
+        return self.boxes[self.frame_slice(f)]
+
+    def free_idxes(self, f:int):
+        '''
+        Positions of the detections at frame f not claimed by anyone
+        '''
+        frame_slice = self.frame_slice(f)
+        return frame_slice.start + np.flatnonzero(self.owners[frame_slice]<0)
+
+    def build_index(self, grid_size=16):
+        '''
+        Build a spatial index (spatial_index.GridIndex) of all detections, so that free_idxes_near
+        only looks at the detections close to the given regions
+        '''
+        self.index = GridIndex(self.frame_ids, self.boxes, grid_size)
+
+    def free_idxes_near(self, f:int, regions:list):
+        '''
+        Positions of the detections at frame f not claimed by anyone, which may overlap with any of the regions
+        ([xmin, ymin, xmax, ymax] each); all free detections at frame f if there is no spatial index
+        '''
+        if self.index is None:
+            return self.free_idxes(f)
+        idxes = self.index.query(f, regions)
+        return idxes[self.owners[idxes]<0]
+
+    def free_mask(self):
+        return self.owners<0
+
+    def owner_code(self, personID):
+        if not personID in self.owner_ids:
+            self.owner_ids.append(personID)
+        return self.owner_ids.index(personID)
+
+    def claim(self, idxes, personID):
+        '''
+        Mark the given detections as used by personID
+        '''
+        self.owners[idxes] = self.owner_code(personID)
+
+    def release(self, idxes):
+        '''
+        Make the given detections free again
+        '''
+        self.owners[idxes] = -1
+
+    def owned_by(self, personID):
+        '''
+        Positions of the detections claimed by personID
+        '''
+        if not personID in self.owner_ids:
+            return np.array([], dtype=int)
+        return np.flatnonzero(self.owners==self.owner_ids.index(personID))
+
+    def frames(self):
+        '''
+        All frameIDs with at least one detection
+        '''
+        return np.flatnonzero(np.diff(self.offsets))
+
+    def get_info(self, i:int):
+        '''
+        Get detection i as a dictionary with keys 'frameID', 'xmin', 'ymin', 'xmax', 'ymax'
+        '''
+        info = {'frameID': int(self.frame_ids[i])}
+        info.update(zip(BOX_COLUMNS, self.boxes[i].tolist()))
+        return info
+
+    def to_dataframe(self, idxes=None):
+        '''
+        Get detections (all of them if idxes is None) as a dataframe
+        '''
+        idxes = slice(None) if idxes is None else idxes
+        row_labels = np.arange(len(self.frame_ids)) if self.row_labels is None else self.row_labels
+        df = pd.DataFrame(self.boxes[idxes], columns=BOX_COLUMNS, index=row_labels[idxes])
+        df.insert(0, 'frameID', self.frame_ids[idxes])
+        return df
+
+def load_detections(raw_detection_file:str, use_cache=True):
+    '''
+    Load raw head detections into a DetectionStore.
+    On the first load, a typed sidecar (int32 frameID, float32 boxes, sorted by frameID/xmin) is written next to the file,
+    later loads memory-map the sidecar instead of parsing the csv. The sidecar is rebuilt when the size or mtime of the file changes.
+    Detections are labelled by their position after sorting (0 ... N-1) on both paths, as in the baseline reset_index,
+    so a cached load gives the same proposal_df as a cold one.
+
+    Args:
+    raw_detection_file: the csv file with raw_annotation_detection, see README for its format
+    use_cache:          whether or not to read/write the sidecar
+
+    Returns:
+    detections (DetectionStore)
+    '''
+    cache_dir = raw_detection_file+'.cache'
+    st = os.stat(raw_detection_file)
+    meta = {'version': CACHE_VERSION, 'source_size': st.st_size, 'source_mtime': st.st_mtime}
+
+    if use_cache:
+        try:
+            with open(os.path.join(cache_dir, 'meta.json'), 'r') as f:
+                cached_meta = json.load(f)
+            if cached_meta==meta:
+                frame_ids = np.load(os.path.join(cache_dir, 'frameID.npy'), mmap_mode='r')
+                boxes = np.load(os.path.join(cache_dir, 'boxes.npy'), mmap_mode='r')
+                return DetectionStore(frame_ids, boxes)
+        except (OSError, ValueError):
+            pass
+
+    raw_df = pd.read_csv(raw_detection_file, names=RAW_COLUMNS, usecols=['frameID']+BOX_COLUMNS,
+                         dtype={'frameID': np.int32, 'xmin': np.float32, 'ymin': np.float32, 'xmax': np.float32, 'ymax': np.float32})
+    raw_df = raw_df.sort_values(by=['frameID', 'xmin'], kind='stable').reset_index(drop=True)
+    frame_ids = raw_df['frameID'].to_numpy()
+    boxes = np.ascontiguousarray(raw_df[BOX_COLUMNS].to_numpy())
+
+    if use_cache:
+        try:
+            # Write into a temporary directory first, so that an interrupted write leaves no broken sidecar
+            tmp_dir = cache_dir+'.tmp'
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            os.makedirs(tmp_dir)
+            np.save(os.path.join(tmp_dir, 'frameID.npy'), frame_ids)
+            np.save(os.path.join(tmp_dir, 'boxes.npy'), boxes)
+            with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+                json.dump(meta, f)
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            os.replace(tmp_dir, cache_dir)
+        except OSError as e:
+            print("[WARNING] Can not write the detection cache %s (%s), the csv will be parsed again next time."%(cache_dir, e))
+
+    return DetectionStore(frame_ids, boxes)
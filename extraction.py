@@ -0,0 +1,178 @@
+import os
+import json
+import time
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import cv2
+
+def ffmpeg_command(input_vid:str, output_dir:str, fps=30, start_frame=0, num_frames=None):
+    '''
+    Get the ffmpeg command (an argument list, so paths with spaces or Chinese characters need no quoting)
+    extracting frames of a video as <output_dir>/%06d.jpg
+
+    Args:
+    input_vid:      the path of input video
+    output_dir:     the directory to save extracted frames
+    fps:            extraction rate (frame per second), if fps=-1, every frame of the video is extracted
+    start_frame:    the number of frames before the first extracted one (counted at fps), frames are numbered from start_frame+1
+    num_frames:     the number of frames to extract, None for all frames until the end of the video
+    '''
+    command = ['ffmpeg', '-nostdin', '-loglevel', 'error', '-y']
+    if fps<0:
+        if start_frame>0:
+            # Seek before the input: ffmpeg decodes from the keyframe before, and drops the frames before the given time
+            # (half a frame before the first extracted one, so that rounding never drops it)
+            video_fps = cv2.VideoCapture(input_vid).get(cv2.CAP_PROP_FPS)
+            command += ['-ss', '%.6f'%((start_frame-0.5)/video_fps)]
+        command += ['-i', input_vid, '-vsync', '0']
+    else:
+        # Every segment picks frames the same way, at the timestamps of the whole video (-copyts), as if it was extracted from its start:
+        # the fps filter counts frames from 0, and trim drops the ones before start_frame.
+        # Seeking a second earlier keeps the frame shown at start_frame, which may come before start_frame/fps
+        command += ['-ss', '%.6f'%max(0, start_frame/fps-1), '-copyts', '-start_at_zero', '-i', input_vid,
+                    '-vf', 'fps=%s:start_time=0,trim=start_frame=%d'%(fps, start_frame), '-vsync', '0', '-q:v', '2', '-f', 'image2']
+    if num_frames is not None:
+        command += ['-frames:v', str(num_frames)]
+    command += ['-start_number', str(start_frame+1), os.path.join(output_dir, '%06d.jpg')]
+    return command
+
+def count_frames(output_dir:str, start_frame=0, num_frames=None):
+    '''
+    Count the extracted frames start_frame+1 ... start_frame+num_frames (or all frames after start_frame if num_frames is None),
+    only the files of this range are looked up: ffmpeg numbers frames without gaps, so the count stops at the first missing one
+    '''
+    count = 0
+    while num_frames is None or count<num_frames:
+        if not os.path.exists(os.path.join(output_dir, '%06d.jpg'%(start_frame+count+1))):
+            break
+        count += 1
+    return count
+
+class BatchExtractor:
+    def __init__(self, fps=30, num_workers=4, segment_seconds=120):
+        '''
+        Extract frames of many videos with ffmpeg processes running concurrently.
+        Long videos are split into segments of segment_seconds, extracted concurrently and numbered as one extraction of the whole video.
+        Completed segments are recorded in <output_dir>.extraction.json next to the output directory,
+        and skipped when the extraction is run again (e.g. after an interruption).
+
+        Args:
+        fps:                extraction rate (frame per second), if fps=-1, every frame of the video is extracted
+        num_workers:        the number of ffmpeg processes running at once
+        segment_seconds:    the length of segments (None to extract every video in one piece)
+        '''
+        self.fps = fps
+        self.num_workers = num_workers
+        self.segment_seconds = segment_seconds
+        # seconds sums the time of every segment, wall_seconds the elapsed time of extract
+        self.stats = {'videos': 0, 'segments': 0, 'segments_skipped': 0, 'frames': 0, 'seconds': 0.0, 'wall_seconds': 0.0}
+
+    def extract(self, videos:list, output_dirs:list):
+        '''
+        Extract frames of videos[i] into output_dirs[i]
+
+        Returns:
+        stats (dict): videos, extracted and skipped segments, extracted frames, time spent and throughput (frames per second)
+        '''
+        assert len(videos)==len(output_dirs)
+        start = time.time()
+        manifests = {}
+        segments = []
+        for input_vid, output_dir in zip(videos, output_dirs):
+            video_segments = self.__plan(input_vid)
+            if video_segments is None:
+                continue
+            os.makedirs(output_dir, exist_ok=True)
+            manifests[output_dir] = self.__load_manifest(input_vid, output_dir)
+            self.stats['videos'] += 1
+            for start_frame, num_frames in video_segments:
+                if str(start_frame) in manifests[output_dir]['segments']:
+                    self.stats['segments_skipped'] += 1
+                    continue
+                segments.append((input_vid, output_dir, start_frame, num_frames))
+
+        frames_done = 0
+        with ThreadPoolExecutor(max_workers=self.num_workers) as pool:
+            futures = {pool.submit(self.__extract_segment, *segment): segment for segment in segments}
+            for future in as_completed(futures):
+                input_vid, output_dir, start_frame, num_frames = futures[future]
+                frames, seconds = future.result()
+                if frames is None:
+                    continue
+                manifest = manifests[output_dir]
+                manifest['segments'][str(start_frame)] = frames
+                self.__save_manifest(output_dir, manifest)
+                self.stats['segments'] += 1
+                self.stats['frames'] += frames
+                frames_done += frames
+                self.stats['seconds'] += seconds
+                print("Extracted %s frames %d-%d (%d/%d segments, %.1f fps)"
+                      %(input_vid, start_frame+1, start_frame+frames, self.stats['segments'], len(segments), frames_done/(time.time()-start)))
+        self.stats['wall_seconds'] += time.time()-start
+        return self.get_stats()
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['fps'] = stats['frames']/stats['wall_seconds'] if stats['wall_seconds']>0 else 0.0
+        return stats
+
+    def __plan(self, input_vid:str):
+        '''
+        Split a video into segments of (start_frame, num_frames), num_frames of the last segment is None (until the end)
+        '''
+        cap = cv2.VideoCapture(input_vid)
+        if not cap.isOpened():
+            print("[ERROR] Can not open the video %s, it is skipped."%input_vid)
+            return None
+        video_fps = cap.get(cv2.CAP_PROP_FPS)
+        duration = cap.get(cv2.CAP_PROP_FRAME_COUNT)/video_fps
+        cap.release()
+        fps = video_fps if self.fps<0 else self.fps
+        if self.segment_seconds is None:
+            return [(0, None)]
+        segment_frames = max(1, int(round(self.segment_seconds*fps)))
+        num_segments = max(1, -(-int(round(duration*fps))//segment_frames))
+        return [(k*segment_frames, segment_frames if k<num_segments-1 else None) for k in range(num_segments)]
+
+    def __extract_segment(self, input_vid:str, output_dir:str, start_frame:int, num_frames:int):
+        start = time.time()
+        result = subprocess.run(ffmpeg_command(input_vid, output_dir, self.fps, start_frame, num_frames),
+                                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        if result.returncode!=0:
+            print("[ERROR] Can not extract %s from frame %d (%s)."%(input_vid, start_frame+1, result.stderr.decode(errors='replace').strip()))
+            return None, 0.0
+        return count_frames(output_dir, start_frame, num_frames), time.time()-start
+
+    def __manifest_path(self, output_dir:str):
+        return os.path.normpath(output_dir)+'.extraction.json'
+
+    def __load_manifest(self, input_vid:str, output_dir:str):
+        st = os.stat(input_vid)
+        # segments of an earlier extraction are only reused with the same video and the same segmentation
+        source = {'video': os.path.abspath(input_vid), 'size': st.st_size, 'mtime': st.st_mtime,
+                  'fps': self.fps, 'segment_seconds': self.segment_seconds}
+        try:
+            with open(self.__manifest_path(output_dir), 'r') as f:
+                manifest = json.load(f)
+            if manifest['source']==source:
+                return manifest
+        except (OSError, ValueError, KeyError):
+            pass
+        return {'source': source, 'segments': {}}
+
+    def __save_manifest(self, output_dir:str, manifest:dict):
+        manifest_path = self.__manifest_path(output_dir)
+        tmp_path = manifest_path+'.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, manifest_path)
+
+def extract_videos(videos:list, output_dirs:list, fps=30, num_workers=4, segment_seconds=120):
+    '''
+    Extract frames of many videos concurrently, see BatchExtractor
+
+    Returns:
+    stats (dict): see BatchExtractor.extract
+    '''
+    return BatchExtractor(fps, num_workers, segment_seconds).extract(videos, output_dirs)
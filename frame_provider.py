@@ -0,0 +1,127 @@
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from frame_source import FrameSource, JpegDirSource
+
+class FrameProvider:
+    def __init__(self,
+                 frame_dir:str,
+                 show_width=640,
+                 show_height=360,
+                 max_cache_mb=256,
+                 num_workers=4,
+                 frame_reader=None):
+        '''
+        Read, decode and resize frames for previews, ahead of time.
+        Decoded preview-size frames are kept in a memory-bounded LRU cache.
+
+        Args:
+        frame_dir:      the directory of frames, named as %06d.jpg, or a FrameSource (e.g. frame_source.VideoSource)
+        show_width:     the width of the preview frames
+        show_height:    the height of the preview frames
+        max_cache_mb:   the memory bound of cached preview frames (in MB)
+        num_workers:    the number of threads fetching and decoding frames in background (one for sources without parallel_reads)
+        frame_reader:   the FrameReader decoding frames of a directory (by default, JPEGs are decoded at a reduced size for previews)
+        '''
+        if isinstance(frame_dir, FrameSource):
+            self.frame_source = frame_dir
+        else:
+            self.frame_source = JpegDirSource(frame_dir, frame_reader)
+        self.frame_dir = frame_dir
+        self.show_width = show_width
+        self.show_height = show_height
+        self.max_cache_bytes = int(max_cache_mb*1024*1024)
+
+
+        self._cache = OrderedDict() # frameID -> (preview frame, original (h, w))
+        self._cache_bytes = 0
+        self._pending = {} # frameID -> future of frames being loaded
+        self._lock = threading.Lock()
+        # misses are frames not cached when asked for (waited for, loading or not), wait_seconds the time spent waiting for them
+        self.stats = {'hits': 0, 'misses': 0, 'prefetched': 0, 'loads': 0, 'load_seconds': 0.0, 'wait_seconds': 0.0}
+        # frames of a video are decoded in order by one thread, so that prefetching never seeks back
+        self._pool = ThreadPoolExecutor(max_workers=num_workers if self.frame_source.parallel_reads else 1)
+
+    def set_remote(self, remote_store):
+        '''
+        Fetch frames by a RemoteFrameStore (which downloads into frame_dir) before reading them
+        '''
+        if not isinstance(self.frame_source, JpegDirSource):
+            print("[WARNING] Remote frames are only supported for frame directories, frames are read from %s."%self.frame_dir)
+            return
+        self.frame_source.set_remote(remote_store)
+
+    def get(self, frameID:int):
+        '''
+        Get the preview of a frame
+
+        Returns:
+        frame (np.array):   a copy of the preview-size frame, free to draw on
+        size (tuple):       (h, w) of the original frame
+        '''
+        frameID = int(frameID)
+        with self._lock:
+            if frameID in self._cache:
+                self._cache.move_to_end(frameID)
+                frame, size = self._cache[frameID]
+                self.stats['hits'] += 1
+                return frame.copy(), size
+            self.stats['misses'] += 1
+            future = self._pending.get(frameID)
+            if future is None:
+                future = self._pool.submit(self._load, frameID)
+                self._pending[frameID] = future
+        start = time.time()
+        frame, size = future.result()
+        with self._lock:
+            self.stats['wait_seconds'] += time.time()-start
+        return frame.copy(), size
+
+    def prefetch(self, frameIDs:list):
+        '''
+        Load the given frames in background, if they are not cached or being loaded
+        '''
+        with self._lock:
+            for frameID in map(int, frameIDs):
+                if frameID in self._cache or frameID in self._pending:
+                    continue
+                self.stats['prefetched'] += 1
+                self._pending[frameID] = self._pool.submit(self._load, frameID)
+
+    def get_stats(self):
+        '''
+        Returns:
+        stats (dict): cache hits and misses of previews, prefetched and loaded frames, time spent loading and waiting for frames
+        '''
+        with self._lock:
+            return dict(self.stats)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self._cache_bytes = 0
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self.frame_source.close()
+        self.clear()
+
+    def _load(self, frameID:int):
+        try:
+            start = time.time()
+            frame, (h, w) = self.frame_source.read(frameID, (self.show_width, self.show_height))
+            with self._lock:
+                self.stats['loads'] += 1
+                self.stats['load_seconds'] += time.time()-start
+                self._cache[frameID] = (frame, (h, w))
+                self._cache_bytes += frame.nbytes
+                # Evict the least recently used frames
+                while self._cache_bytes>self.max_cache_bytes and len(self._cache)>1:
+                    _, (evicted, _) = self._cache.popitem(last=False)
+                    self._cache_bytes -= evicted.nbytes
+            return frame, (h, w)
+        finally:
+            with self._lock:
+                self._pending.pop(frameID, None)
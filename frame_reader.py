@@ -0,0 +1,166 @@
+import os
+import struct
+import threading
+
+import numpy as np
+import cv2
+
+# JPEG can be decoded at 1/2, 1/4 and 1/8 of its size directly from the DCT coefficients
+REDUCED_FLAGS = {2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+# Start-of-frame markers holding the image size (all except DHT 0xC4, JPG 0xC8 and DAC 0xCC)
+SOF_MARKERS = set(range(0xC0, 0xD0))-{0xC4, 0xC8, 0xCC}
+
+def jpeg_size(buf:bytes):
+    '''
+    Get (h, w) of a JPEG from its header (bytes, or np.uint8 array), None if it is not a JPEG or the header is cut
+    '''
+    buf = bytes(buf[:262144])
+    if buf[:2]!=b'\xff\xd8':
+        return None
+    i = 2
+    while i+9<len(buf):
+        if buf[i]!=0xFF:
+            return None
+        marker = buf[i+1]
+        if marker==0xFF: # fill byte
+            i += 1
+            continue
+        length = struct.unpack('>H', buf[i+2:i+4])[0]
+        if marker in SOF_MARKERS:
+            h, w = struct.unpack('>HH', buf[i+5:i+9])
+            return h, w
+        i += 2+length
+    return None
+
+def reduced_scale(h:int, w:int, size:tuple):
+    '''
+    Get the largest JPEG reduction (1, 2, 4 or 8) that still decodes a frame of (h, w) into at least size (w, h)
+    '''
+    for scale in [8, 4, 2]:
+        if -(-w//scale)>=size[0] and -(-h//scale)>=size[1]:
+            return scale
+    return 1
+
+class FrameReader:
+    def __init__(self, reduced_decode=True, thumbnails=False, thumbnail_dir=None):
+        '''
+        Read frames scaled to a given size.
+        JPEGs are decoded at 1/2, 1/4 or 1/8 of their size when it is still larger than the given size, then resized.
+        With thumbnails, the reduced frames are also saved, so that reading them again only decodes the small ones.
+        This is a single-scale cache, not a pyramid: a frame is saved at the scale it was decoded at for the sizes read
+        (one directory per scale), and a read takes the smallest saved scale still larger than its size.
+        Thumbnails are PNGs, so a thumbnail gives the same pixels as decoding the frame at its scale again.
+
+        Args:
+        reduced_decode: whether or not to decode JPEGs at a reduced size (if False, frames are fully decoded then resized)
+        thumbnails:     whether or not to keep reduced frames on disk
+        thumbnail_dir:  where to keep reduced frames, <frame_dir>/<name> is kept as <thumbnail_dir>/<scale>/<name>.png;
+                        if None, as <frame_dir>.thumbnails/<scale>/<name>.png next to the frame directory
+        '''
+        self.reduced_decode = reduced_decode
+        self.thumbnails = thumbnails
+        self.thumbnail_dir = thumbnail_dir
+        self._made_dirs = set()
+        self._lock = threading.Lock()
+        self.stats = {'frames': 0, 'reduced_decodes': 0, 'thumbnail_hits': 0, 'thumbnails_written': 0}
+
+    def read(self, img_path:str, size=None):
+        '''
+        Read a frame, resized to size (w, h) if given
+
+        Returns:
+        frame (np.array): the frame
+        shape (tuple):    (h, w) of the original frame
+        '''
+        if size is None or not self.reduced_decode:
+            frame = self.__decode_file(img_path)
+            shape = frame.shape[:2]
+            self.__count('frames')
+            return (frame if size is None else cv2.resize(frame, size)), shape
+
+        if self.thumbnails:
+            frame, shape = self.__read_thumbnail(img_path, size)
+            if frame is not None:
+                self.__count('frames')
+                self.__count('thumbnail_hits')
+                return self.__fit(frame, size), shape
+
+        buf = np.fromfile(img_path, dtype=np.uint8)
+        shape = jpeg_size(buf)
+        scale = 1 if shape is None else reduced_scale(shape[0], shape[1], size)
+        if scale==1:
+            frame = cv2.imdecode(buf, -1)
+            shape = frame.shape[:2]
+        else:
+            frame = cv2.imdecode(buf, REDUCED_FLAGS[scale])
+            self.__count('reduced_decodes')
+            if self.thumbnails:
+                self.__write_thumbnail(img_path, scale, frame)
+        self.__count('frames')
+        return self.__fit(frame, size), shape
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats)
+
+    def thumbnail_path(self, img_path:str, scale:int):
+        frame_dir, name = os.path.split(os.path.abspath(img_path))
+        if self.thumbnail_dir is None:
+            return os.path.join(frame_dir+'.thumbnails', str(scale), name+'.png')
+        return os.path.join(self.thumbnail_dir, str(scale), name+'.png')
+
+    def __fit(self, frame, size:tuple):
+        if (frame.shape[1], frame.shape[0])==tuple(size):
+            return frame
+        return cv2.resize(frame, size)
+
+    def __decode_file(self, img_path:str):
+        # To read files with Chinese characters
+        return cv2.imdecode(np.fromfile(img_path, dtype=np.uint8), -1)
+
+    def __read_thumbnail(self, img_path:str, size:tuple):
+        '''
+        Read the smallest saved thumbnail that is still larger than size, (None, None) if there is none
+        '''
+        with open(img_path, 'rb') as f:
+            # only the header of the frame is read, for its size
+            shape = jpeg_size(f.read(65536))
+            if shape is None:
+                shape = jpeg_size(f.read())
+        if shape is None:
+            return None, None
+        mtime = int(os.stat(img_path).st_mtime)
+        scale = reduced_scale(shape[0], shape[1], size)
+        while scale>1:
+            thumbnail_path = self.thumbnail_path(img_path, scale)
+            try:
+                valid = int(os.stat(thumbnail_path).st_mtime)==mtime
+            except FileNotFoundError:
+                valid = False
+            if valid:
+                return self.__decode_file(thumbnail_path), shape
+            scale //= 2
+        return None, None
+
+    def __write_thumbnail(self, img_path:str, scale:int, frame):
+        thumbnail_path = self.thumbnail_path(img_path, scale)
+        thumbnail_dir = os.path.dirname(thumbnail_path)
+        if not thumbnail_dir in self._made_dirs:
+            os.makedirs(thumbnail_dir, exist_ok=True)
+            self._made_dirs.add(thumbnail_dir)
+        # Write to a temporary file first, so that other threads never read a partial thumbnail
+        tmp_path = '%s.%d.part'%(thumbnail_path, threading.get_ident())
+        try:
+            with open(tmp_path, 'wb') as f:
+                # lossless, a fast compression level as thumbnails are written while frames are shown
+                f.write(cv2.imencode('.png', frame, [cv2.IMWRITE_PNG_COMPRESSION, 1])[1].tobytes())
+            mtime = int(os.stat(img_path).st_mtime)
+            os.utime(tmp_path, (mtime, mtime)) # keep the mtime of the frame to validate the thumbnail later
+            os.replace(tmp_path, thumbnail_path)
+            self.__count('thumbnails_written')
+        except OSError as e:
+            print("[WARNING] Can not write the thumbnail %s (%s)."%(thumbnail_path, e))
+
+    def __count(self, key:str):
+        with self._lock:
+            self.stats[key] += 1
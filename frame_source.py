@@ -0,0 +1,187 @@
+import os
+import threading
+
+import cv2
+
+from frame_reader import FrameReader, jpeg_size
+
+class FrameSource:
+    '''
+    Where frames come from, frames are numbered by frameID (starting from 1, as extracted by utils.frame_extraction).
+    parallel_reads tells whether reading frames from several threads at once is faster than from one thread.
+    '''
+    parallel_reads = True
+
+    def frame_ids(self):
+        '''
+        Returns:
+        frameIDs (list): all frameIDs of the source, in ascending order
+        '''
+        raise NotImplementedError
+
+    def frame_size(self):
+        '''
+        Returns:
+        shape (tuple): (h, w) of the frames
+        '''
+        raise NotImplementedError
+
+    def read(self, frameID:int, size=None):
+        '''
+        Read a frame, resized to size (w, h) if given
+
+        Returns:
+        frame (np.array): the frame
+        shape (tuple):    (h, w) of the original frame
+        '''
+        raise NotImplementedError
+
+    def get_stats(self):
+        return {}
+
+    def close(self):
+        pass
+
+class JpegDirSource(FrameSource):
+    def __init__(self, frame_dir:str, frame_reader=None):
+        '''
+        Frames extracted as <frame_dir>/%06d.jpg
+
+        Args:
+        frame_dir:      the directory of frames
+        frame_reader:   the FrameReader decoding frames (by default, JPEGs are decoded at a reduced size when resized)
+        '''
+        self.frame_dir = frame_dir
+        self.frame_reader = FrameReader() if frame_reader is None else frame_reader
+        self.remote_store = None
+
+    def set_remote(self, remote_store):
+        '''
+        Fetch frames by a RemoteFrameStore (which downloads into frame_dir) before reading them
+        '''
+        self.remote_store = remote_store
+
+    def frame_path(self, frameID:int):
+        if self.remote_store is not None:
+            # Download frame to local, unless it is already there (it is kept there until release_frame)
+            return self.remote_store.fetch(frameID)
+        return '%s/%06d.jpg'%(self.frame_dir, frameID)
+
+    def release_frame(self, frameID:int):
+        if self.remote_store is not None:
+            self.remote_store.release(frameID)
+
+    def frame_ids(self):
+        frameIDs = [int(f[:-4]) for f in os.listdir(self.frame_dir) if f[-4:]=='.jpg' and f[:-4].isdigit()]
+        return sorted(frameIDs)
+
+    def frame_size(self):
+        frameID = self.frame_ids()[0]
+        frame_path = self.frame_path(frameID)
+        try:
+            with open(frame_path, 'rb') as f:
+                shape = jpeg_size(f.read(65536))
+            if shape is None:
+                _, shape = self.frame_reader.read(frame_path)
+        finally:
+            self.release_frame(frameID)
+        return shape
+
+    def read(self, frameID:int, size=None):
+        frame_path = self.frame_path(frameID)
+        try:
+            return self.frame_reader.read(frame_path, size)
+        finally:
+            self.release_frame(frameID)
+
+    def get_stats(self):
+        return self.frame_reader.get_stats()
+
+class VideoSource(FrameSource):
+    parallel_reads = False
+
+    def __init__(self, video_path:str, fps=-1, seek_threshold=64):
+        '''
+        Frames decoded directly from a video file, without extracting them.
+        Frames are decoded in order, a frame ahead of the last read one is reached by skipping the frames in between,
+        a seek (which decodes from the keyframe before the frame) is only done for frames behind
+        or more than seek_threshold frames ahead. So reading frames in ascending order decodes every frame once.
+
+        Args:
+        video_path:     the path of the video
+        fps:            the frame rate the frameIDs are counted at, as by utils.frame_extraction (frameID n is the frame nearest to (n-1)/fps seconds);
+                        if fps=-1, frameID n is the n-th frame of the video
+        seek_threshold: the largest number of frames skipped by decoding rather than seeking,
+                        about half of the keyframe interval of the video is a good value
+        '''
+        self.video_path = video_path
+        self._cap = cv2.VideoCapture(video_path)
+        assert self._cap.isOpened(), "Can not open the video %s"%video_path
+        self.video_fps = self._cap.get(cv2.CAP_PROP_FPS)
+        self.fps = self.video_fps if fps<0 else fps
+        self.seek_threshold = seek_threshold
+        self.num_frames = int(self._cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self._shape = (int(self._cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(self._cap.get(cv2.CAP_PROP_FRAME_WIDTH)))
+
+        self._pos = 0 # index of the next frame the decoder gives
+        self._lock = threading.Lock()
+        # frames_skipped counts frames decoded but not read, on the way to a frame ahead
+        self.stats = {'frames': 0, 'seeks': 0, 'frames_skipped': 0}
+
+    def frame_index(self, frameID:int):
+        '''
+        Get the index (from 0) of a frameID in the video
+        '''
+        if self.fps==self.video_fps:
+            return frameID-1
+        return int(round((frameID-1)*self.video_fps/self.fps))
+
+    def frame_ids(self):
+        if self.fps==self.video_fps:
+            return list(range(1, self.num_frames+1))
+        return list(range(1, int(self.num_frames*self.fps/self.video_fps)+1))
+
+    def frame_size(self):
+        return self._shape
+
+    def read(self, frameID:int, size=None):
+        index = self.frame_index(frameID)
+        with self._lock:
+            if index<self._pos or index-self._pos>self.seek_threshold:
+                self._cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+                self._pos = index
+                self.stats['seeks'] += 1
+            while self._pos<index:
+                # grab decodes without converting the frame
+                self._cap.grab()
+                self._pos += 1
+                self.stats['frames_skipped'] += 1
+            success, frame = self._cap.read()
+            assert success, "Can not read frame %d of the video %s"%(frameID, self.video_path)
+            self._pos += 1
+            self.stats['frames'] += 1
+        shape = frame.shape[:2]
+        return (frame if size is None else cv2.resize(frame, size)), shape
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats)
+
+    def close(self):
+        with self._lock:
+            self._cap.release()
+
+def open_frame_source(frames, frame_reader=None, **kwargs):
+    '''
+    Get the FrameSource of frames, which is either a FrameSource, a video file, or a directory of %06d.jpg frames
+
+    Args:
+    frames:         a FrameSource, the path of a video, or the path of a frame directory
+    frame_reader:   the FrameReader of a frame directory
+    kwargs:         arguments of VideoSource for a video
+    '''
+    if isinstance(frames, FrameSource):
+        return frames
+    if os.path.isfile(frames):
+        return VideoSource(frames, **kwargs)
+    return JpegDirSource(frames, frame_reader)
@@ -0,0 +1,110 @@
+import bisect
+
+import numpy as np
+
+class IntervalSet:
+    def __init__(self, intervals=()):
+        '''
+        A set of frames kept as sorted, disjoint intervals [start, end] (both included),
+        overlapping or adjacent intervals are merged when added
+
+        Args:
+        intervals:  (start, end) pairs to start with
+        '''
+        self.starts = []
+        self.ends = []
+        for start, end in intervals:
+            self.add(start, end)
+
+    def add(self, start:int, end:int):
+        # intervals i ... j-1 overlap with or touch [start, end]
+        i = bisect.bisect_left(self.ends, start-1)
+        j = bisect.bisect_right(self.starts, end+1)
+        if i<j:
+            start, end = min(start, self.starts[i]), max(end, self.ends[j-1])
+        self.starts[i:j] = [int(start)]
+        self.ends[i:j] = [int(end)]
+
+    def contains(self, frames:np.ndarray):
+        '''
+        Returns:
+        mask (np.array): whether each of frames is in the set
+        '''
+        frames = np.asarray(frames)
+        if len(self.starts)==0:
+            return np.zeros(frames.shape, dtype=bool)
+        i = np.searchsorted(self.starts, frames, side='right')-1
+        return (i>=0) & (frames<=np.asarray(self.ends)[np.maximum(i, 0)])
+
+    def to_list(self):
+        return [[start, end] for start, end in zip(self.starts, self.ends)]
+
+    def __iter__(self):
+        return iter(zip(self.starts, self.ends))
+
+    def __len__(self):
+        return len(self.starts)
+
+def interpolate_tracks(tracks:list, max_gap=None, smooth_window=0):
+    '''
+    Fill the frames between tracked heads, for all tracks at once (on a tracks x frames array).
+    A missing frame is linearly interpolated (by frame distance) between the tracked heads before and after it,
+    frames after the last tracked head keep its box, frames before the first tracked head stay NaN.
+
+    Args:
+    tracks:         dictionaries with 'frame_ids' and 'boxes' (N x 4) of the tracked heads, 'start_frame' and 'end_frame' (the frames [start_frame, end_frame)
+                    of the track) and 'skipped' (an IntervalSet of frames left out of the track)
+    max_gap:        gaps of more than max_gap missing frames are not filled (None to fill all gaps)
+    smooth_window:  the width (in frames) of a centered moving average over the filled boxes (0 or 1 for no smoothing)
+
+    Returns:
+    results (list): (frame_ids, boxes) of every track, all frames of the track except skipped ones, boxes of frames not filled are NaN
+    '''
+    if len(tracks)==0:
+        return []
+    first = min(track['start_frame'] for track in tracks)
+    frames = np.arange(first, max(track['end_frame'] for track in tracks))
+    values = np.full((len(tracks), len(frames), 4), np.nan)
+    kept = np.zeros((len(tracks), len(frames)), dtype=bool)
+    for t, track in enumerate(tracks):
+        values[t, np.asarray(track['frame_ids'], dtype=int)-first] = track['boxes']
+        kept[t] = (frames>=track['start_frame']) & (frames<track['end_frame']) & ~track['skipped'].contains(frames)
+    values[~kept] = np.nan
+
+    filled = _fill_gaps(values, max_gap)
+    if smooth_window>1:
+        filled = _smooth(filled, smooth_window)
+    return [(frames[kept[t]], filled[t, kept[t]]) for t in range(len(tracks))]
+
+def _fill_gaps(values:np.ndarray, max_gap):
+    n_frames = values.shape[1]
+    positions = np.arange(n_frames)
+    known = ~np.isnan(values[:, :, 0])
+    # the nearest known frame before (or at) and after (or at) every frame, -1 and n_frames if there is none
+    before = np.maximum.accumulate(np.where(known, positions, -1), axis=1)
+    after = np.minimum.accumulate(np.where(known, positions, n_frames)[:, ::-1], axis=1)[:, ::-1]
+
+    inner = (before>=0) & (after<n_frames)
+    trailing = (before>=0) & (after==n_frames)
+    if max_gap is not None:
+        inner &= after-before-1<=max_gap
+        trailing &= positions-before<=max_gap
+
+    before_values = np.take_along_axis(values, np.maximum(before, 0)[:, :, None], axis=1)
+    after_values = np.take_along_axis(values, np.minimum(after, n_frames-1)[:, :, None], axis=1)
+    weights = ((positions-before)/np.maximum(after-before, 1))[:, :, None]
+    filled = np.where(inner[:, :, None], before_values+(after_values-before_values)*weights, np.nan)
+    return np.where(trailing[:, :, None], before_values, filled)
+
+def _smooth(values:np.ndarray, window:int):
+    n_frames = values.shape[1]
+    valid = ~np.isnan(values[:, :, 0])
+    # moving sums by differences of cumulative sums, over the valid frames of each window
+    sums = np.cumsum(np.pad(np.where(valid[:, :, None], values, 0.0), ((0, 0), (1, 0), (0, 0))), axis=1)
+    counts = np.cumsum(np.pad(valid, ((0, 0), (1, 0))), axis=1)
+    positions = np.arange(n_frames)
+    left = np.clip(positions-window//2, 0, n_frames)
+    right = np.clip(positions+(window-window//2), 0, n_frames)
+    window_counts = counts[:, right]-counts[:, left]
+    smoothed = (sums[:, right]-sums[:, left])/np.maximum(window_counts, 1)[:, :, None]
+    return np.where(valid[:, :, None], smoothed, np.nan)
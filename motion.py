@@ -0,0 +1,121 @@
+import numpy as np
+
+class ConstantVelocityModel:
+    def __init__(self, smoothing=0.2, max_frames=15):
+        '''
+        Predict the box of a head from its last tracked box and its velocity (of the centre and the size, per frame),
+        the velocity is an exponential moving average of the movements between tracked boxes
+
+        Args:
+        smoothing:  the weight of the last movement in the velocity (1 for the last movement only)
+        max_frames: a head is not predicted further than max_frames after its last box,
+                    and the velocity starts again from 0 after a gap of more than max_frames
+        '''
+        self.smoothing = smoothing
+        self.max_frames = max_frames
+        self.frameID = None
+        self.state = None   # cx, cy, w, h of the last box
+        self.velocity = None
+
+    def update(self, frameID:int, box:list):
+        '''
+        Take box (xmin, ymin, xmax, ymax) as the head at frameID
+        '''
+        state = to_state(box)
+        dt = None if self.frameID is None else frameID-self.frameID
+        if dt is None or dt<=0 or dt>self.max_frames:
+            self.velocity = np.zeros(4)
+        else:
+            self.velocity = self.smoothing*(state-self.state)/dt+(1-self.smoothing)*self.velocity
+        self.frameID = frameID
+        self.state = state
+
+    def predict(self, frameID:int):
+        '''
+        Returns:
+        box (list): the predicted box (xmin, ymin, xmax, ymax) of the head at frameID
+        '''
+        dt = min(max(frameID-self.frameID, 0), self.max_frames)
+        return to_box(self.state+self.velocity*dt, self.state)
+
+class KalmanBoxModel:
+    def __init__(self, position_noise=1/20, velocity_noise=1/40, measurement_noise=1/20, max_frames=15):
+        '''
+        Predict the box of a head with a Kalman filter over the centre and the size of the box and their velocities
+        (a constant velocity model), the noises are relative to the size of the box as in SORT/DeepSORT,
+        with a larger velocity noise for heads turning fast
+
+        Args:
+        position_noise:     the standard deviation of the change of the centre and size per frame, over the size
+        velocity_noise:     the standard deviation of the change of the velocity per frame, over the size
+        measurement_noise:  the standard deviation of the detected boxes, over the size
+        max_frames:         a head is not predicted further than max_frames after its last box,
+                            and the filter starts again after a gap of more than max_frames
+        '''
+        self.position_noise = position_noise
+        self.velocity_noise = velocity_noise
+        self.measurement_noise = measurement_noise
+        self.max_frames = max_frames
+        self.frameID = None
+        self.mean = None        # cx, cy, w, h and their velocities
+        self.covariance = None
+
+    def update(self, frameID:int, box:list):
+        '''
+        Take box (xmin, ymin, xmax, ymax) as the head at frameID
+        '''
+        measurement = to_state(box)
+        scale = np.tile(measurement[2:], 2) # w, h, w, h
+        dt = None if self.frameID is None else frameID-self.frameID
+        if dt is None or dt<=0 or dt>self.max_frames:
+            self.mean = np.r_[measurement, np.zeros(4)]
+            self.covariance = np.diag(np.r_[2*self.position_noise*scale, 10*self.velocity_noise*scale]**2)
+        else:
+            mean, covariance = self.__predict(dt, scale)
+            innovation_cov = covariance[:4, :4]+np.diag((self.measurement_noise*scale)**2)
+            gain = np.linalg.solve(innovation_cov, covariance[:4, :]).T
+            self.mean = mean+gain@(measurement-mean[:4])
+            self.covariance = covariance-gain@covariance[:4, :]
+        self.frameID = frameID
+
+    def predict(self, frameID:int):
+        '''
+        Returns:
+        box (list): the predicted box (xmin, ymin, xmax, ymax) of the head at frameID
+        '''
+        dt = min(max(frameID-self.frameID, 0), self.max_frames)
+        return to_box(self.mean[:4]+self.mean[4:]*dt, self.mean[:4])
+
+    def __predict(self, dt:int, scale:np.ndarray):
+        transition = np.eye(8)
+        transition[:4, 4:] = dt*np.eye(4)
+        noise = np.diag(np.r_[self.position_noise*scale, self.velocity_noise*scale]**2)*dt
+        return transition@self.mean, transition@self.covariance@transition.T+noise
+
+MOTION_MODELS = {'velocity': ConstantVelocityModel, 'kalman': KalmanBoxModel}
+
+def make_motion_model(motion_model):
+    '''
+    Args:
+    motion_model:   a name of MOTION_MODELS ('velocity' or 'kalman'), or a function returning a new model
+                    (with update(frameID, box) and predict(frameID)); None for no model
+
+    Returns:
+    model: a new motion model, None if motion_model is None
+    '''
+    if motion_model is None:
+        return None
+    if isinstance(motion_model, str):
+        if not motion_model in MOTION_MODELS:
+            raise ValueError("Unknown motion model %s, expected one of %s"%(motion_model, list(MOTION_MODELS)))
+        return MOTION_MODELS[motion_model]()
+    return motion_model()
+
+def to_state(box:list):
+    xmin, ymin, xmax, ymax = box
+    return np.array([(xmin+xmax)/2, (ymin+ymax)/2, xmax-xmin, ymax-ymin], dtype=float)
+
+def to_box(state:np.ndarray, last_state:np.ndarray):
+    # a predicted box does not shrink below half of the last box, nor grow beyond twice of it
+    w, h = np.clip(state[2:], last_state[2:]/2, last_state[2:]*2)
+    return [state[0]-w/2, state[1]-h/2, state[0]+w/2, state[1]+h/2]
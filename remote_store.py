@@ -0,0 +1,297 @@
+import os
+import queue
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import paramiko
+
+class LocalDirBackend:
+    def __init__(self, root:str):
+        '''
+        A local stand-in of a remote frame directory, to test and measure the frame store without the remote host
+        Args:
+        root: the directory holding frames
+        '''
+        self.root = root
+
+    def listdir_attr(self):
+        '''
+        Returns:
+        attrs (dict): file name -> (size, mtime) of all files in the directory
+        '''
+        attrs = {}
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                st = entry.stat()
+                attrs[entry.name] = (st.st_size, int(st.st_mtime))
+        return attrs
+
+    def stat(self, name:str):
+        st = os.stat(os.path.join(self.root, name))
+        return st.st_size, int(st.st_mtime)
+
+    def get(self, name:str, local_path:str):
+        shutil.copyfile(os.path.join(self.root, name), local_path)
+
+    def close(self):
+        pass
+
+class SFTPBackend:
+    def __init__(self, sftp, root:str, num_channels=4):
+        '''
+        A pool of SFTP channels opened on the transport of a given SFTP client
+        Args:
+        sftp:           a connected paramiko.SFTPClient
+        root:           the remote directory holding frames
+        num_channels:   the number of SFTP channels, each of them serves one download at a time
+        '''
+        self.root = root
+        self._sftp = sftp
+        self._channels = queue.Queue()
+        self._channels.put(sftp)
+        self._own_channels = []
+        transport = sftp.get_channel().get_transport()
+        for _ in range(num_channels-1):
+            try:
+                channel = paramiko.SFTPClient.from_transport(transport)
+            except paramiko.SSHException as e:
+                print("[WARNING] Can not open more SFTP channels (%s), using %d channel(s)."%(e, self._channels.qsize()))
+                break
+            self._channels.put(channel)
+            self._own_channels.append(channel)
+
+    def _checkout(self):
+        return self._channels.get()
+
+    def _checkin(self, sftp):
+        self._channels.put(sftp)
+
+    def listdir_attr(self):
+        sftp = self._checkout()
+        try:
+            return {attr.filename: (attr.st_size, int(attr.st_mtime)) for attr in sftp.listdir_attr(self.root)}
+        finally:
+            self._checkin(sftp)
+
+    def stat(self, name:str):
+        sftp = self._checkout()
+        try:
+            st = sftp.stat('%s/%s'%(self.root, name))
+            return st.st_size, int(st.st_mtime)
+        finally:
+            self._checkin(sftp)
+
+    def get(self, name:str, local_path:str):
+        sftp = self._checkout()
+        try:
+            # paramiko pipelines the read requests of one file (prefetch)
+            sftp.get('%s/%s'%(self.root, name), local_path)
+        finally:
+            self._checkin(sftp)
+
+    def close(self):
+        '''
+        Close the channels opened by the backend (the given SFTP client is left open)
+        '''
+        for channel in self._own_channels:
+            channel.close()
+        self._own_channels = []
+        self._channels = queue.Queue()
+        self._channels.put(self._sftp)
+
+class RemoteFrameStore:
+    def __init__(self, backend, local_dir:str, disk_quota_mb=None, num_workers=4):
+        '''
+        Fetch frames (%06d.jpg) from a remote directory into a local directory.
+        Frames already in the local directory are reused when their size and mtime match the remote ones.
+        When the local frames exceed the disk quota, the least recently used ones are removed,
+        except the frames handed out by fetch, fetch_range or iter_fetch and not released yet.
+
+        Args:
+        backend:        where the frames come from (SFTPBackend, or LocalDirBackend as a local stand-in)
+        local_dir:      the local directory to cache frames
+        disk_quota_mb:  the disk quota of the local directory in MB (None for no limit)
+        num_workers:    the number of concurrent downloads for bulk and pipelined fetching
+        '''
+        self.backend = backend
+        self.local_dir = local_dir
+        self.disk_quota_bytes = None if disk_quota_mb is None else int(disk_quota_mb*1024*1024)
+        os.makedirs(local_dir, exist_ok=True)
+
+        self._remote_attrs = None # file name -> (size, mtime), filled by a directory listing
+        self._local_files = OrderedDict() # file name -> size, in least recently used order
+        self._local_bytes = 0
+        self._pins = {} # file name -> the number of handed out paths not released yet, such files are never evicted
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=num_workers)
+
+        # download_seconds sums the time of every download, wall_seconds the elapsed time of bulk fetching
+        self.stats = {'files_downloaded': 0, 'bytes_downloaded': 0, 'cache_hits': 0, 'download_seconds': 0.0, 'wall_seconds': 0.0}
+        self.__scan_local_dir()
+
+    def __scan_local_dir(self):
+        with os.scandir(self.local_dir) as entries:
+            names = sorted(entry.name for entry in entries if entry.name.endswith('.jpg'))
+        for name in names:
+            size = os.path.getsize(os.path.join(self.local_dir, name))
+            self._local_files[name] = size
+            self._local_bytes += size
+
+    def refresh_listing(self):
+        '''
+        List the remote directory once, so that validating cached frames needs no more round trips
+        '''
+        self._remote_attrs = self.backend.listdir_attr()
+
+    def local_path(self, frameID:int):
+        return '%s/%06d.jpg'%(self.local_dir, frameID)
+
+    def fetch(self, frameID:int):
+        '''
+        Make sure a frame is in the local directory, the frame is kept there until release(frameID) is called
+
+        Returns:
+        local_path (str): path to the local frame
+        '''
+        name = '%06d.jpg'%frameID
+        with self._lock:
+            # pinned before the local copy is validated, so that it is not evicted in between
+            self._pins[name] = self._pins.get(name, 0)+1
+        try:
+            return self.__fetch(frameID, name)
+        except BaseException:
+            self.release(frameID)
+            raise
+
+    def release(self, frameID:int):
+        '''
+        Allow a frame handed out by fetch, fetch_range or iter_fetch to be evicted again, once it has been read
+        '''
+        name = '%06d.jpg'%frameID
+        with self._lock:
+            if self._pins.get(name, 0)>1:
+                self._pins[name] -= 1
+            else:
+                self._pins.pop(name, None)
+                # the frames kept beyond the quota while pinned
+                self.__evict()
+
+    def __release_fetched(self, frameID:int, future):
+        # a failed fetch has released its frame already
+        if not future.cancelled() and future.exception() is None:
+            self.release(frameID)
+
+    def __fetch(self, frameID:int, name:str):
+        local_path = self.local_path(frameID)
+        if self._remote_attrs is not None and name in self._remote_attrs:
+            remote_size, remote_mtime = self._remote_attrs[name]
+        else:
+            remote_size, remote_mtime = self.backend.stat(name)
+
+        if self.__is_valid(local_path, remote_size, remote_mtime):
+            with self._lock:
+                self.stats['cache_hits'] += 1
+                if name in self._local_files:
+                    self._local_files.move_to_end(name)
+            return local_path
+
+        start = time.time()
+        tmp_path = '%s.%d.part'%(local_path, threading.get_ident())
+        self.backend.get(name, tmp_path)
+        os.utime(tmp_path, (time.time(), remote_mtime)) # keep remote mtime to validate the local copy later
+        os.replace(tmp_path, local_path)
+        with self._lock:
+            self.stats['files_downloaded'] += 1
+            self.stats['bytes_downloaded'] += remote_size
+            self.stats['download_seconds'] += time.time()-start
+            self._local_bytes += remote_size-self._local_files.pop(name, 0)
+            self._local_files[name] = remote_size
+            self.__evict()
+        return local_path
+
+    def fetch_range(self, start_frame:int, end_frame:int):
+        '''
+        Fetch frames start_frame ... end_frame-1 concurrently, each of them is to be released once read
+
+        Returns:
+        local_paths (list): paths to the local frames
+        '''
+        start = time.time()
+        if self._remote_attrs is None:
+            self.refresh_listing()
+        local_paths = list(self._pool.map(self.fetch, range(start_frame, end_frame)))
+        with self._lock:
+            self.stats['wall_seconds'] += time.time()-start
+        return local_paths
+
+    def iter_fetch(self, frameIDs:list, window=16):
+        '''
+        Fetch frames with up to window downloads in flight, yielding (frameID, local_path) in order,
+        each yielded frame is to be released once read
+        '''
+        start = time.time()
+        in_flight = OrderedDict()
+        try:
+            for frameID in frameIDs:
+                in_flight[frameID] = self._pool.submit(self.fetch, frameID)
+                if len(in_flight)>=window:
+                    first, future = in_flight.popitem(last=False)
+                    yield first, future.result()
+            while in_flight:
+                first, future = in_flight.popitem(last=False)
+                yield first, future.result()
+        finally:
+            # frames fetched but never yielded (when the iteration is stopped early) are released
+            for frameID, future in in_flight.items():
+                future.add_done_callback(partial(self.__release_fetched, frameID))
+            with self._lock:
+                self.stats['wall_seconds'] += time.time()-start
+
+    def get_stats(self):
+        '''
+        Returns:
+        stats (dict): downloaded files and bytes, cache hits, time spent and throughput (MB/s) of downloads
+        '''
+        with self._lock:
+            stats = dict(self.stats)
+        seconds = stats['wall_seconds'] if stats['wall_seconds']>0 else stats['download_seconds']
+        stats['throughput_mb_s'] = stats['bytes_downloaded']/1024/1024/seconds if seconds>0 else 0.0
+        return stats
+
+    def close(self):
+        '''
+        Stop the download threads (the backend is left open, it may be shared by other stores)
+        '''
+        self._pool.shutdown(wait=True)
+
+    def __is_valid(self, local_path:str, remote_size:int, remote_mtime:int):
+        try:
+            st = os.stat(local_path)
+        except FileNotFoundError:
+            return False
+        return st.st_size==remote_size and int(st.st_mtime)==remote_mtime
+
+    def __evict(self):
+        # Called with self._lock held
+        if self.disk_quota_bytes is None or self._local_bytes<=self.disk_quota_bytes:
+            return
+        # the least recently used files first, skipping the pinned ones
+        excess = self._local_bytes-self.disk_quota_bytes
+        evicted = []
+        for name, size in self._local_files.items():
+            if excess<=0:
+                break
+            if name in self._pins:
+                continue
+            evicted.append(name)
+            excess -= size
+        for name in evicted:
+            try:
+                os.remove(os.path.join(self.local_dir, name))
+            except FileNotFoundError:
+                pass
+            self._local_bytes -= self._local_files.pop(name)
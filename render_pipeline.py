@@ -0,0 +1,84 @@
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+class RenderPipeline:
+    def __init__(self, read, draw, write, num_decoders=4, num_drawers=2, max_in_flight=32):
+        '''
+        Render frames in three stages: read (read, decode and resize), draw (overlays) and write.
+        Reading and drawing run on thread pools (OpenCV releases the GIL while decoding, resizing and drawing),
+        writing runs on the calling thread in the order of the items.
+
+        Args:
+        read:           function(item) -> frame
+        draw:           function(item, frame) -> result
+        write:          function(item, result), called in the order of the items
+        num_decoders:   the number of threads reading frames
+        num_drawers:    the number of threads drawing on frames
+        max_in_flight:  the number of frames read or drawn ahead of the writer (bounds the memory)
+        '''
+        self.read = read
+        self.draw = draw
+        self.write = write
+        self.num_decoders = num_decoders
+        self.num_drawers = num_drawers
+        self.max_in_flight = max_in_flight
+
+        self._lock = threading.Lock()
+        # *_seconds sum the time spent in every stage over all its threads, wall_seconds the elapsed time of run
+        self.stats = {'frames': 0, 'read_seconds': 0.0, 'draw_seconds': 0.0, 'write_seconds': 0.0, 'wall_seconds': 0.0}
+
+    def run(self, items):
+        '''
+        Render all items, returns when all of them are written
+        '''
+        start = time.time()
+        in_flight = deque()
+        with ThreadPoolExecutor(max_workers=self.num_decoders) as decoders, \
+             ThreadPoolExecutor(max_workers=self.num_drawers) as drawers:
+            for item in items:
+                in_flight.append((item, drawers.submit(self._draw, item, decoders.submit(self._read, item))))
+                if len(in_flight)>=self.max_in_flight:
+                    self._write(*in_flight.popleft())
+            while in_flight:
+                self._write(*in_flight.popleft())
+        with self._lock:
+            self.stats['wall_seconds'] += time.time()-start
+        return self.get_stats()
+
+    def get_stats(self):
+        '''
+        Returns:
+        stats (dict): frames rendered, time spent in each stage, and throughput (frames per second) of the pipeline and of each stage
+        '''
+        with self._lock:
+            stats = dict(self.stats)
+        for stage, workers in [('read', self.num_decoders), ('draw', self.num_drawers), ('write', 1)]:
+            seconds = stats['%s_seconds'%stage]/workers
+            stats['%s_fps'%stage] = stats['frames']/seconds if seconds>0 else 0.0
+        stats['fps'] = stats['frames']/stats['wall_seconds'] if stats['wall_seconds']>0 else 0.0
+        return stats
+
+    def _read(self, item):
+        start = time.time()
+        frame = self.read(item)
+        with self._lock:
+            self.stats['read_seconds'] += time.time()-start
+        return frame
+
+    def _draw(self, item, frame_future):
+        frame = frame_future.result()
+        start = time.time()
+        result = self.draw(item, frame)
+        with self._lock:
+            self.stats['draw_seconds'] += time.time()-start
+        return result
+
+    def _write(self, item, result_future):
+        result = result_future.result()
+        start = time.time()
+        self.write(item, result)
+        with self._lock:
+            self.stats['write_seconds'] += time.time()-start
+            self.stats['frames'] += 1
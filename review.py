@@ -0,0 +1,250 @@
+import queue
+import tkinter as tk
+from concurrent.futures import Future
+
+import numpy as np
+import cv2
+
+class PopupWindow:
+    def __init__(self, img_array:np.array, stage: str, person_name:str):
+        '''
+        Show the window with an image and a question.
+
+        Args:
+        img_array (np.array): The image to show (please not in cv2 format)
+        stage (str): The stage the pop-up window occurs
+        person_name (str): The target person to classify
+
+        Returns:
+        decision (str): a decision based on the show up image
+        '''
+        self.result = None
+        cv2.namedWindow('img',cv2.WINDOW_NORMAL)
+        cv2.resizeWindow('img', 800, 600)
+        cv2.imshow('img',img_array)
+        # Create Window
+        self.master = tk.Tk() 
+        self.master.geometry("700x440")
+
+        # Load the image
+        #img_pil = Image.fromarray(cv2.cvtColor(img_array, cv2.COLOR_BGR2RGB))
+        #self.photo = ImageTk.PhotoImage(img_pil)
+
+        self.master.update_idletasks()
+        self.master.geometry(f'+{50}+{50}')
+
+        # Create the widgets
+        #self.label = tk.Label(self.master, image=self.photo)
+        #self.label.grid(row=0, column=0, columnspan=8)
+
+        self.stage_label = tk.Label(self.master, text=stage, fg='black', font=('TkDefaultFont', 10, 'bold'), anchor='w')
+        self.stage_label.grid(row=0, column=0)
+
+        self.message_label = tk.Label(self.master, text='Is this a head annotation on the', anchor='e')
+        self.message_label.grid(row=0, column=1)
+
+        self.person_label = tk.Label(self.master, text=person_name, fg='red', anchor='w')
+        self.person_label.grid(row=0, column=2)
+
+
+        self.yes_button = tk.Button(self.master, text='Yes', command=self.yes)
+        self.yes_button.grid(row=1, column=3)
+        
+        self.no_button = tk.Button(self.master, text='No', command=self.no)
+        self.no_button.grid(row=1, column=4)
+
+
+        self.skip_button = tk.Button(self.master, text='Skip', command=self.skip)
+        self.skip_button.grid(row=1, column=5)
+
+
+        self.terminate_button = tk.Button(self.master, text='Terminate and Drop', command=self.terminate)
+        self.terminate_button.grid(row=1, column=6)
+        cv2.waitKey(0)
+        self.master.mainloop()
+        
+    def yes(self):
+        self.result = 'Yes'
+        self.master.destroy()
+        cv2.destroyAllWindows()
+    def no(self):
+        self.result = 'No'
+        self.master.destroy()
+        cv2.destroyAllWindows()
+    def skip(self):
+        self.result = 'Skip'
+        self.master.destroy()
+        cv2.destroyAllWindows()
+    def terminate(self):
+        self.result = 'Terminate and Drop'
+        self.master.destroy()
+        cv2.destroyAllWindows()
+
+    def get_result(self):
+        return self.result
+
+class ReviewDecision:
+    def __init__(self, action:str, index=None):
+        '''
+        A decision on a ReviewRequest
+        Args:
+        action: 'Yes', 'No', 'Skip' or 'Terminate and Drop'
+        index:  the candidate the action is taken on (for 'Yes', the selected head); None if it is on all candidates
+        '''
+        self.action = action
+        self.index = index
+
+    def __repr__(self):
+        return 'ReviewDecision(%r, %r)'%(self.action, self.index)
+
+class ReviewRequest:
+    def __init__(self, stage:str, personID:str, frameID:int, candidates:list, get_image):
+        '''
+        A pending decision of the tracker
+        Args:
+        stage:      '[Anchor Setup]' (which candidate is the person) or '[Final Check]' (is the only candidate the person)
+        personID:   the target person
+        frameID:    the frame of the candidates
+        candidates: head boxes to decide on, dictionaries with keys 'frameID', 'xmin', 'ymin', 'xmax', 'ymax'
+        get_image:  a function giving the image of candidate i (only called by front-ends showing images)
+        '''
+        self.stage = stage
+        self.personID = personID
+        self.frameID = frameID
+        self.candidates = candidates
+        self.get_image = get_image
+        self.future = Future()
+
+    def decide(self, decision:ReviewDecision):
+        self.future.set_result(decision)
+
+class ReviewQueue:
+    def __init__(self):
+        '''
+        Pending decisions of the tracker, answered by a review front-end
+        '''
+        self._queue = queue.Queue()
+
+    def submit(self, request:ReviewRequest):
+        self._queue.put(request)
+        return request.future
+
+    def pop(self):
+        '''
+        Get the next pending request, None if there is none
+        '''
+        try:
+            return self._queue.get_nowait()
+        except queue.Empty:
+            return None
+
+    def __len__(self):
+        return self._queue.qsize()
+
+class PopupReviewer:
+    '''
+    Answer requests with one PopupWindow per candidate, until a candidate is accepted
+    '''
+    def serve(self, review_queue:ReviewQueue):
+        request = review_queue.pop()
+        while request is not None:
+            request.decide(self.review(request))
+            request = review_queue.pop()
+
+    def review(self, request:ReviewRequest):
+        for i in range(len(request.candidates)):
+            window = PopupWindow(request.get_image(i), request.stage, request.personID)
+            result = window.get_result()
+            if request.stage=='[Final Check]' or result in ['Yes', 'Skip', 'Terminate and Drop']:
+                return ReviewDecision(result, i)
+        return ReviewDecision('No')
+
+class ScriptedReviewer:
+    def __init__(self, decide):
+        '''
+        Answer requests without any window, for tests and benchmarks
+        Args:
+        decide: a function taking a ReviewRequest and returning a ReviewDecision
+        '''
+        self.decide = decide
+        self.history = [] # (request, decision) in the order of answers
+
+    def serve(self, review_queue:ReviewQueue):
+        request = review_queue.pop()
+        while request is not None:
+            decision = self.decide(request)
+            self.history.append((request, decision))
+            request.decide(decision)
+            request = review_queue.pop()
+
+class ContactSheetReviewer:
+    def __init__(self, tile_width=480, tile_height=270, columns=3, window_name='Review'):
+        '''
+        Answer requests in one persistent window, showing all candidates of a request at once.
+        Keys for [Anchor Setup]: 1-9 the numbered head is the person, n none of them, s skip, t terminate and drop,
+        space next page (when there are more than 9 candidates).
+        Keys for [Final Check]: y yes, n no, t terminate and drop.
+        '''
+        self.tile_width = tile_width
+        self.tile_height = tile_height
+        self.columns = columns
+        self.window_name = window_name
+        self._window_open = False
+
+    def serve(self, review_queue:ReviewQueue):
+        request = review_queue.pop()
+        while request is not None:
+            request.decide(self.review(request, len(review_queue)))
+            request = review_queue.pop()
+
+    def review(self, request:ReviewRequest, n_pending=0):
+        if not self._window_open:
+            cv2.namedWindow(self.window_name, cv2.WINDOW_NORMAL)
+            self._window_open = True
+        page_size = 9
+        page = 0
+        while True:
+            first = page*page_size
+            idxes = list(range(first, min(first+page_size, len(request.candidates))))
+            cv2.imshow(self.window_name, self.__render(request, idxes, n_pending))
+            key = chr(cv2.waitKey(0) & 0xFF).lower()
+            if request.stage=='[Final Check]':
+                if key in ['y', 'n']:
+                    return ReviewDecision({'y': 'Yes', 'n': 'No'}[key], 0)
+                elif key=='t':
+                    return ReviewDecision('Terminate and Drop', 0)
+                continue
+            if key.isdigit() and 0<int(key)<=len(idxes):
+                return ReviewDecision('Yes', idxes[int(key)-1])
+            elif key=='n':
+                return ReviewDecision('No')
+            elif key=='s':
+                return ReviewDecision('Skip')
+            elif key=='t':
+                return ReviewDecision('Terminate and Drop')
+            elif key==' ':
+                page = (page+1) if first+page_size<len(request.candidates) else 0
+
+    def close(self):
+        if self._window_open:
+            cv2.destroyWindow(self.window_name)
+            self._window_open = False
+
+    def __render(self, request:ReviewRequest, idxes:list, n_pending:int):
+        rows = max(1, (len(idxes)+self.columns-1)//self.columns)
+        header_h = 40
+        sheet = np.zeros((header_h+rows*self.tile_height, self.columns*self.tile_width, 3), dtype=np.uint8)
+        if request.stage=='[Final Check]':
+            keys = 'y: yes  n: no  t: terminate'
+        else:
+            keys = '1-%d: this head  n: none  s: skip  t: terminate'%len(idxes)
+        header = '%s %s at frame %d | %s | %d pending'%(request.stage, request.personID, request.frameID, keys, n_pending)
+        cv2.putText(sheet, header, (10, 28), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255,255,255), 1)
+        for k, i in enumerate(idxes):
+            r, c = divmod(k, self.columns)
+            tile = cv2.resize(request.get_image(i), (self.tile_width, self.tile_height))
+            y, x = header_h+r*self.tile_height, c*self.tile_width
+            sheet[y:y+self.tile_height, x:x+self.tile_width] = tile
+            if request.stage!='[Final Check]':
+                cv2.putText(sheet, str(k+1), (x+10, y+40), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0,255,255), 3)
+        return sheet
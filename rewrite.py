@@ -1,19 +1,129 @@
 import os
+import time
+import shutil
+import argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 
-names=['train','val']
-for name in names:
-  txt_list=os.listdir("labels/"+name)
-  for txt in txt_list:
-    full_path=os.path.join("labels/"+name,txt)
-    head_notes=[]
-    with open(full_path,'r') as f:
-      lines=f.readlines()
-    for line in lines:
-      if line[0]=='2':
-        line='0'+line[1:]
-        head_notes.append(line)
-    with open(full_path,'w') as f:
-      for head in head_notes:
-        f.write(head)
-  
-      
+def parse_mapping(items:list):
+    '''
+    Parse a class mapping table, given as items of 'old:new' (rename, 'old:old' to keep) or 'old:drop',
+    or as a file with one 'old new' (or 'old drop') per line
+
+    Returns:
+    mapping (dict): old class -> new class (None to drop)
+    '''
+    mapping = {}
+    for item in items:
+        if os.path.isfile(item):
+            with open(item, 'r') as f:
+                pairs = [line.split() for line in f if line.strip() and not line.startswith('#')]
+        else:
+            pairs = [pair.split(':') for pair in item.split(',')]
+        for old, new in pairs:
+            mapping[int(old)] = None if new.lower()=='drop' else int(new)
+    return mapping
+
+def remap_file(label_path:str, mapping:dict, keep_others=False):
+    '''
+    Remap the classes of a YOLO label file (lines of 'class x y w h'), written through a temporary file and an atomic rename
+
+    Args:
+    label_path:     the label file
+    mapping:        old class -> new class (None to drop)
+    keep_others:    whether or not to keep lines of classes not in mapping (they are dropped by default)
+
+    Returns:
+    before (Counter):   class -> the number of lines before
+    after (Counter):    class -> the number of lines after
+    '''
+    with open(label_path, 'rb') as f:
+        text = f.read()
+    before, after = Counter(), Counter()
+    lines = []
+    # lines keep their own endings (\n or \r\n, none on an unterminated last line), blank lines are kept as they are,
+    # so that a file with nothing to remap is left untouched
+    for line in text.splitlines(keepends=True):
+        token = line.split(maxsplit=1)[0] if line.strip() else None
+        if token is None:
+            lines.append(line)
+            continue
+        try:
+            old = int(token)
+        except ValueError:
+            print("[WARNING] Invalid label line in %s: %s, it is kept."%(label_path, line.strip().decode(errors='replace')))
+            lines.append(line)
+            continue
+        before[old] += 1
+        new = mapping.get(old, old if keep_others else None)
+        if new is None:
+            continue
+        after[new] += 1
+        lines.append(line if new==old else b'%d'%new+line.lstrip()[len(token):])
+
+    new_text = b''.join(lines)
+    if new_text!=text:
+        tmp_path = '%s.%d.tmp'%(label_path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            f.write(new_text)
+            # the new content is on disk before the rename, so that a crash never leaves an empty label file
+            f.flush()
+            os.fsync(f.fileno())
+        shutil.copymode(label_path, tmp_path)
+        os.replace(tmp_path, label_path)
+    return before, after
+
+def _remap_files(label_paths:list, mapping:dict, keep_others:bool):
+    before, after = Counter(), Counter()
+    for label_path in label_paths:
+        file_before, file_after = remap_file(label_path, mapping, keep_others)
+        before.update(file_before)
+        after.update(file_after)
+    return before, after
+
+def remap_labels(label_root:str, mapping:dict, splits=('train', 'val'), keep_others=False, num_workers=4, chunk_size=512):
+    '''
+    Remap classes of all YOLO label files (*.txt) under <label_root>/<split> by processes
+
+    Args:
+    label_root:     the directory of label splits
+    mapping:        old class -> new class (None to drop), see parse_mapping
+    splits:         the sub-directories to remap (None for label_root itself)
+    keep_others:    whether or not to keep lines of classes not in mapping (they are dropped by default)
+    num_workers:    the number of processes
+    chunk_size:     the number of files remapped by a process at a time
+
+    Returns:
+    before (Counter):   class -> the number of labels before
+    after (Counter):    class -> the number of labels after
+    '''
+    start = time.time()
+    label_paths = []
+    for split in (splits if splits else ['']):
+        for root, _, names in os.walk(os.path.join(label_root, split)):
+            label_paths += [os.path.join(root, name) for name in names if name.endswith('.txt')]
+    chunks = [label_paths[i:i+chunk_size] for i in range(0, len(label_paths), chunk_size)]
+
+    before, after = Counter(), Counter()
+    with ProcessPoolExecutor(max_workers=num_workers) as pool:
+        for chunk_before, chunk_after in pool.map(_remap_files, chunks, [mapping]*len(chunks), [keep_others]*len(chunks)):
+            before.update(chunk_before)
+            after.update(chunk_after)
+
+    print("Remapped %d label files in %.1fs"%(len(label_paths), time.time()-start))
+    print("%8s %10s %10s"%('class', 'before', 'after'))
+    for c in sorted(set(before)|set(after)):
+        print("%8d %10d %10d"%(c, before[c], after[c]))
+    return before, after
+
+if __name__=='__main__':
+    parser = argparse.ArgumentParser(description='Remap classes of YOLO label files')
+    parser.add_argument('--labels', default='labels', help='the directory of label splits')
+    parser.add_argument('--splits', nargs='*', default=['train', 'val'])
+    # by default, only heads (class 2) are kept, as class 0
+    parser.add_argument('--mapping', nargs='*', default=['2:0'], help="'old:new' or 'old:drop' items, or files of 'old new' lines")
+    parser.add_argument('--keep-others', action='store_true', help='keep classes not in the mapping (dropped by default)')
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    remap_labels(args.labels, parse_mapping(args.mapping), args.splits, args.keep_others, args.workers)
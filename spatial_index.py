@@ -0,0 +1,69 @@
+import math
+
+import numpy as np
+
+class GridIndex:
+    def __init__(self, frame_ids:np.ndarray, boxes:np.ndarray, grid_size=16):
+        '''
+        A spatial index of detections: every frame is divided into a uniform grid of grid_size x grid_size cells
+        (over the 0-1 coordinates), and every detection is listed under the cell of its top-left corner.
+        All cells are kept in one array sorted by frameID, row and column, built once for all detections,
+        so that the rows of a frame are contiguous. A query looks at the cells where the top-left corner of a box
+        overlapping the region can be, i.e. the region extended up and left by the largest box.
+        The rows of a frame are found in a table of offsets, without a search. A query still costs more than
+        scoring all boxes of a frame with up to about 256 heads (see grid_size of PersonTracker).
+
+        Args:
+        frame_ids:  frameID of every detection (shape: N)
+        boxes:      [xmin, ymin, xmax, ymax] of every detection (shape: N x 4), values normalized in 0-1
+        grid_size:  the number of cells along each side of a frame
+        '''
+        self.grid_size = grid_size
+        frame_ids = np.asarray(frame_ids, dtype=np.int64)
+        boxes = np.asarray(boxes, dtype=float)
+        cells = np.clip(np.floor(boxes[:, :2]*grid_size), 0, grid_size-1).astype(np.int64)
+        keys = (frame_ids*grid_size+cells[:, 1])*grid_size+cells[:, 0]
+        # a stable sort keeps the detections of a cell in ascending order
+        self.idxes = np.argsort(keys, kind='stable')
+        self.keys = keys[self.idxes]
+        self.columns = cells[self.idxes, 0]
+        self.max_frame = int(frame_ids.max(initial=-1))
+        # row_offsets[f*grid_size+y]:row_offsets[f*grid_size+y+1] holds the cells of row y of frame f
+        self.row_offsets = np.searchsorted(self.keys, np.arange((self.max_frame+1)*grid_size+1)*grid_size, side='left')
+        self.max_width = float(np.max(boxes[:, 2]-boxes[:, 0], initial=0))
+        self.max_height = float(np.max(boxes[:, 3]-boxes[:, 1], initial=0))
+
+    def query(self, f:int, regions:list):
+        '''
+        Find the detections at frame f which may overlap with any of the regions
+
+        Args:
+        f:          the frameID
+        regions:    [xmin, ymin, xmax, ymax] of every region
+
+        Returns:
+        idxes (np.array): positions of the detections whose top-left corners are in the cells the regions are looked up in,
+                          in ascending order (a superset of the detections overlapping with the regions)
+        '''
+        if not (0<=f<=self.max_frame and len(regions)>0):
+            return np.array([], dtype=np.int64)
+        grid_size = self.grid_size
+        first_row = int(f)*grid_size
+        found = []
+        for xmin, ymin, xmax, ymax in regions:
+            y0 = min(max(math.floor((ymin-self.max_height)*grid_size), 0), grid_size-1)
+            y1 = min(max(math.floor(ymax*grid_size), 0), grid_size-1)
+            # the rows y0 ... y1 of a frame are contiguous, their cells are then filtered by column
+            start, end = self.row_offsets[first_row+y0], self.row_offsets[first_row+y1+1]
+            if start==end:
+                continue
+            x0, x1 = math.floor((xmin-self.max_width)*grid_size), math.floor(xmax*grid_size)
+            if x0<=0 and x1>=grid_size-1:
+                found.append(self.idxes[start:end])
+            else:
+                columns = self.columns[start:end]
+                found.append(self.idxes[start:end][(columns>=x0) & (columns<=x1)])
+        if len(found)==0:
+            return np.array([], dtype=np.int64)
+        # several regions may look up the same cells
+        return np.sort(found[0]) if len(found)==1 else np.unique(np.concatenate(found))
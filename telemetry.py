@@ -0,0 +1,133 @@
+import json
+import time
+import threading
+
+class Telemetry:
+    enabled = True
+
+    def __init__(self, jsonl_path=None):
+        '''
+        Per-stage timers and counters of a session, and optionally a log of events as JSON lines.
+        All methods are thread-safe (decisions and frames are answered and loaded by other threads).
+
+        Args:
+        jsonl_path: the file to append events to (one JSON object per line), None to keep only the counters and timers
+        '''
+        self.jsonl_path = jsonl_path
+        self._file = open(jsonl_path, 'a', encoding='utf-8') if jsonl_path else None
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.timers = {} # name -> [count, total seconds, max seconds]
+
+    def count(self, name:str, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0)+n
+
+    def add_time(self, name:str, seconds:float):
+        with self._lock:
+            timer = self.timers.get(name)
+            if timer is None:
+                self.timers[name] = [1, seconds, seconds]
+            else:
+                timer[0] += 1
+                timer[1] += seconds
+                timer[2] = max(timer[2], seconds)
+
+    def timer(self, name:str):
+        '''
+        Time a block of code: with telemetry.timer('score'): ...
+        '''
+        return _Timer(self, name)
+
+    def event(self, kind:str, **fields):
+        '''
+        Log an event (with its time) as a JSON line, if there is a jsonl_path
+        '''
+        if self._file is None:
+            return
+        line = json.dumps(dict({'time': time.time(), 'event': kind}, **fields), default=_to_json)
+        with self._lock:
+            self._file.write(line+'\n')
+            self._file.flush()
+
+    def snapshot(self):
+        '''
+        Returns:
+        stats (dict): 'counters' (name -> count) and 'timers' (name -> count, seconds, mean_ms and max_ms)
+        '''
+        with self._lock:
+            counters = dict(self.counters)
+            timers = {name: {'count': count, 'seconds': total, 'mean_ms': total/count*1000, 'max_ms': longest*1000}
+                      for name, (count, total, longest) in self.timers.items()}
+        return {'counters': counters, 'timers': timers}
+
+    def reset(self):
+        with self._lock:
+            self.counters = {}
+            self.timers = {}
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+class NullTelemetry(Telemetry):
+    '''
+    Telemetry that records nothing, every call returns at once
+    '''
+    enabled = False
+
+    def __init__(self):
+        self.jsonl_path = None
+        self.counters = {}
+        self.timers = {}
+
+    def count(self, name:str, n=1):
+        pass
+
+    def add_time(self, name:str, seconds:float):
+        pass
+
+    def timer(self, name:str):
+        return _NULL_TIMER
+
+    def event(self, kind:str, **fields):
+        pass
+
+    def snapshot(self):
+        return {'counters': {}, 'timers': {}}
+
+    def reset(self):
+        pass
+
+    def close(self):
+        pass
+
+class _Timer:
+    def __init__(self, telemetry:Telemetry, name:str):
+        self.telemetry = telemetry
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.telemetry.add_time(self.name, time.perf_counter()-self.start)
+        return False
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+def _to_json(value):
+    # numpy numbers (e.g. frameIDs taken from arrays)
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
@@ -0,0 +1,148 @@
+'''
+Synthetic workloads and a scripted reviewer answering from their ground truth, shared by the tests and benchmark.py
+'''
+import os
+import time
+
+import numpy as np
+import cv2
+
+from review import PopupReviewer, ReviewDecision
+
+
+def make_detections(path:str, n_frames=1000, heads_per_frame=8, jitter=0.004, occlusion=0.01, max_occlusion=15, speed=None, seed=0):
+    '''
+    Write a synthetic raw_detections.txt: heads drifting across the frame with random jitter,
+    each hidden now and then (occluded) for up to max_occlusion frames
+
+    Args:
+    path:               the raw_detections.txt to write
+    n_frames:           the number of frames
+    heads_per_frame:    the number of heads in the scene
+    jitter:             the standard deviation of the per-frame movement of a head (in 0-1 scale)
+    occlusion:          the probability that a visible head gets occluded at a frame
+    max_occlusion:      the longest occlusion (in frames)
+    speed:              the standard deviation of the steady drift of a head per frame (jitter/4 if None),
+                        heads bounce back at the borders of the frame
+    seed:               the random seed
+
+    Returns:
+    heads (np.array):   the head (0 ... heads_per_frame-1) of every line of the file
+    '''
+    rng = np.random.default_rng(seed)
+    size = rng.uniform(0.04, 0.09, heads_per_frame)
+    pos = rng.uniform(0.05, 0.9-size[:, None], (heads_per_frame, 2))
+    velocity = rng.normal(0, jitter/4 if speed is None else speed, (heads_per_frame, 2))
+    occluded_until = np.zeros(heads_per_frame, dtype=int)
+
+    frames, heads, boxes = [], [], []
+    for f in range(1, n_frames+1):
+        pos = pos+velocity+rng.normal(0, jitter, pos.shape)
+        if speed is not None:
+            velocity[(pos<0.0) | (pos>1.0-size[:, None])] *= -1
+        pos = np.clip(pos, 0.0, 1.0-size[:, None])
+        occluding = (occluded_until<f) & (rng.random(heads_per_frame)<occlusion)
+        occluded_until[occluding] = f+rng.integers(0, max_occlusion, occluding.sum())
+        visible = np.flatnonzero(occluded_until<f)
+        frames.append(np.full(len(visible), f))
+        heads.append(visible)
+        boxes.append(np.c_[pos[visible], pos[visible]+size[visible, None]])
+
+    frames, heads, boxes = np.concatenate(frames), np.concatenate(heads), np.concatenate(boxes)
+    rows = np.c_[frames, np.zeros(len(frames)), boxes]
+    np.savetxt(path, rows, fmt=['%d', '%d', '%.6f', '%.6f', '%.6f', '%.6f'], delimiter=',')
+    return heads
+
+def make_frames(frame_dir:str, n_frames=300, width=1920, height=1080, quality=90, seed=0):
+    '''
+    Write synthetic frames as <frame_dir>/%06d.jpg: a textured background panning by a few pixels per frame,
+    so that every frame is different and compresses like a real one
+    '''
+    os.makedirs(frame_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    texture = rng.integers(0, 256, (max(1, height//16), max(1, width//16), 3), dtype=np.uint8)
+    background = cv2.resize(texture, (width+n_frames*2, height), interpolation=cv2.INTER_CUBIC)
+    background = cv2.add(background, rng.integers(0, 24, background.shape, dtype=np.uint8))
+    for f in range(1, n_frames+1):
+        frame = background[:, 2*f:2*f+width]
+        with open(os.path.join(frame_dir, '%06d.jpg'%f), 'wb') as out:
+            out.write(cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes())
+
+def make_cvat(path:str, n_tasks=3, n_tracks=8, n_frames=1000, width=1920, height=1080, seed=0):
+    '''
+    Write a synthetic CVAT export (CVAT for video 1.1) of n_tasks tasks, with n_tracks head tracks
+    and n_tracks gaze tracks per task, annotated on every frame
+    '''
+    rng = np.random.default_rng(seed)
+    with open(path, 'w') as f:
+        f.write('<?xml version="1.0" encoding="utf-8"?>\n<annotations>\n  <version>1.1</version>\n  <meta>\n    <project>\n      <tasks>\n')
+        for t in range(n_tasks):
+            f.write('        <task><id>%d</id><name>task_%d</name><size>%d</size>'
+                    '<original_size><width>%d</width><height>%d</height></original_size><source>video_%d.mp4</source></task>\n'
+                    %(t+1, t, n_frames, width, height, t))
+        f.write('      </tasks>\n    </project>\n  </meta>\n')
+        track_id = 0
+        for t in range(n_tasks):
+            for k in range(n_tracks):
+                xy = rng.uniform(0, 0.9, (n_frames, 2))*[width, height]
+                f.write('  <track id="%d" label="head_%d" source="manual" task_id="%d">\n'%(track_id, k, t+1))
+                f.writelines('    <box frame="%d" keyframe="1" outside="0" occluded="0" xtl="%.2f" ytl="%.2f" xbr="%.2f" ybr="%.2f" z_order="0">\n    </box>\n'
+                             %(i, x, y, x+0.05*width, y+0.05*height) for i, (x, y) in enumerate(xy))
+                f.write('  </track>\n  <track id="%d" label="gaze_%d" source="manual" task_id="%d">\n'%(track_id+1, k, t+1))
+                f.writelines('    <points frame="%d" keyframe="1" outside="0" occluded="0" points="%.2f,%.2f" z_order="0">\n    </points>\n'
+                             %(i, x, y) for i, (x, y) in enumerate(xy[::-1]))
+                f.write('  </track>\n')
+                track_id += 2
+        f.write('</annotations>\n')
+
+class HeadTruth:
+    def __init__(self, frame_ids:np.ndarray, xmins:np.ndarray, heads:np.ndarray):
+        '''
+        The head of every synthetic detection, looked up by frameID and xmin
+        (boxes are loaded as float32, so xmin is matched to the nearest one of the frame)
+        '''
+        order = np.lexsort((xmins, frame_ids))
+        self.frame_ids, self.xmins, self.heads = frame_ids[order], xmins[order], heads[order]
+
+    def head(self, frameID:int, xmin:float):
+        '''
+        Get the head of a detection, None if there is none at (frameID, xmin)
+        '''
+        start, stop = np.searchsorted(self.frame_ids, [frameID, frameID+1])
+        if start==stop:
+            return None
+        i = start+np.argmin(np.abs(self.xmins[start:stop]-xmin))
+        return int(self.heads[i]) if abs(self.xmins[i]-xmin)<1e-5 else None
+
+class ScriptedPopupReviewer(PopupReviewer):
+    def __init__(self, truth:HeadTruth):
+        '''
+        Answer requests as PopupReviewer does, with the PopupWindow replaced by an answer from the ground truth:
+        the images are still fetched (and timed) as for the windows, so the latency of the previews is measured
+
+        Args:
+        truth:  a HeadTruth of the detections, the person 'h<k>' is head k
+        '''
+        self.truth = truth
+        self.image_seconds = [] # time to get the image of every shown candidate (one per window)
+        self.requests = 0
+        self.history = [] # (request, decision) in the order of answers, as review.ScriptedReviewer keeps them
+
+    def review(self, request):
+        self.requests += 1
+        decision = self.__answer(request)
+        self.history.append((request, decision))
+        return decision
+
+    def __answer(self, request):
+        target = int(request.personID[1:])
+        for i, candidate in enumerate(request.candidates):
+            start = time.time()
+            request.get_image(i)
+            self.image_seconds.append(time.time()-start)
+            head = self.truth.head(candidate['frameID'], candidate['xmin'])
+            if request.stage=='[Final Check]':
+                return ReviewDecision('Yes' if head in (target, None) else 'No', i)
+            if head==target:
+                return ReviewDecision('Yes', i)
+        return ReviewDecision('No')
@@ -0,0 +1,71 @@
+import io
+import contextlib
+
+import numpy as np
+import pytest
+
+from PersonTracker import PersonTracker
+from tests.helpers import make_detections, make_frames, HeadTruth, ScriptedPopupReviewer
+
+N_FRAMES = 60
+
+@pytest.fixture(scope='module')
+def video(tmp_path_factory):
+    work_dir = tmp_path_factory.mktemp('video')
+    detection_file = str(work_dir/'raw_detections.txt')
+    heads = make_detections(detection_file, N_FRAMES, heads_per_frame=4, occlusion=0.02, seed=3)
+    make_frames(str(work_dir/'frames'), N_FRAMES, 160, 90)
+    raw = np.loadtxt(detection_file, delimiter=',', ndmin=2)
+    return detection_file, str(work_dir/'frames'), HeadTruth(raw[:, 0].astype(int), raw[:, 2], heads)
+
+def open_session(video, checkpoint_dir):
+    detection_file, frame_dir, truth = video
+    tracker = PersonTracker()
+    tracker.set_reviewer(ScriptedPopupReviewer(truth))
+    tracker.set_checkpoint(checkpoint_dir)
+    tracker.load_from_files(detection_file, frame_dir, use_cache=False)
+    return tracker
+
+def track(tracker, personIDs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        for personID in personIDs:
+            tracker.track_person(personID)
+
+def test_finished_runs_survive_a_restart(video, tmp_path):
+    checkpoint_dir = str(tmp_path/'checkpoint')
+    tracker = open_session(video, checkpoint_dir)
+    track(tracker, ['h0', 'h1'])
+    expected = {personID: tracker.get_person_df(personID) for personID in ['h0', 'h1']}
+    tracker.release()
+
+    # restart: both finished runs come back, and calling them again asks nothing
+    tracker = open_session(video, checkpoint_dir)
+    assert sorted(tracker.get_tracked_person())==['h0', 'h1']
+    track(tracker, ['h0', 'h1'])
+    assert tracker.reviewer.history==[]
+    # a new run does not drop the last finished one
+    track(tracker, ['h2'])
+    assert sorted(tracker.get_tracked_person())==['h0', 'h1', 'h2']
+    tracker.release()
+
+    tracker = open_session(video, checkpoint_dir)
+    assert sorted(tracker.get_tracked_person())==['h0', 'h1', 'h2']
+    for personID, df in expected.items():
+        assert tracker.get_person_df(personID).equals(df)
+    tracker.release()
+
+def test_undo_the_last_decision_of_a_finished_run(video, tmp_path):
+    checkpoint_dir = str(tmp_path/'checkpoint')
+    tracker = open_session(video, checkpoint_dir)
+    track(tracker, ['h0', 'h1'])
+    n_decisions = len([request for request, _ in tracker.reviewer.history if request.personID=='h1'])
+    tracker.undo_decisions(1)
+    assert list(tracker.get_tracked_person())==['h0']
+    tracker.release()
+
+    # the run is replayed up to the undone decision, which is asked again
+    tracker = open_session(video, checkpoint_dir)
+    track(tracker, ['h0', 'h1'])
+    assert len(tracker.reviewer.history)==1 and n_decisions>=1
+    assert sorted(tracker.get_tracked_person())==['h0', 'h1']
+    tracker.release()
@@ -0,0 +1,81 @@
+import io
+import contextlib
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import pandas as pd
+
+from tests.helpers import make_cvat
+from cvat_utils import cvat2dict, save_columns, load_columns
+
+def test_load_columns_maps_the_files(tmp_path):
+    df = pd.DataFrame({'frameID': np.arange(100), 'xmin': np.linspace(0, 1, 100),
+                       'label': pd.Categorical(['head', 'gaze']*50)})
+    path = str(tmp_path/'annotations')
+    save_columns(df, path)
+    loaded = load_columns(path)
+    pd.testing.assert_frame_equal(loaded, df, check_dtype=False)
+    for column in ['frameID', 'xmin']:
+        values = loaded[column].to_numpy()
+        while not isinstance(values, np.memmap) and values.base is not None:
+            values = values.base
+        assert isinstance(values, np.memmap)
+    # writing to the DataFrame leaves the files as they are
+    loaded.loc[0, 'xmin'] = 5.0
+    assert load_columns(path)['xmin'][0]==0.0
+
+def baseline_cvat2dict(cvat_file_path, box_label='head', point_label='gaze'):
+    # the ElementTree converter cvat2dict replaced, with its frame check fixed ('frame in info_dict[task_name]')
+    info_dict = {}
+    root = ET.parse(cvat_file_path).getroot()
+    for task in root.iter(tag='task'):
+        task_name = task.find('name').text
+        task_id = task.find('id').text
+        info_dict[task_name] = {}
+        width = int(task.find('original_size').find('width').text)
+        height = int(task.find('original_size').find('height').text)
+        for tr in root.iterfind(".//track[@task_id='%s']"%task_id):
+            label = tr.get('label')
+            if box_label in label:
+                for head in tr.iter(tag='box'):
+                    frame = int(head.get('frame'))
+                    if not frame in info_dict[task_name]:
+                        info_dict[task_name][frame] = {}
+                    xmin, ymin, xmax, ymax = map(float, [head.get('xtl'), head.get('ytl'), head.get('xbr'), head.get('ybr')])
+                    info_dict[task_name][frame][label] = [xmin/width, ymin/height, xmax/width, ymax/height]
+            elif point_label in label:
+                for point in tr.iter(tag='points'):
+                    frame = int(point.get('frame'))
+                    if not frame in info_dict[task_name]:
+                        info_dict[task_name][frame] = {}
+                    gaze_x, gaze_y = np.array(point.get('points').split(",")).astype(float)
+                    info_dict[task_name][frame][label] = [gaze_x/width, gaze_y/height]
+    return info_dict
+
+def test_cvat2dict_matches_the_element_tree_converter(tmp_path):
+    path = str(tmp_path/'annotations.xml')
+    make_cvat(path, n_tasks=3, n_tracks=4, n_frames=50)
+    with contextlib.redirect_stdout(io.StringIO()):
+        info_dict = cvat2dict(path)
+    expected = baseline_cvat2dict(path)
+    assert info_dict==expected
+    assert list(info_dict)==list(expected)
+    for task_name in expected:
+        assert list(info_dict[task_name])==list(expected[task_name])
+        for frame in expected[task_name]:
+            assert list(info_dict[task_name][frame])==list(expected[task_name][frame])
+
+def test_load_columns_closes_the_npz_file(tmp_path, monkeypatch):
+    df = pd.DataFrame({'frameID': np.arange(10), 'xmin': np.linspace(0, 1, 10),
+                       'label': pd.Categorical(['head', 'gaze']*5)})
+    path = str(tmp_path/'annotations.npz')
+    save_columns(df, path)
+    opened = []
+    load = np.load
+    def recording_load(*args, **kwargs):
+        opened.append(load(*args, **kwargs))
+        return opened[-1]
+    monkeypatch.setattr(np, 'load', recording_load)
+    loaded = load_columns(path)
+    assert len(opened)==1 and opened[0].fid is None
+    pd.testing.assert_frame_equal(loaded, df, check_dtype=False)
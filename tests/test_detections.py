@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+import pandas.testing as pdt
+
+from tests.helpers import make_detections
+from detections import DetectionStore, load_detections, RAW_COLUMNS, BOX_COLUMNS
+
+def test_cached_load_matches_cold_load(tmp_path):
+    detection_file = str(tmp_path/'raw_detections.txt')
+    make_detections(detection_file, 40, heads_per_frame=5, occlusion=0.05, seed=7)
+    # shuffle the rows, so that the csv order differs from the sorted order
+    lines = open(detection_file).read().splitlines()
+    np.random.default_rng(0).shuffle(lines)
+    with open(detection_file, 'w') as f:
+        f.write('\n'.join(lines)+'\n')
+
+    cold = load_detections(detection_file)
+    cached = load_detections(detection_file)
+    assert not isinstance(cold.boxes.base, np.memmap)
+    assert isinstance(cached.boxes.base, np.memmap)
+    cold.claim([0, 3], 'h0')
+    cached.claim([0, 3], 'h0')
+    for idxes in [None, cold.free_mask()]:
+        pdt.assert_frame_equal(cold.to_dataframe(idxes), cached.to_dataframe(idxes))
+
+    # the index is the position after sorting, as the baseline sort_values(...).reset_index(drop=True)
+    raw_df = pd.read_csv(detection_file, names=RAW_COLUMNS)
+    raw_df = raw_df[['frameID']+BOX_COLUMNS].sort_values(by=['frameID', 'xmin']).reset_index(drop=True)
+    df = cached.to_dataframe()
+    assert df.index.equals(raw_df.index)
+    assert (df.frameID.to_numpy()==raw_df.frameID.to_numpy()).all()
+    assert np.allclose(df[BOX_COLUMNS].to_numpy(), raw_df[BOX_COLUMNS].to_numpy(), atol=1e-6)
+
+def make_store(seed=0):
+    # a few frames without detections, and frames with one or many of them
+    rng = np.random.default_rng(seed)
+    frame_ids = np.sort(rng.choice(np.r_[np.arange(2, 20), np.arange(25, 40)], 120))
+    xy = rng.uniform(0, 0.9, (len(frame_ids), 2))
+    raw_df = pd.DataFrame(np.c_[xy, xy+0.05], columns=BOX_COLUMNS)
+    raw_df.insert(0, 'frameID', frame_ids)
+    raw_df = raw_df.sort_values(by=['frameID', 'xmin']).reset_index(drop=True)
+    return raw_df, DetectionStore.from_dataframe(raw_df)
+
+def test_frame_offsets_match_dataframe_filtering():
+    raw_df, detections = make_store()
+    grouped_df = raw_df.groupby('frameID')
+    frame_ls = raw_df.frameID.unique()
+    assert detections.frames().tolist()==frame_ls.tolist()
+    for f in range(-1, 45):
+        assert detections.has_frame(f)==(f in frame_ls)
+        if f in frame_ls:
+            expected = grouped_df.get_group(f)
+        else:
+            expected = raw_df[raw_df.frameID==f]
+        pdt.assert_frame_equal(detections.to_dataframe(detections.frame_slice(f)), expected, check_dtype=False)
+        assert np.array_equal(detections.frame_boxes(f), expected[BOX_COLUMNS].to_numpy())
+
+def test_owners_match_the_anti_join():
+    raw_df, detections = make_store(1)
+    rng = np.random.default_rng(1)
+    proposal_df = raw_df.copy()
+    for personID in ['p0', 'p1', 'p2']:
+        # a track claims one free detection on some frames, the frames between them are interpolated
+        claimed = []
+        for f in detections.frames():
+            free = detections.free_idxes(f)
+            if len(free) and rng.random()<0.7:
+                claimed.append(rng.choice(free))
+        detections.claim(claimed, personID)
+        tracked_df = detections.to_dataframe(claimed)
+        tracked_df = tracked_df.set_index('frameID').reindex(range(1, 41)).interpolate(method='linear').reset_index()
+        tracked_df['personID'] = personID
+
+        # the replaced tracker removed used detections with an anti-join on the tracked rows
+        new_proposal = pd.merge(proposal_df, tracked_df, how='left', indicator=True)
+        new_proposal = new_proposal[new_proposal['_merge']=='left_only']
+        proposal_df = new_proposal[['frameID']+BOX_COLUMNS]
+
+        free_df = detections.to_dataframe(detections.free_mask())
+        pdt.assert_frame_equal(free_df.reset_index(drop=True), proposal_df.reset_index(drop=True), check_dtype=False)
+        assert sorted(detections.owned_by(personID))==sorted(claimed)
+
+    detections.release(detections.owned_by('p1'))
+    assert len(detections.owned_by('p1'))==0
+    assert detections.free_mask().sum()==len(raw_df)-len(detections.owned_by('p0'))-len(detections.owned_by('p2'))
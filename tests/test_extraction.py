@@ -0,0 +1,48 @@
+import io
+import os
+import shutil
+import subprocess
+import contextlib
+
+import numpy as np
+import cv2
+import pytest
+
+from extraction import ffmpeg_command, count_frames, extract_videos
+
+def test_segments_pick_frames_the_same_way():
+    first = ffmpeg_command('video.mp4', 'frames', 30, 0, 3600)
+    later = ffmpeg_command('video.mp4', 'frames', 30, 3600, 3600)
+    assert first[first.index('-vf')+1]=='fps=30:start_time=0,trim=start_frame=0'
+    assert later[later.index('-vf')+1]=='fps=30:start_time=0,trim=start_frame=3600'
+    assert not '-r' in first
+
+def test_count_frames(tmp_path):
+    for frameID in [1, 2, 3, 4, 5, 7]:
+        (tmp_path/('%06d.jpg'%frameID)).touch()
+    assert count_frames(str(tmp_path))==5
+    assert count_frames(str(tmp_path), 0, 3)==3
+    assert count_frames(str(tmp_path), 3, 3)==2
+    assert count_frames(str(tmp_path), 6)==1
+
+@pytest.mark.skipif(shutil.which('ffmpeg') is None, reason='ffmpeg is not installed')
+@pytest.mark.parametrize('fps', [10, -1])
+def test_segmented_extraction_matches_a_single_pass(tmp_path, fps):
+    # a 5s clip at 25 fps with a keyframe every 12 frames, so that segments do not start at keyframes
+    clip = str(tmp_path/'clip.mp4')
+    subprocess.run(['ffmpeg', '-nostdin', '-loglevel', 'error', '-y', '-f', 'lavfi', '-i', 'testsrc=duration=5:size=160x90:rate=25',
+                    '-pix_fmt', 'yuv420p', '-g', '12', clip], check=True)
+    with contextlib.redirect_stdout(io.StringIO()):
+        single = extract_videos([clip], [str(tmp_path/'single')], fps=fps, num_workers=1, segment_seconds=None)
+        segmented = extract_videos([clip], [str(tmp_path/'segmented')], fps=fps, num_workers=2, segment_seconds=2)
+
+    assert single['segments']==1 and segmented['segments']==3
+    assert single['frames']==segmented['frames']
+    assert abs(single['frames']-(50 if fps==10 else 125))<=1 # the last frame depends on the rounding of the fps filter
+    names = ['%06d.jpg'%(i+1) for i in range(single['frames'])]
+    assert sorted(os.listdir(tmp_path/'single'))==sorted(os.listdir(tmp_path/'segmented'))==names
+    for name in names:
+        frame = cv2.imread(str(tmp_path/'single'/name)).astype(int)
+        segmented_frame = cv2.imread(str(tmp_path/'segmented'/name)).astype(int)
+        # the same frame, up to the JPEG encoding
+        assert np.abs(frame-segmented_frame).mean()<1
@@ -0,0 +1,28 @@
+import os
+
+import numpy as np
+import cv2
+
+from frame_reader import FrameReader
+from tests.helpers import make_frames
+
+def test_thumbnails_give_the_pixels_of_a_reduced_decode(tmp_path):
+    frame_dir = str(tmp_path/'frames')
+    make_frames(frame_dir, 3, 640, 360)
+    img_path = os.path.join(frame_dir, '000002.jpg')
+    expected, shape = FrameReader().read(img_path, (150, 80))
+
+    reader = FrameReader(thumbnails=True)
+    first, _ = reader.read(img_path, (150, 80))
+    second, second_shape = reader.read(img_path, (150, 80))
+    assert os.path.isfile(reader.thumbnail_path(img_path, 4))
+    assert reader.get_stats()['thumbnail_hits']==1
+    assert second_shape==shape==(360, 640)
+    assert np.array_equal(first, expected)
+    assert np.array_equal(second, expected)
+
+    # a smaller size is read from the saved 1/4 scale (160 x 90), only the scales read so far are kept
+    smaller, _ = reader.read(img_path, (70, 40))
+    assert reader.get_stats()['thumbnail_hits']==2
+    assert not os.path.isfile(reader.thumbnail_path(img_path, 8))
+    assert np.array_equal(smaller, cv2.resize(FrameReader().read(img_path, (160, 90))[0], (70, 40)))
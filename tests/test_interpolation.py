@@ -0,0 +1,75 @@
+'''
+interpolate_tracks fills every track as a per-track pandas interpolation does
+'''
+import numpy as np
+import pandas as pd
+import pytest
+
+from interpolation import IntervalSet, interpolate_tracks
+
+BOX_COLUMNS = ['xmin', 'ymin', 'xmax', 'ymax']
+
+def make_track(rng, start_frame, end_frame, skipped=()):
+    frames = np.arange(start_frame, end_frame)
+    frame_ids = np.sort(rng.choice(frames, len(frames)//3, replace=False))
+    xy = rng.uniform(0, 0.9, (len(frame_ids), 2))
+    skipped = IntervalSet(skipped)
+    keep = ~skipped.contains(frame_ids)
+    return {'frame_ids': frame_ids[keep], 'boxes': np.c_[xy, xy+0.05][keep],
+            'start_frame': start_frame, 'end_frame': end_frame, 'skipped': skipped}
+
+def per_track(track, method):
+    # the per-person interpolation interpolate_tracks replaced
+    tracked_df = pd.DataFrame(track['boxes'], columns=BOX_COLUMNS)
+    tracked_df['frameID'] = track['frame_ids']
+    interpolated = pd.DataFrame()
+    interpolated['frameID'] = range(track['start_frame'], track['end_frame'])
+    interpolated = pd.merge(interpolated, tracked_df, on='frameID', how='left')
+    interpolated = interpolated[~track['skipped'].contains(interpolated.frameID.to_numpy())]
+    interpolated = interpolated.set_index('frameID', drop=False)[BOX_COLUMNS].interpolate(method=method)
+    return interpolated.index.to_numpy(), interpolated.to_numpy()
+
+def test_tracks_without_skipped_frames_match_linear_interpolation():
+    rng = np.random.default_rng(0)
+    tracks = [make_track(rng, 1, 120), make_track(rng, 30, 90), make_track(rng, 1, 60)]
+    for track, (frame_ids, boxes) in zip(tracks, interpolate_tracks(tracks)):
+        expected_frames, expected_boxes = per_track(track, 'linear')
+        assert np.array_equal(frame_ids, expected_frames)
+        assert np.allclose(boxes, expected_boxes, equal_nan=True)
+
+def test_gaps_with_skipped_frames_are_weighted_by_frame_distance():
+    # the replaced interpolation weighted a gap over skipped frames by row position ('linear'),
+    # interpolate_tracks weights it by frame distance, as pandas does with method='index'
+    rng = np.random.default_rng(1)
+    tracks = [make_track(rng, 1, 120, [(10, 14), (40, 41), (80, 95)]), make_track(rng, 5, 100, [(5, 8), (50, 60)])]
+    for track, (frame_ids, boxes) in zip(tracks, interpolate_tracks(tracks)):
+        expected_frames, expected_boxes = per_track(track, 'index')
+        assert not track['skipped'].contains(frame_ids).any()
+        assert np.array_equal(frame_ids, expected_frames)
+        assert np.allclose(boxes, expected_boxes, equal_nan=True)
+
+def test_gap_weights():
+    track = {'frame_ids': np.array([10, 20]), 'boxes': np.array([[0, 0, 0.1, 0.1], [0.5, 0.5, 0.6, 0.6]]),
+             'start_frame': 5, 'end_frame': 25, 'skipped': IntervalSet([(12, 16)])}
+    (frame_ids, boxes), = interpolate_tracks([track])
+    assert frame_ids.tolist()==[5, 6, 7, 8, 9, 10, 11, 17, 18, 19, 20, 21, 22, 23, 24]
+    assert np.isnan(boxes[:5]).all()
+    assert np.allclose(boxes[frame_ids==17, 0], 0.35)
+    assert np.allclose(boxes[frame_ids>=20], [0.5, 0.5, 0.6, 0.6])
+
+@pytest.mark.parametrize('max_gap', [0, 3, 10])
+def test_max_gap(max_gap):
+    rng = np.random.default_rng(2)
+    track = make_track(rng, 1, 100)
+    (frame_ids, boxes), = interpolate_tracks([track], max_gap=max_gap)
+    _, filled = per_track(track, 'index')
+    known = np.isin(frame_ids, track['frame_ids'])
+    positions = np.flatnonzero(known)
+    # a missing frame is filled when the run of missing frames around it is at most max_gap long (or trails the last head)
+    expected = np.full(len(frame_ids), False)
+    for before, after in zip(positions[:-1], positions[1:]):
+        expected[before+1:after] = after-before-1<=max_gap
+    expected[positions[-1]+1:] = np.arange(1, len(frame_ids)-positions[-1])<=max_gap
+    expected |= known
+    assert np.array_equal(~np.isnan(boxes[:, 0]), expected)
+    assert np.allclose(boxes[expected], filled[expected])
@@ -0,0 +1,191 @@
+'''
+track_person shows the same pop-ups, in the same order, as the tracker it replaced.
+baseline_popups is the decision loop of that tracker (PersonTracker.__track_person before the single-pass engine),
+with the PopupWindow replaced by a function.
+'''
+import io
+import contextlib
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from PersonTracker import PersonTracker
+from review import PopupReviewer, ReviewDecision
+from tests.helpers import make_detections, make_frames, HeadTruth
+
+N_FRAMES = 150
+
+def intersection_ratio(box1:list, box2:list):
+    x1 = max(box1[0], box2[0])
+    y1 = max(box1[1], box2[1])
+    x2 = min(box1[2], box2[2])
+    y2 = min(box1[3], box2[3])
+    intersection_area = max(0, x2 - x1) * max(0, y2 - y1)
+    box2_area = max(0, box2[2]-box2[0])*max(0, box2[3]-box2[1])
+    return intersection_area/box2_area
+
+def baseline_popups(proposal_df, personID, window, start_frame, end_frame,
+                    skip_prev_f=1, skip_follow_f=1, overlap_upper=0.6, overlap_lower=0.2):
+    '''
+    Returns:
+    popups (list): (stage, frameID, xmin) of every pop-up, window(info, stage, personID) answers them
+    '''
+    popups = []
+    def show(info, stage):
+        popups.append((stage, int(info['frameID']), round(float(info['xmin']), 4)))
+        return window(info, stage, personID)
+
+    proposal_df = proposal_df.copy()
+    proposal_df['personID'] = None
+    skipped_frames = []
+    grouped_df = proposal_df.groupby('frameID')
+    frame_ls = proposal_df.frameID.unique()
+    select_new_anchor = True
+    confusing_anchor = False
+    Terminated = False
+    f = start_frame
+    while (not Terminated) and (f<end_frame):
+        if f not in frame_ls:
+            f+=1
+            continue
+        while select_new_anchor and ((not Terminated) and (f<end_frame)):
+            if f not in frame_ls:
+                f+=1
+                continue
+            bboxes = grouped_df.get_group(f)
+            show_window = True
+            for i, entry in bboxes.iterrows():
+                if show_window:
+                    decision = show(entry['frameID':'ymax'].to_dict(), "[Anchor Setup]")
+                    if decision=='Yes':
+                        anchor_coord = entry['xmin':'ymax'].to_list()
+                        proposal_df.at[i, 'personID'] = personID
+                        select_new_anchor = False
+                        f+=1
+                        show_window = False
+                    elif decision=='No':
+                        confusing_anchor = entry['xmin':'ymax'].to_list()
+                    elif decision=='Skip':
+                        show_window = False
+                    elif decision =='Terminate and Drop':
+                        Terminated = True
+                        select_new_anchor = False
+                        show_window = False
+                else:
+                    confusing_anchor = entry['xmin':'ymax'].to_list()
+            if select_new_anchor:
+                skip_start = max(1, f-skip_prev_f)
+                skip_end = min(f+skip_follow_f, end_frame)
+                skipped_frames = skipped_frames+list(range(skip_start, skip_end+1))
+                f = skip_end
+        if f not in frame_ls:
+            f+=1
+            continue
+        bboxes = grouped_df.get_group(f)
+        overlappings = {}
+        confusion = {}
+        for i, entry in bboxes.iterrows():
+            bbox = entry['xmin':'ymax'].to_list()
+            overlappings[i] = intersection_ratio(bbox, anchor_coord)
+            confusion[i] = intersection_ratio(bbox, confusing_anchor) if confusing_anchor else 0
+        sorted_items = sorted(overlappings.items(), key=lambda x:x[1])
+        sorted_idxes = [item[0] for item in sorted_items]
+        sorted_overlappings = [item[1] for item in sorted_items]
+        if sorted_overlappings[-1]<=overlap_lower:
+            f+=1
+            continue
+        elif  (len(sorted_overlappings)>1):
+            if (sorted_overlappings[-2] >=overlap_lower) and (confusion[sorted_idxes[-2]]<overlap_lower):
+                select_new_anchor = True
+                continue
+        elif sorted_overlappings[-1]<overlap_upper:
+            select_new_anchor=True
+            continue
+        target_idx = sorted_idxes[-1]
+        proposal_df.at[target_idx, 'personID'] = personID
+        anchor_coord  = proposal_df.loc[target_idx, 'xmin':'ymax'].to_list()
+        f+=1
+
+    if Terminated:
+        return popups
+    proposal_df = proposal_df[proposal_df.personID==personID]
+    proposal_df = proposal_df[['frameID', 'xmin', 'ymin', 'xmax', 'ymax']]
+    interpolated = pd.DataFrame()
+    interpolated['frameID'] = range(start_frame, end_frame)
+    interpolated = pd.merge(interpolated, proposal_df, on='frameID', how='left')
+    interpolated = interpolated[~interpolated.frameID.isin(skipped_frames)].interpolate(method='linear')
+    show(interpolated.iloc[-1].to_dict(), "[Final Check]")
+    return popups
+
+class WindowReviewer(PopupReviewer):
+    def __init__(self, window):
+        '''
+        A PopupReviewer with the PopupWindow replaced by window(info, stage, personID), recording the pop-ups
+        '''
+        self.window = window
+        self.popups = []
+
+    def review(self, request):
+        for i, candidate in enumerate(request.candidates):
+            self.popups.append((request.stage, int(candidate['frameID']), round(float(candidate['xmin']), 4)))
+            result = self.window(candidate, request.stage, request.personID)
+            if request.stage=='[Final Check]' or result in ['Yes', 'Skip', 'Terminate and Drop']:
+                return ReviewDecision(result, i)
+        return ReviewDecision('No')
+
+@pytest.fixture(scope='module', params=[(0, None), (1, 0.01), (2, 0.02)], ids=['drift', 'fast', 'faster'])
+def video(request, tmp_path_factory):
+    seed, speed = request.param
+    work_dir = tmp_path_factory.mktemp('video')
+    detection_file = str(work_dir/'raw_detections.txt')
+    heads = make_detections(detection_file, N_FRAMES, heads_per_frame=6, jitter=0.01, occlusion=0.03, speed=speed, seed=seed)
+    make_frames(str(work_dir/'frames'), N_FRAMES, 160, 90)
+    raw = np.loadtxt(detection_file, delimiter=',', ndmin=2)
+    return detection_file, str(work_dir/'frames'), HeadTruth(raw[:, 0].astype(int), raw[:, 2], heads)
+
+def make_window(truth, skip_every=7):
+    # the person 'h<k>' is head k, a few anchor setups are skipped; final checks are rejected, so that no track
+    # claims its heads (the replaced tracker dropped every track at its final check)
+    def window(info, stage, personID):
+        if stage=='[Final Check]':
+            return 'No'
+        if int(info['frameID'])%skip_every==0:
+            return 'Skip'
+        return 'Yes' if truth.head(int(info['frameID']), info['xmin'])==int(personID[1:]) else 'No'
+    return window
+
+@pytest.mark.parametrize('grid_size', [None, 4])
+def test_track_person_shows_the_baseline_popups(video, grid_size):
+    detection_file, frame_dir, truth = video
+    window = make_window(truth)
+    columns = ['frameID', 'label', 'xmin', 'ymin', 'xmax', 'ymax']
+    raw_df = pd.read_csv(detection_file, names=columns)
+    raw_df = raw_df[['frameID', 'xmin', 'ymin', 'xmax', 'ymax']].sort_values(by=['frameID', 'xmin']).reset_index(drop=True)
+
+    reviewer = WindowReviewer(window)
+    tracker = PersonTracker(grid_size=grid_size)
+    tracker.set_reviewer(reviewer)
+    tracker.load_from_files(detection_file, frame_dir, use_cache=False)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for personID in ['h0', 'h1', 'h2', 'h3']:
+            tracker.track_person(personID)
+            expected = baseline_popups(raw_df, personID, window, 1, int(raw_df.frameID.max()))
+            assert reviewer.popups==expected
+            reviewer.popups = []
+    tracker.release()
+
+def test_reset_on_movement(video):
+    # track_all resets the anchor on a big movement with other heads around only when asked for
+    detection_file, frame_dir, truth = video
+    counts = []
+    for reset_on_movement in [False, True]:
+        reviewer = WindowReviewer(make_window(truth))
+        tracker = PersonTracker()
+        tracker.set_reviewer(reviewer)
+        tracker.load_from_files(detection_file, frame_dir, use_cache=False)
+        with contextlib.redirect_stdout(io.StringIO()):
+            tracker.track_all(personIDs=['h0', 'h1'], reset_on_movement=reset_on_movement)
+        counts.append(len(reviewer.popups))
+        tracker.release()
+    assert counts[0]<counts[1]
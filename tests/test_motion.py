@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from motion import ConstantVelocityModel, KalmanBoxModel, make_motion_model
+
+def trajectory(frameID):
+    # a head moving right and down at a constant speed, growing slowly
+    cx, cy, w, h = 0.2+0.004*frameID, 0.3+0.002*frameID, 0.05+0.0002*frameID, 0.06+0.0002*frameID
+    return [cx-w/2, cy-h/2, cx+w/2, cy+h/2]
+
+def test_velocity_model_follows_a_constant_velocity():
+    model = ConstantVelocityModel(smoothing=1)
+    model.update(0, trajectory(0))
+    assert np.allclose(model.predict(5), trajectory(0)) # no velocity after a single box
+    for f in range(2, 20, 2):
+        model.update(f, trajectory(f))
+    for f in [18, 19, 25, 33]:
+        assert np.allclose(model.predict(f), trajectory(f))
+
+def test_velocity_model_smoothing():
+    smoothing = 0.2
+    model = ConstantVelocityModel(smoothing=smoothing)
+    for f in range(10):
+        model.update(f, trajectory(f))
+    # after n movements the velocity is 1-(1-smoothing)^n of the true one
+    fraction = 1-(1-smoothing)**9
+    start, end = np.array(trajectory(9)), np.array(trajectory(14))
+    assert np.allclose(model.predict(14), start+fraction*(end-start))
+
+def test_velocity_model_limits():
+    model = ConstantVelocityModel(smoothing=1, max_frames=15)
+    model.update(0, trajectory(0))
+    model.update(1, trajectory(1))
+    # not predicted further than max_frames
+    assert np.allclose(model.predict(40), model.predict(16))
+    assert np.allclose(model.predict(0), trajectory(1)) # nor back in time
+    # the velocity starts again after a long gap
+    model.update(30, trajectory(30))
+    assert np.allclose(model.predict(35), trajectory(30))
+    # the size does not grow beyond twice of the last box
+    model = ConstantVelocityModel(smoothing=1)
+    model.update(0, [0.5, 0.5, 0.51, 0.51])
+    model.update(1, [0.5, 0.5, 0.52, 0.52])
+    xmin, ymin, xmax, ymax = model.predict(15)
+    assert np.isclose(xmax-xmin, 0.04) and np.isclose(ymax-ymin, 0.04)
+
+def test_kalman_model_converges_on_a_constant_velocity():
+    model = KalmanBoxModel()
+    for f in range(40):
+        model.update(f, trajectory(f))
+    for f in [40, 45, 54]:
+        assert np.allclose(model.predict(f), trajectory(f), atol=1e-3)
+    # with noisy boxes, the next head is predicted better than by the last movement alone
+    rng = np.random.default_rng(0)
+    model, last_movement = KalmanBoxModel(), ConstantVelocityModel(smoothing=1)
+    errors, last_movement_errors = [], []
+    for f in range(60):
+        if f>10:
+            errors.append(np.abs(np.array(model.predict(f))-trajectory(f)).mean())
+            last_movement_errors.append(np.abs(np.array(last_movement.predict(f))-trajectory(f)).mean())
+        box = np.array(trajectory(f))+rng.normal(0, 0.003, 4)
+        model.update(f, box)
+        last_movement.update(f, box)
+    assert np.mean(errors)<0.7*np.mean(last_movement_errors)
+
+@pytest.mark.parametrize('name, model_class', [('velocity', ConstantVelocityModel), ('kalman', KalmanBoxModel)])
+def test_make_motion_model(name, model_class):
+    assert isinstance(make_motion_model(name), model_class)
+    assert make_motion_model(None) is None
+    assert isinstance(make_motion_model(lambda: model_class(max_frames=3)), model_class)
+    with pytest.raises(ValueError):
+        make_motion_model('unknown')
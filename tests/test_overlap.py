@@ -0,0 +1,51 @@
+'''
+The vectorized overlap scoring of PersonTracker gives the same scores, and the same order, as the per-box loop it replaced.
+'''
+import numpy as np
+import pytest
+
+from PersonTracker import PersonTracker
+
+def intersection_ratio(box1:list, box2:list):
+    x1 = max(box1[0], box2[0])
+    y1 = max(box1[1], box2[1])
+    x2 = min(box1[2], box2[2])
+    y2 = min(box1[3], box2[3])
+    intersection_area = max(0, x2 - x1) * max(0, y2 - y1)
+    box2_area = max(0, box2[2]-box2[0])*max(0, box2[3]-box2[1])
+    return intersection_area/box2_area
+
+def make_boxes(rng, n):
+    xy = rng.uniform(0, 0.9, (n, 2))
+    wh = rng.uniform(0, 0.1, (n, 2))
+    boxes = np.c_[xy, xy+wh]
+    # copies of boxes, and boxes touching or away from the others give ties and zero overlaps
+    boxes[1::5] = boxes[0]
+    boxes[2::7, 2:] = boxes[2::7, :2]
+    return boxes.astype(np.float32)
+
+@pytest.mark.parametrize('seed', range(5))
+def test_scores_match_the_scalar_loop(seed):
+    rng = np.random.default_rng(seed)
+    tracker = PersonTracker()
+    boxes = make_boxes(rng, 40)
+    anchor = boxes[0].tolist()
+    confusing_anchor = boxes[3].tolist()
+
+    overlappings = tracker._PersonTracker__intersection_ratio(boxes, anchor)
+    sorted_overlappings, sorted_idxes, confusion = tracker._PersonTracker__score_candidates(boxes, overlappings, confusing_anchor)
+
+    expected = {i: intersection_ratio(box.tolist(), anchor) for i, box in enumerate(boxes)}
+    expected_confusion = [intersection_ratio(box.tolist(), confusing_anchor) for box in boxes]
+    sorted_items = sorted(expected.items(), key=lambda x:x[1])
+    assert np.allclose(overlappings, [expected[i] for i in range(len(boxes))], rtol=1e-6, atol=1e-9)
+    assert np.allclose(confusion, expected_confusion, rtol=1e-6, atol=1e-9)
+    assert sorted_idxes.tolist()==[item[0] for item in sorted_items]
+    assert np.allclose(sorted_overlappings, [item[1] for item in sorted_items], rtol=1e-6, atol=1e-9)
+
+def test_no_confusing_anchor():
+    tracker = PersonTracker()
+    boxes = make_boxes(np.random.default_rng(0), 10)
+    overlappings = tracker._PersonTracker__intersection_ratio(boxes, boxes[0].tolist())
+    _, _, confusion = tracker._PersonTracker__score_candidates(boxes, overlappings, False)
+    assert (confusion==0).all()
@@ -0,0 +1,58 @@
+import os
+import threading
+
+from remote_store import LocalDirBackend, RemoteFrameStore
+
+def make_remote(remote_dir, num_frames=8, size=1024):
+    os.makedirs(remote_dir, exist_ok=True)
+    for frameID in range(1, num_frames+1):
+        with open(os.path.join(remote_dir, '%06d.jpg'%frameID), 'wb') as f:
+            f.write(os.urandom(size))
+
+def test_handed_out_frames_are_not_evicted(tmp_path):
+    make_remote(str(tmp_path/'remote'))
+    # room for 2 frames
+    store = RemoteFrameStore(LocalDirBackend(str(tmp_path/'remote')), str(tmp_path/'local'), disk_quota_mb=2048/1024/1024)
+    first = store.fetch(1)
+    for frameID in range(2, 6):
+        assert os.path.exists(store.fetch(frameID))
+        store.release(frameID)
+    assert os.path.exists(first)
+    store.release(1)
+    store.fetch(6)
+    store.release(6)
+    assert not os.path.exists(first)
+    assert len(os.listdir(str(tmp_path/'local')))==2
+    store.close()
+
+def test_iter_fetch_keeps_frames_until_released(tmp_path):
+    make_remote(str(tmp_path/'remote'), 32)
+    store = RemoteFrameStore(LocalDirBackend(str(tmp_path/'remote')), str(tmp_path/'local'), disk_quota_mb=2048/1024/1024)
+    for frameID, local_path in store.iter_fetch(range(1, 33), window=8):
+        # all frames in flight are pinned, the yielded one is still there
+        assert os.path.getsize(local_path)==1024
+        store.release(frameID)
+    store.close()
+    assert store._pins=={}
+    assert len(os.listdir(str(tmp_path/'local')))<=2
+
+def test_concurrent_readers(tmp_path):
+    make_remote(str(tmp_path/'remote'), 64)
+    store = RemoteFrameStore(LocalDirBackend(str(tmp_path/'remote')), str(tmp_path/'local'), disk_quota_mb=4096/1024/1024)
+    errors = []
+    def read(offset):
+        for frameID in range(1+offset, 65, 4):
+            local_path = store.fetch(frameID)
+            try:
+                with open(local_path, 'rb') as f:
+                    assert len(f.read())==1024
+            except (OSError, AssertionError) as e:
+                errors.append(e)
+            store.release(frameID)
+    threads = [threading.Thread(target=read, args=(k,)) for k in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    store.close()
+    assert errors==[]
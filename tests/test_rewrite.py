@@ -0,0 +1,48 @@
+import io
+import os
+import contextlib
+
+from rewrite import parse_mapping, remap_file
+
+def write(tmp_path, data:bytes):
+    path = str(tmp_path/'label.txt')
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def test_unchanged_crlf_file_is_not_rewritten(tmp_path):
+    data = b'0 0.5 0.5 0.1 0.1\r\n\r\n1 0.2 0.2 0.1 0.1\r\n0 0.3 0.3 0.1 0.1'
+    path = write(tmp_path, data)
+    os.utime(path, (0, 0))
+    before, after = remap_file(path, {0: 0, 1: 1})
+    assert read(path)==data
+    assert os.stat(path).st_mtime==0
+    assert before==after=={0: 2, 1: 1}
+
+def test_remapped_lines_keep_their_endings(tmp_path):
+    path = write(tmp_path, b'2 0.5 0.5 0.1 0.1\r\n1 0.2 0.2 0.1 0.1\r\n2 0.3 0.3 0.1 0.1\n2 0.4 0.4 0.1 0.1')
+    remap_file(path, parse_mapping(['2:0']))
+    assert read(path)==b'0 0.5 0.5 0.1 0.1\r\n0 0.3 0.3 0.1 0.1\n0 0.4 0.4 0.1 0.1'
+
+def test_classes_20_to_29_are_not_class_2(tmp_path):
+    lines = [b'%d 0.5 0.5 0.1 0.1\n'%c for c in [2, 20, 21, 25, 29, 12, 2]]
+    path = write(tmp_path, b''.join(lines))
+    before, after = remap_file(path, {2: 0})
+    assert read(path)==b'0 0.5 0.5 0.1 0.1\n'*2
+    assert before=={2: 2, 20: 1, 21: 1, 25: 1, 29: 1, 12: 1}
+    assert after=={0: 2}
+
+    path = write(tmp_path, b''.join(lines))
+    remap_file(path, {2: 0}, keep_others=True)
+    assert read(path)==b''.join([b'0 0.5 0.5 0.1 0.1\n']+lines[1:-1]+[b'0 0.5 0.5 0.1 0.1\n'])
+
+def test_invalid_lines_are_kept(tmp_path):
+    path = write(tmp_path, b'x 0.5 0.5 0.1 0.1\r\n2 0.5 0.5 0.1 0.1\r\n')
+    with contextlib.redirect_stdout(io.StringIO()) as out:
+        remap_file(path, {2: 3})
+    assert read(path)==b'x 0.5 0.5 0.1 0.1\r\n3 0.5 0.5 0.1 0.1\r\n'
+    assert 'x 0.5 0.5 0.1 0.1' in out.getvalue()
@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+from spatial_index import GridIndex
+
+def overlapping(boxes, region):
+    return (np.minimum(boxes[:, 2], region[2])>np.maximum(boxes[:, 0], region[0])) \
+         & (np.minimum(boxes[:, 3], region[3])>np.maximum(boxes[:, 1], region[1]))
+
+@pytest.mark.parametrize('grid_size', [1, 4, 16])
+def test_query_finds_every_overlapping_box(grid_size):
+    rng = np.random.default_rng(grid_size)
+    n = 3000
+    frame_ids = np.sort(rng.integers(0, 40, n))
+    xy = rng.uniform(0, 0.9, (n, 2))
+    boxes = np.c_[xy, xy+rng.uniform(0.01, 0.1, (n, 2))]
+    index = GridIndex(frame_ids, boxes, grid_size)
+    for _ in range(300):
+        f = int(rng.integers(-1, 42))
+        regions = [list(xy)+list(xy+0.08) for xy in rng.uniform(-0.05, 1, (int(rng.integers(1, 3)), 2))]
+        idxes = index.query(f, regions)
+        assert np.all(np.diff(idxes)>0)
+        assert np.all(frame_ids[idxes]==f)
+        in_frame = np.flatnonzero(frame_ids==f)
+        expected = in_frame[np.any([overlapping(boxes[in_frame], region) for region in regions], axis=0)] if len(in_frame) else in_frame
+        assert set(expected.tolist())<=set(idxes.tolist())
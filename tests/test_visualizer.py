@@ -0,0 +1,96 @@
+'''
+The timelines are drawn once and revealed per frame, every frame is the same as the one drawn from scratch
+(reference_focus and reference_emotion are the per-frame drawing of draw_focus_curve and draw_emotion_curve before that)
+'''
+import numpy as np
+import cv2
+import pytest
+
+from Visualizer import Visualizer
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+def reference_focus(img, frame_num, n_frames, student, teacher, curve_h=90, teacher_curve_color=(0,255,0), student_curve_color=(0,0,255), font_scale=0.5):
+    i = frame_num-1
+    curve_thick = 2
+    img = cv2.copyMakeBorder(img,0,curve_h*2+10,0,0,cv2.BORDER_CONSTANT,value=[255,255,255])
+    im_h, im_w = img.shape[:2]
+    word_w = 140
+    space = (im_w-word_w)/n_frames
+    for j in range(i):
+        if student[j]>0.5 and student[j+1]>0.5:
+            cv2.fillConvexPoly(img,
+            np.array([[int(j*space)+word_w,im_h-curve_h-5],[int(j*space)+word_w,im_h-5],[int((j+1)*space)+word_w,im_h-5],[int((j+1)*space)+word_w,im_h-curve_h-5]]),
+            (200,200,255))
+        if student[j]>0 and student[j+1]>0:
+            cv2.line(img,(int(j*space)+word_w,im_h-int(student[j]*curve_h)-5),(int((j+1)*space)+word_w,im_h-int(student[j+1]*curve_h)-5),student_curve_color,curve_thick)
+        if teacher[j]>0.5 and teacher[j+1]>0.5:
+            cv2.fillConvexPoly(img,
+            np.array([[int(j*space)+word_w,im_h-curve_h*2-10],[int(j*space)+word_w,im_h-curve_h-10],[int((j+1)*space)+word_w,im_h-curve_h-10],[int((j+1)*space)+word_w,im_h-curve_h*2-10]]),
+            (200,255,200))
+        if teacher[j]>0 and teacher[j+1]>0:
+            cv2.line(img,(int(j*space)+word_w,im_h-int(teacher[j]*curve_h)-curve_h-10),(int((j+1)*space)+word_w,im_h-int(teacher[j+1]*curve_h)-curve_h-10),teacher_curve_color,curve_thick)
+    cv2.line(img,(word_w,im_h-int(curve_h/2)),(int(i*space)+word_w,im_h-int(curve_h/2)),student_curve_color,1)
+    cv2.line(img,(word_w,im_h-int(curve_h/2)-curve_h-5),(int(i*space)+word_w,im_h-int(curve_h/2)-curve_h-5),teacher_curve_color,1)
+    cv2.putText(img,'probability=0.5',(word_w,im_h-int(curve_h/2)-15),FONT,font_scale,student_curve_color,1)
+    cv2.putText(img,'probability=0.5',(word_w,im_h-int(curve_h/2)-curve_h-15),FONT,font_scale,teacher_curve_color,1)
+    cv2.putText(img,'teacher looking',(0,im_h-int(curve_h/2)-curve_h-15),FONT,font_scale,teacher_curve_color,2)
+    cv2.putText(img,'at the camera',(0,im_h-int(curve_h/2)-curve_h+15),FONT,font_scale,teacher_curve_color,2)
+    cv2.putText(img,'student looking',(0,im_h-int(curve_h/2)-15),FONT,font_scale,student_curve_color,2)
+    cv2.putText(img,'at the camera',(0,im_h-int(curve_h/2)+15),FONT,font_scale,student_curve_color,2)
+    return img
+
+def reference_emotion(img, frame_num, n_frames, emotions, curve_h=90, font_scale=0.5):
+    color_list=[(255,0,0),(255,165,0),(128,128,0),(0,255,0),(0,191,243),(0,0,255),(233,0,233)]
+    names = ['neutral', 'angry', 'disgust', 'fear', 'happy', 'sad', 'surprise']
+    i = frame_num-1
+    curve_thick = 2
+    img = cv2.copyMakeBorder(img,0,curve_h+10,0,0,cv2.BORDER_CONSTANT,value=[255,255,255])
+    im_h, im_w = img.shape[:2]
+    word_w = 140
+    space = (im_w-word_w)/n_frames
+    for j in range(i):
+        for k in range(7):
+            cv2.line(img,(int(j*space)+word_w,im_h-int(emotions[k][j]*curve_h)-5),(int((j+1)*space)+word_w,im_h-int(emotions[k][j+1]*curve_h)-5),color_list[k],curve_thick)
+    all_num = len(emotions[0])
+    shift_wid = int(70.0*(frame_num-all_num*0.8)/(all_num*0.2)) if frame_num > all_num*0.8 else 0
+    for k in range(7):
+        cv2.putText(img,names[k],(int((i)*space)+word_w-shift_wid,im_h-int(emotions[k][i]*curve_h)-5),FONT,font_scale,color_list[k],2)
+    cv2.putText(img,'Emotion',(30,im_h-int(curve_h/2)),FONT,font_scale,(0,0,0),2)
+    return img
+
+def make_visualizer(n_frames, width):
+    visualizer = Visualizer()
+    visualizer._frame_list = {k: None for k in range(n_frames)}
+    visualizer.w, visualizer.h = width, 60
+    return visualizer
+
+# the probabilities are random, saturated (at or near 1, so that lines lie at the top of the padding) or exactly 1
+@pytest.mark.parametrize('shift', [0.0, 0.5, 1.0], ids=['random', 'saturated', 'ones'])
+@pytest.mark.parametrize('n_frames, width', [(300, 440), (60, 640), (500, 300)])
+def test_focus_curve_is_drawn_as_from_scratch(n_frames, width, shift):
+    rng = np.random.default_rng(n_frames)
+    student = np.clip(rng.random(n_frames)+shift, 0, 1)
+    teacher = np.clip(rng.random(n_frames)+shift, 0, 1)
+    student[rng.random(n_frames)<0.05] = -1 # frames without probabilities
+    visualizer = make_visualizer(n_frames, width)
+    visualizer.prob_list_student, visualizer.prob_list_teacher = student.tolist(), teacher.tolist()
+    visualizer.draw_focus_curve()
+    frame = rng.integers(0, 256, (60, width, 3), dtype=np.uint8)
+    for frame_num in range(n_frames):
+        drawn = visualizer._layers[0](frame.copy(), frame_num=frame_num)
+        assert np.array_equal(drawn, reference_focus(frame.copy(), frame_num, n_frames, student, teacher)), frame_num
+
+@pytest.mark.parametrize('shift', [0.0, 1.0], ids=['random', 'ones'])
+def test_emotion_curve_is_drawn_as_from_scratch(shift):
+    n_frames, width = 200, 400
+    rng = np.random.default_rng(1)
+    emotions = np.clip(rng.random((7, n_frames))+shift, 0, 1)
+    visualizer = make_visualizer(n_frames, width)
+    (visualizer.neutral_list, visualizer.angry_list, visualizer.disgust_list, visualizer.fear_list,
+     visualizer.happy_list, visualizer.sad_list, visualizer.surprise_list) = emotions.tolist()
+    visualizer.draw_emotion_curve()
+    frame = rng.integers(0, 256, (60, width, 3), dtype=np.uint8)
+    for frame_num in range(n_frames):
+        drawn = visualizer._layers[0](frame.copy(), frame_num=frame_num)
+        assert np.array_equal(drawn, reference_emotion(frame.copy(), frame_num, n_frames, emotions)), frame_num
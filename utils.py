@@ -5,6 +5,11 @@ import pandas as pd
 import os 
 import cv2
 
+from render_pipeline import RenderPipeline
+from frame_reader import FrameReader
+from frame_source import open_frame_source
+from extraction import ffmpeg_command
+
 def cv2_safe_read(img_path):
     '''
     To read files with Chinese characters
@@ -36,23 +41,20 @@ def frame_extraction(input_vid:str, output_dir:str, fps=30):
     output_dir: the directory to save extracted frames
     fps: extraction rate (frame per second), if not specified (fps=-1), will extract based on fps of the given video
 
+    To extract many (or long) videos concurrently, see extraction.extract_videos
     '''
     Path(output_dir).mkdir(exist_ok=True)
-    
-    if fps<0:
-        ffmpeg_command = 'ffmpeg -i \'{}\' -vsync 0 {}/%06d.jpg'.format(input_vid, output_dir)
-    else:
-        ffmpeg_command = 'ffmpeg -i {} -r {} -q:v 2 -f image2 {}/%06d.jpg'.format(input_vid, fps, output_dir)
 
-    subprocess.run(ffmpeg_command, shell=True)
+    subprocess.run(ffmpeg_command(input_vid, output_dir, fps))
 
 def visualize(output_vid: str, frame_dir:str, annotations:str, 
               gaze_heatmaps=True, gaze_points = True, gaze_patterns = True,
-              fps = 30, rate=1, compression=1, save_img = False):
+              fps = 30, rate=1, compression=1, save_img = False,
+              num_decoders=4, num_drawers=2, reduced_decode=True, thumbnails=False):
     '''
     Args:
     output_vid:     Path of the visualization video
-    frame_dir:      Directory to read in frames
+    frame_dir:      Directory to read in frames, or a video to decode frames from (without frame_extraction), or a frame_source.FrameSource
     annotations:    Path of the annotation file to visualize with
     gaze_heatmaps:  Whether or not to visualize gaze heatmaps
     gaze_points:    Whether or not to visualize the 2D gaze points
@@ -61,6 +63,13 @@ def visualize(output_vid: str, frame_dir:str, annotations:str,
     rate:           The select rate of frames to visualize with (*for faster implementation)
     compression:    The compression rate of frames (*for faster implementation)
     save_img:       Whether or not save visualization image
+    num_decoders:   The number of threads reading frames
+    num_drawers:    The number of threads drawing on frames (and saving visualization images)
+    reduced_decode: Whether or not to decode frames at 1/2, 1/4 or 1/8 of their size when compressed frames are still smaller
+    thumbnails:     Whether or not to keep the reduced frames next to frame_dir, to read them faster next time (see frame_reader.FrameReader)
+
+    Returns:
+    stats (dict):   frames visualized, time spent in each stage and throughput, see render_pipeline.RenderPipeline.get_stats
 
     '''
     ############################################################################################
@@ -69,13 +78,13 @@ def visualize(output_vid: str, frame_dir:str, annotations:str,
     visualization_labels = source_labels[source_labels.frameID%rate==0]
 
     grouped_df = visualization_labels.groupby('frameID')
-    valid_frames = [int(f[:-4]) for f in os.listdir(frame_dir)]
+    frame_source = open_frame_source(frame_dir, frame_reader=FrameReader(reduced_decode, thumbnails))
+    valid_frames = set(frame_source.frame_ids())
     assert len(valid_frames)>0
     for frame_num in visualization_labels.frameID.unique():
         assert frame_num in valid_frames
 
-    initial_frame = cv2_safe_read('%s\\%06d.jpg'%(frame_dir, valid_frames[0])) 
-    h, w, _ = initial_frame.shape
+    h, w = frame_source.frame_size()
     h, w = map(int, [h*compression, w*compression])
     if save_img:
         # Create output path
@@ -91,13 +100,14 @@ def visualize(output_vid: str, frame_dir:str, annotations:str,
     line_thickness = 2
     font_size = 1
 
-    for frame_num in visualization_labels.frameID.unique():
+    def read(item):
+        frame_num, _ = item
         # read_frame
-        frame = cv2_safe_read('%s\\%06d.jpg'%(frame_dir, frame_num))
-        frame = cv2.resize(frame, (w,h)) if compression<1 else frame
+        frame, _ = frame_source.read(frame_num, (w,h) if compression<1 else None)
+        return frame
 
-        # get_annotation
-        annotations = grouped_df.get_group(frame_num)
+    def draw(item, frame):
+        frame_num, annotations = item
         for idx in range(len(annotations)):
             info = annotations.iloc[idx]
             xmin, ymin, xmax, ymax, personID = info[['xmin', 'ymin', 'xmax', 'ymax','personID']]
@@ -125,8 +135,19 @@ def visualize(output_vid: str, frame_dir:str, annotations:str,
             cv2_safe_write(frame, '%s/%06d.jpg'%(out_path, frame_num))
 
         frame = cv2.putText(frame, '%06d'%frame_num,(50, 100), font, font_size, (0,255,0), line_thickness)
+        return frame
+
+    def write(item, frame):
         # output to video
         out.write(frame) 
 
+    # get_annotation, frames are read and drawn by threads, and written in order
+    items = ((frame_num, grouped_df.get_group(frame_num)) for frame_num in visualization_labels.frameID.unique())
+    # frames of a video are decoded in order by one thread
+    pipeline = RenderPipeline(read, draw, write, num_decoders if frame_source.parallel_reads else 1, num_drawers)
+    stats = pipeline.run(items)
     out.release()
-    return 
+    if frame_source is not frame_dir:
+        frame_source.close()
+    print("Visualization Done: %d frames, %.1f fps"%(stats['frames'], stats['fps']))
+    return stats